@@ -1,5 +1,10 @@
-from contextlib import asynccontextmanager
-from typing import Optional, AsyncGenerator
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, AsyncExitStack
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional, AsyncGenerator, Dict, Any, Coroutine, Set
 
 import psycopg
 from psycopg_pool import AsyncConnectionPool
@@ -12,18 +17,41 @@ except ImportError:
     print("and you are running the script from the root folder.")
     app_config = None
 
+logger = logging.getLogger(__name__)
+
 _db_pool: Optional[AsyncConnectionPool] = None
 
+@dataclass
+class PoolMetrics:
+    checkouts: int = 0
+    checkout_errors: int = 0
+    slow_checkouts: int = 0
+    checkout_wait_ms_total: float = 0.0
+    checkout_wait_ms_max: float = 0.0
+    in_use: int = 0
+
+_pool_metrics = PoolMetrics()
+
+def _on_reconnect_failed(pool: AsyncConnectionPool):
+    logger.critical(f"Database pool '{pool.name}' could not reconnect within {pool.reconnect_timeout}s.")
+
 async def init_db_pool():
     global _db_pool
     if _db_pool is None and app_config and app_config.db:
         print("Initializing database connection pool...")
         temp_pool = None
         try:
+            db_config = app_config.db
             temp_pool = AsyncConnectionPool(
-                conninfo=app_config.db.dsn_psycopg,
-                min_size=1,
-                max_size=10,
+                conninfo=db_config.dsn_psycopg,
+                min_size=db_config.pool_min_size,
+                max_size=db_config.pool_max_size,
+                max_lifetime=db_config.pool_max_lifetime,
+                max_idle=db_config.pool_max_idle,
+                timeout=db_config.pool_timeout,
+                reconnect_timeout=db_config.pool_reconnect_timeout,
+                reconnect_failed=_on_reconnect_failed,
+                open=False,
             )
             print("Opening connection pool...")
             await temp_pool.open(wait=True)
@@ -59,15 +87,153 @@ def get_db_pool() -> AsyncConnectionPool:
     return _db_pool
 
 @asynccontextmanager
-async def get_db_cursor(row_factory=None) -> AsyncGenerator:
+async def checkout_db_connection() -> AsyncGenerator:
     pool = get_db_pool()
-    async with pool.connection() as conn:
+    checked_out = False
+    started = time.perf_counter()
+    try:
+        async with pool.connection() as conn:
+            checked_out = True
+            wait_ms = (time.perf_counter() - started) * 1000
+            _pool_metrics.checkouts += 1
+            _pool_metrics.checkout_wait_ms_total += wait_ms
+            _pool_metrics.checkout_wait_ms_max = max(_pool_metrics.checkout_wait_ms_max, wait_ms)
+            if app_config and wait_ms >= app_config.db.pool_slow_checkout_ms:
+                _pool_metrics.slow_checkouts += 1
+                stats = pool.get_stats()
+                logger.warning(
+                    f"Slow pool checkout: waited {wait_ms:.1f} ms "
+                    f"(size={stats.get('pool_size')}, available={stats.get('pool_available')}, waiting={stats.get('requests_waiting', 0)})."
+                )
+            _pool_metrics.in_use += 1
+            try:
+                yield conn
+            finally:
+                _pool_metrics.in_use -= 1
+    except Exception:
+        if not checked_out:
+            _pool_metrics.checkout_errors += 1
+        raise
+
+class UnitOfWork:
+    """
+    Одно соединение из пула на всю обработку апдейта.
+
+    Соединение берется лениво, при первом запросе, и возвращается в пул при
+    выходе из unit_of_work(). Без transactional каждый запрос коммитится сразу
+    (autocommit), с transactional все запросы идут в одной транзакции.
+    """
+
+    def __init__(self, transactional: bool = False):
+        self.transactional = transactional
+        self.is_open = True
+        self._conn = None
+        self._stack = AsyncExitStack()
+
+    async def connection(self):
+        if self._conn is None:
+            conn = await self._stack.enter_async_context(checkout_db_connection())
+            if self.transactional:
+                await self._stack.enter_async_context(conn.transaction())
+            else:
+                await conn.set_autocommit(True)
+                self._stack.push_async_callback(self._restore_autocommit, conn)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    async def _restore_autocommit(conn):
+        try:
+            await conn.set_autocommit(False)
+        except Exception as e:
+            # Сломанное соединение пул все равно отбросит при возврате
+            logger.warning(f"Could not restore autocommit on pinned connection: {e}")
+
+    async def close(self, exc_type=None, exc=None, tb=None):
+        self.is_open = False
+        await self._stack.__aexit__(exc_type, exc, tb)
+        self._conn = None
+
+_current_unit: ContextVar[Optional[UnitOfWork]] = ContextVar("db_unit_of_work", default=None)
+
+def get_current_unit() -> Optional[UnitOfWork]:
+    unit = _current_unit.get()
+    return unit if unit is not None and unit.is_open else None
+
+_detached_tasks: Set[asyncio.Task] = set()
+
+async def _without_unit(coro: Coroutine[Any, Any, Any]) -> Any:
+    # Задача работает в копии контекста: сброс виден только ей
+    _current_unit.set(None)
+    return await coro
+
+def spawn_detached(coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+    """
+    Фоновая задача из хендлера. asyncio.create_task копирует контекст вместе
+    с unit of work апдейта, и задача писала бы в соединение, которое хендлер
+    может вернуть в пул раньше, чем она начнет запрос. Здесь unit сброшен:
+    задача берет соединения из пула сама.
+    """
+    task = asyncio.create_task(_without_unit(coro))
+    _detached_tasks.add(task)
+    task.add_done_callback(_detached_tasks.discard)
+    return task
+
+@asynccontextmanager
+async def unit_of_work(transactional: bool = False) -> AsyncGenerator[UnitOfWork, None]:
+    outer = get_current_unit()
+    if outer is not None:
+        yield outer
+        return
+    unit = UnitOfWork(transactional=transactional)
+    token = _current_unit.set(unit)
+    try:
+        yield unit
+    except BaseException as e:
+        await unit.close(type(e), e, e.__traceback__)
+        raise
+    else:
+        await unit.close()
+    finally:
+        _current_unit.reset(token)
+
+@asynccontextmanager
+async def db_pipeline() -> AsyncGenerator:
+    # Запросы внутри блока (например, через asyncio.gather) уходят на сервер пачкой, без ожидания ответа на каждый
+    async with unit_of_work() as unit:
+        conn = await unit.connection()
+        async with conn.pipeline() as pipeline:
+            yield pipeline
+
+@asynccontextmanager
+async def get_db_cursor(row_factory=None) -> AsyncGenerator:
+    unit = get_current_unit()
+    if unit is not None:
+        conn = await unit.connection()
         async with conn.cursor(row_factory=row_factory) as cur:
             yield cur
+        return
+    async with checkout_db_connection() as conn:
+        async with conn.cursor(row_factory=row_factory) as cur:
+            yield cur
+
+def get_pool_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = dict(_db_pool.get_stats()) if _db_pool else {}
+    checkouts = _pool_metrics.checkouts
+    stats.update({
+        "checkouts": checkouts,
+        "checkout_errors": _pool_metrics.checkout_errors,
+        "slow_checkouts": _pool_metrics.slow_checkouts,
+        "checkout_wait_ms_avg": _pool_metrics.checkout_wait_ms_total / checkouts if checkouts else 0.0,
+        "checkout_wait_ms_max": _pool_metrics.checkout_wait_ms_max,
+        "connections_in_use": _pool_metrics.in_use,
+    })
+    return stats
 
 async def close_db_pool():
     global _db_pool
     if _db_pool:
+        print(f"Database pool statistics: {get_pool_stats()}")
         print("Closing database connection pool...")
         await _db_pool.close()
         _db_pool = None
@@ -0,0 +1,297 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, List, Dict, Tuple, Type, TypeVar
+
+from pydantic import ValidationError
+
+from DataBase import db_pipeline
+from DataBase.models import Job, JobType, Activity
+from DataBase.models.job_repo import JobRepository
+from DataBase.models.activity_repo import ActivityRepository
+from DataBase.models.application_repo import ApplicationRepository
+from DataBase.models.pagination import Page, Cursor, paginate_sorted
+
+logger = logging.getLogger(__name__)
+
+CatalogueItem = TypeVar("CatalogueItem", Job, Activity)
+
+# updated_at = время начала транзакции: долгая транзакция может закоммитить строку "в прошлом"
+CATCH_UP_OVERLAP = timedelta(minutes=5)
+CATCH_UP_BATCH_SIZE = 500
+# Сколько помнить убранные из реплики строки: за это время запоздавшая пачка другого воркера слушателя точно применится
+TOMBSTONE_TTL_SECONDS = 600.0
+
+# id -> (момент истечения по time.monotonic, версия updated_at, убравшая строку; None - строка удалена)
+Tombstones = Dict[int, Tuple[float, Optional[datetime]]]
+
+
+class CatalogueReplica:
+    """
+    In-process копия активных вакансий/стажировок и активностей.
+
+    Загружается целиком при (пере)подключении слушателя БД и дальше
+    обновляется точечно по уведомлениям каналов jobs_updates/activities.
+    Пока реплика не загружена, чтения уходят в репозитории.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[int, Job] = {}
+        self._activities: Dict[int, Activity] = {}
+        self._sorted_jobs: Optional[List[Job]] = None
+        self._sorted_activities: Optional[List[Activity]] = None
+        self._job_tombstones: Tombstones = {}
+        self._activity_tombstones: Tombstones = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self._job_repo = JobRepository()
+        self._activity_repo = ActivityRepository()
+        self._app_repo = ApplicationRepository()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    async def load(self) -> bool:
+        async with self._lock:
+            try:
+                async with db_pipeline():
+                    jobs, activities = await asyncio.gather(
+                        self._job_repo.get_all_active_jobs(),
+                        self._activity_repo.get_all_active_activities(),
+                    )
+            except Exception as e:
+                logger.error(f"Catalogue: Failed to load replica: {e}", exc_info=True)
+                return False
+            self._jobs = {job.id: job for job in jobs}
+            self._activities = {activity.id: activity for activity in activities}
+            self._sorted_jobs = None
+            self._sorted_activities = None
+            self._loaded = True
+            logger.info(f"Catalogue: Replica loaded ({len(self._jobs)} jobs, {len(self._activities)} activities).")
+            return True
+
+    async def catch_up(self) -> bool:
+        """
+        Применяет изменения, пропущенные пока слушатель был отключен: строки
+        с updated_at новее водяной отметки реплики (минус запас) читаются
+        пачками, удаленные строки вычищаются. Без загруженной реплики - полная загрузка.
+        """
+        if not self._loaded:
+            return await self.load()
+        async with self._lock:
+            try:
+                now = datetime.now(timezone.utc)
+                jobs_changed = await self._replay(self._job_repo, self._jobs, lambda job: job.is_active)
+                activities_changed = await self._replay(
+                    self._activity_repo, self._activities,
+                    lambda activity: activity.is_active and self._is_upcoming(activity, now)
+                )
+            except Exception as e:
+                logger.error(f"Catalogue: Catch-up failed, reloading replica: {e}", exc_info=True)
+                self._loaded = False
+            else:
+                self._sorted_jobs = None
+                self._sorted_activities = None
+                logger.info(f"Catalogue: Caught up ({jobs_changed} job changes, {activities_changed} activity changes).")
+                return True
+        return await self.load()
+
+    @staticmethod
+    async def _replay(repo, store: Dict[int, CatalogueItem], is_visible: Callable[[CatalogueItem], bool]) -> int:
+        if store:
+            watermark = max(item.updated_at for item in store.values()) - CATCH_UP_OVERLAP
+        else:
+            watermark = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        after_id = 0
+        changed = 0
+        while True:
+            items = await repo.get_changed_since(watermark, after_id, CATCH_UP_BATCH_SIZE)
+            for item in items:
+                if is_visible(item):
+                    store[item.id] = item
+                else:
+                    store.pop(item.id, None)
+            changed += len(items)
+            if len(items) < CATCH_UP_BATCH_SIZE:
+                break
+            watermark, after_id = items[-1].updated_at, items[-1].id
+        existing_ids = await repo.get_all_ids()
+        for item_id in [item_id for item_id in store if item_id not in existing_ids]:
+            del store[item_id]
+            changed += 1
+        return changed
+
+    def _jobs_in_order(self) -> List[Job]:
+        if self._sorted_jobs is None:
+            self._sorted_jobs = sorted(self._jobs.values(), key=lambda j: (j.created_at, j.id), reverse=True)
+        return self._sorted_jobs
+
+    def _activities_in_order(self) -> List[Activity]:
+        if self._sorted_activities is None:
+            self._sorted_activities = sorted(self._activities.values(), key=lambda a: (a.start_time, a.id))
+        return self._sorted_activities
+
+    @staticmethod
+    def _is_upcoming(activity: Activity, now: datetime) -> bool:
+        end_time = activity.end_time
+        if end_time.tzinfo is None:
+            end_time = end_time.replace(tzinfo=timezone.utc)
+        return end_time >= now
+
+    async def get_active_jobs(self, job_type: Optional[JobType] = None, limit: int = 20, after: Optional[Cursor] = None, before: Optional[Cursor] = None) -> Page[Job]:
+        if not self._loaded:
+            return await self._job_repo.get_active_jobs(job_type=job_type, limit=limit, after=after, before=before)
+        jobs = self._jobs_in_order()
+        if job_type:
+            jobs = [job for job in jobs if job.type == job_type]
+        return paginate_sorted(jobs, key=lambda j: (j.created_at, j.id), limit=limit, descending=True, after=after, before=before)
+
+    async def get_job(self, job_id: int) -> Optional[Job]:
+        if not self._loaded:
+            return await self._job_repo.get_by_id(job_id)
+        return self._jobs.get(job_id)
+
+    async def get_job_for_user(self, job_id: int, user_id: int) -> Tuple[Optional[Job], bool]:
+        # Карточка вакансии + "уже откликался": один запрос к БД и в реплике, и без нее
+        if not self._loaded:
+            return await self._job_repo.get_with_application_state(job_id, user_id)
+        job = self._jobs.get(job_id)
+        if not job:
+            return None, False
+        application = await self._app_repo.get_by_user_and_target(user_id=user_id, job_id=job_id)
+        return job, application is not None
+
+    async def get_active_activities(self, upcoming_only: bool = True, limit: int = 20, after: Optional[Cursor] = None, before: Optional[Cursor] = None) -> Page[Activity]:
+        if not self._loaded:
+            return await self._activity_repo.get_active_activities(upcoming_only=upcoming_only, limit=limit, after=after, before=before)
+        activities = self._activities_in_order()
+        if upcoming_only:
+            now = datetime.now(timezone.utc)
+            activities = [activity for activity in activities if self._is_upcoming(activity, now)]
+        return paginate_sorted(activities, key=lambda a: (a.start_time, a.id), limit=limit, descending=False, after=after, before=before)
+
+    async def get_activity(self, activity_id: int) -> Optional[Activity]:
+        if not self._loaded:
+            return await self._activity_repo.get_by_id(activity_id)
+        activity = self._activities.get(activity_id)
+        if activity and not self._is_upcoming(activity, datetime.now(timezone.utc)):
+            return None
+        return activity
+
+    async def get_activity_for_user(self, activity_id: int, user_id: int) -> Tuple[Optional[Activity], bool]:
+        if not self._loaded:
+            return await self._activity_repo.get_with_application_state(activity_id, user_id)
+        activity = await self.get_activity(activity_id)
+        if not activity:
+            return None, False
+        application = await self._app_repo.get_by_user_and_target(user_id=user_id, activity_id=activity_id)
+        return activity, application is not None
+
+    @staticmethod
+    def _parse_payload(payload_str: str, model: Type[CatalogueItem]) -> Tuple[Optional[int], Optional[str], Optional[CatalogueItem]]:
+        try:
+            payload = json.loads(payload_str)
+            item_id, operation, row = int(payload.get("id")), payload.get("operation"), payload.get("row")
+        except (json.JSONDecodeError, TypeError, ValueError, AttributeError):
+            logger.error(f"Catalogue: Invalid change payload: {payload_str}")
+            return None, None, None
+        if row is None:
+            # Строка не влезла в NOTIFY - перечитаем ее из БД
+            return item_id, operation, None
+        try:
+            return item_id, operation, model.model_validate(row)
+        except ValidationError as e:
+            logger.warning(f"Catalogue: Invalid row in change payload for {model.__name__} {item_id}, will refetch: {e}")
+            return item_id, operation, None
+
+    def _collect_changes(self, payloads: List[str], model: Type[CatalogueItem]) -> Dict[int, Tuple[Optional[str], Optional[CatalogueItem]]]:
+        # Для каждого id важна только последняя операция в пачке
+        changes: Dict[int, Tuple[Optional[str], Optional[CatalogueItem]]] = {}
+        for payload_str in payloads:
+            item_id, operation, item = self._parse_payload(payload_str, model)
+            if item_id is not None:
+                changes[item_id] = (operation, item)
+        return changes
+
+    @staticmethod
+    def _apply_changes(
+        store: Dict[int, CatalogueItem],
+        tombstones: Tombstones,
+        changes: Dict[int, Tuple[Optional[str], Optional[CatalogueItem]]],
+        fetched: Dict[int, CatalogueItem],
+        is_visible: Callable[[CatalogueItem], bool],
+    ) -> Dict[int, Optional[CatalogueItem]]:
+        # Возвращает примененные изменения: id -> новая версия или None, если строка убрана из реплики.
+        # Воркеры слушателя разбирают пачки параллельно, поэтому старая версия строки может прийти
+        # после новой - и после удаления, когда сравнивать уже не с чем: для этого надгробия
+        now = time.monotonic()
+        for item_id in [item_id for item_id, (expires_at, _) in tombstones.items() if expires_at <= now]:
+            del tombstones[item_id]
+        applied: Dict[int, Optional[CatalogueItem]] = {}
+        for item_id, (operation, item) in changes.items():
+            current = store.get(item_id)
+            if operation != "DELETE" and item is None:
+                item = fetched.get(item_id)
+            if operation != "DELETE" and item is not None:
+                if current is not None and current.updated_at > item.updated_at:
+                    # Пачка другого воркера уже применила более новую версию строки
+                    continue
+                tombstone = tombstones.get(item_id)
+                if tombstone is not None and (tombstone[1] is None or tombstone[1] >= item.updated_at):
+                    # Строку уже убрали более новым изменением или удалили
+                    continue
+            if operation != "DELETE" and item is not None and is_visible(item):
+                store[item_id] = item
+                tombstones.pop(item_id, None)
+                applied[item_id] = item
+            else:
+                if operation == "DELETE":
+                    removed_by = None
+                else:
+                    removed_by = item.updated_at if item is not None else (current.updated_at if current is not None else None)
+                if operation == "DELETE" or removed_by is not None:
+                    tombstones[item_id] = (now + TOMBSTONE_TTL_SECONDS, removed_by)
+                store.pop(item_id, None)
+                applied[item_id] = None
+        return applied
+
+    async def apply_job_notifications(self, payloads: List[str]) -> Dict[int, Optional[Job]]:
+        changes = self._collect_changes(payloads, Job)
+        if not changes or not self._loaded:
+            return {}
+        # Перечитываем под блокировкой, чтобы параллельные воркеры слушателя не затерли свежие данные старыми
+        async with self._lock:
+            refetch = [job_id for job_id, (operation, job) in changes.items() if operation != "DELETE" and job is None]
+            try:
+                fetched = {job.id: job for job in await self._job_repo.get_active_by_ids(refetch)} if refetch else {}
+            except Exception as e:
+                logger.error(f"Catalogue: Failed to refresh jobs {refetch}: {e}", exc_info=True)
+                return {}
+            applied = self._apply_changes(self._jobs, self._job_tombstones, changes, fetched, lambda job: job.is_active)
+            self._sorted_jobs = None
+        removed = sum(1 for job in applied.values() if job is None)
+        logger.info(f"Catalogue: Applied {len(applied)} job changes ({removed} removed, {len(refetch)} refetched).")
+        return applied
+
+    async def apply_activity_notifications(self, payloads: List[str]) -> Dict[int, Optional[Activity]]:
+        changes = self._collect_changes(payloads, Activity)
+        if not changes or not self._loaded:
+            return {}
+        async with self._lock:
+            refetch = [activity_id for activity_id, (operation, activity) in changes.items() if operation != "DELETE" and activity is None]
+            try:
+                fetched = {activity.id: activity for activity in await self._activity_repo.get_active_by_ids(refetch)} if refetch else {}
+            except Exception as e:
+                logger.error(f"Catalogue: Failed to refresh activities {refetch}: {e}", exc_info=True)
+                return {}
+            now = datetime.now(timezone.utc)
+            applied = self._apply_changes(self._activities, self._activity_tombstones, changes, fetched, lambda activity: activity.is_active and self._is_upcoming(activity, now))
+            self._sorted_activities = None
+        removed = sum(1 for activity in applied.values() if activity is None)
+        logger.info(f"Catalogue: Applied {len(applied)} activity changes ({removed} removed, {len(refetch)} refetched).")
+        return applied
+
+catalogue = CatalogueReplica()
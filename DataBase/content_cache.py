@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Callable
+
+from config import config
+from DataBase.models import ContentRepoData
+from DataBase.models.content_repo import ContentRepository
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def split_message_text(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    chunks: List[str] = []
+    current = ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks or [""]
+
+
+@dataclass
+class ContentSnapshot:
+    content: ContentRepoData
+    loaded_at: float
+    _rendered: Dict[Callable[[ContentRepoData], str], List[str]] = field(default_factory=dict)
+
+    def render(self, renderer: Callable[[ContentRepoData], str]) -> List[str]:
+        chunks = self._rendered.get(renderer)
+        if chunks is None:
+            chunks = split_message_text(renderer(self.content))
+            self._rendered[renderer] = chunks
+        return chunks
+
+
+class ContentCache:
+    def __init__(self, ttl_seconds: int):
+        self._ttl_seconds = ttl_seconds
+        self._snapshot: Optional[ContentSnapshot] = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._repo = ContentRepository()
+
+    def invalidate(self):
+        if self._snapshot is not None:
+            logger.info("Content cache: Snapshot invalidated.")
+        self._snapshot = None
+        self._generation += 1
+
+    def _is_fresh(self, snapshot: Optional[ContentSnapshot]) -> bool:
+        return snapshot is not None and time.monotonic() - snapshot.loaded_at < self._ttl_seconds
+
+    async def get_snapshot(self) -> ContentSnapshot:
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+        async with self._lock:
+            if self._is_fresh(self._snapshot):
+                return self._snapshot
+            generation = self._generation
+            content = await self._repo.get_all_content()
+            if content is None:
+                # Не кэшируем пустой результат после ошибки: отдаем устаревший снимок, если он есть
+                return self._snapshot or ContentSnapshot(content=ContentRepoData(), loaded_at=time.monotonic())
+            snapshot = ContentSnapshot(content=content, loaded_at=time.monotonic())
+            if generation == self._generation:
+                self._snapshot = snapshot
+                logger.info("Content cache: Snapshot loaded.")
+            return snapshot
+
+    async def get_rendered(self, renderer: Callable[[ContentRepoData], str]) -> List[str]:
+        snapshot = await self.get_snapshot()
+        return snapshot.render(renderer)
+
+
+content_cache = ContentCache(ttl_seconds=config.cache.content_ttl_seconds)
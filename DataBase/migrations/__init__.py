@@ -0,0 +1,70 @@
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Set
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "versions"
+MIGRATIONS_TABLE = "schema_migrations"
+# Любое число; нужен только для того, чтобы два процесса не накатывали схему одновременно
+MIGRATIONS_LOCK_ID = 472_190_001
+
+_FILE_NAME_RE = re.compile(r"^(?P<version>\d{4})_(?P<name>[a-z0-9_]+)\.sql$")
+
+@dataclass(frozen=True)
+class Migration:
+    version: str
+    name: str
+    path: Path
+
+    def read_sql(self) -> str:
+        return self.path.read_text(encoding="utf-8")
+
+def discover_migrations() -> List[Migration]:
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        match = _FILE_NAME_RE.match(path.name)
+        if not match:
+            logger.warning(f"Skipping migration file with unexpected name: {path.name}")
+            continue
+        migrations.append(Migration(version=match["version"], name=match["name"], path=path))
+    return migrations
+
+async def _ensure_migrations_table(conn):
+    await conn.execute(
+        f"CREATE TABLE IF NOT EXISTS public.{MIGRATIONS_TABLE} ("
+        "version VARCHAR(16) PRIMARY KEY, "
+        "name TEXT NOT NULL, "
+        "applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW())"
+    )
+
+async def get_applied_versions(conn) -> Set[str]:
+    await _ensure_migrations_table(conn)
+    cur = await conn.execute(f"SELECT version FROM public.{MIGRATIONS_TABLE}")
+    return {row[0] for row in await cur.fetchall()}
+
+async def apply_migrations(conn) -> List[Migration]:
+    """
+    Накатывает все еще не примененные миграции из versions/ по порядку.
+
+    Все ожидающие миграции и их записи в schema_migrations выполняются в одной
+    транзакции под advisory-локом: при ошибке схема остается как была.
+    """
+    applied: List[Migration] = []
+    async with conn.transaction():
+        await conn.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATIONS_LOCK_ID,))
+        done = await get_applied_versions(conn)
+        for migration in discover_migrations():
+            if migration.version in done:
+                continue
+            logger.info(f"Applying migration {migration.version}_{migration.name}...")
+            # Без параметров psycopg отправляет текст как есть, несколько команд за раз
+            await conn.execute(migration.read_sql())
+            await conn.execute(
+                f"INSERT INTO public.{MIGRATIONS_TABLE} (version, name) VALUES (%s, %s)",
+                (migration.version, migration.name),
+            )
+            applied.append(migration)
+    return applied
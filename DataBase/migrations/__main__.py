@@ -0,0 +1,103 @@
+"""
+Управление схемой БД.
+
+    python -m DataBase.migrations apply    # накатить недостающие миграции
+    python -m DataBase.migrations status   # какие миграции уже применены
+    python -m DataBase.migrations check    # EXPLAIN: каждый запрос репозиториев идет по индексу;
+                                           # записи бота (откатываемые) проходят ограничения схемы
+
+Подключение берется из тех же переменных окружения, что и у бота (DB_HOST, DB_NAME, ...).
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from DataBase import init_db_pool, close_db_pool, get_dedicated_db_connection
+from DataBase.migrations import apply_migrations, discover_migrations, get_applied_versions
+from DataBase.migrations.checks import explain_statements, exercise_write_paths, register_dynamic_statements, FULL_SCAN_ALLOWED
+
+
+async def _apply() -> int:
+    conn = await get_dedicated_db_connection()
+    if conn is None:
+        return 1
+    try:
+        applied = await apply_migrations(conn)
+    finally:
+        await conn.close()
+    if not applied:
+        print("Schema is up to date.")
+    for migration in applied:
+        print(f"Applied {migration.version}_{migration.name}")
+    return 0
+
+
+async def _status() -> int:
+    conn = await get_dedicated_db_connection()
+    if conn is None:
+        return 1
+    try:
+        done = await get_applied_versions(conn)
+    finally:
+        await conn.close()
+    for migration in discover_migrations():
+        mark = "x" if migration.version in done else " "
+        print(f"[{mark}] {migration.version}_{migration.name}")
+    return 0
+
+
+async def _check() -> int:
+    await init_db_pool()
+    try:
+        await register_dynamic_statements()
+        writes = await exercise_write_paths()
+    finally:
+        await close_db_pool()
+    write_failed = 0
+    for write in writes:
+        if write.skipped:
+            status, details = "skipped", write.skipped
+        elif write.error:
+            status, details = "FAILED", write.error
+        else:
+            status, details = "ok", "rolled back"
+        if not write.ok:
+            write_failed += 1
+        print(f"{status:<9}write: {write.path}: {details}")
+    print(f"{len(writes) - write_failed}/{len(writes)} write paths pass schema constraints.")
+    conn = await get_dedicated_db_connection()
+    if conn is None:
+        return 1
+    try:
+        checks = await explain_statements(conn)
+    finally:
+        await conn.close()
+    failed = 0
+    for check in checks:
+        if check.error:
+            status, details = "ERROR", check.error
+        elif check.seq_scans and check.statement in FULL_SCAN_ALLOWED:
+            status, details = "ok", f"full scan allowed: {FULL_SCAN_ALLOWED[check.statement]}"
+        elif check.seq_scans:
+            status, details = "SEQ SCAN", ", ".join(check.seq_scans)
+        else:
+            status, details = "ok", ", ".join(dict.fromkeys(check.index_names)) or "no table access"
+        if not check.ok:
+            failed += 1
+        print(f"{status:<9}{check.statement}: {details}")
+    print(f"{len(checks) - failed}/{len(checks)} statements use an index.")
+    return 1 if failed or write_failed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m DataBase.migrations", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("apply", "status", "check"))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    commands = {"apply": _apply, "status": _status, "check": _check}
+    return asyncio.run(commands[args.command]())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
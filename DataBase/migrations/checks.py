@@ -0,0 +1,187 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Type
+
+from DataBase import unit_of_work
+from DataBase.models import JobType, ReminderType, UserCreate, UserUpdate, ApplicationCreate
+from DataBase.models.base_repo import BaseRepository
+from DataBase.models.job_repo import JobRepository
+from DataBase.models.activity_repo import ActivityRepository
+from DataBase.models.application_repo import ApplicationRepository
+from DataBase.models.user_repo import UserRepository
+from DataBase.models.content_repo import ContentRepository
+from DataBase.models.activity_reminder_repo import ActivityReminderRepository
+from DataBase.models.outbox_repo import NotificationOutboxRepository
+
+logger = logging.getLogger(__name__)
+
+REPOSITORIES: List[Type[BaseRepository]] = [
+    JobRepository,
+    ActivityRepository,
+    ApplicationRepository,
+    UserRepository,
+    ContentRepository,
+    ActivityReminderRepository,
+    NotificationOutboxRepository,
+]
+
+# Запросы, которым полный проход по таблице нужен по смыслу
+FULL_SCAN_ALLOWED: Dict[str, str] = {
+    "ContentRepository.get_all_content": "reads every FAQ/contact row into the content cache",
+}
+
+_PLACEHOLDER_RE = re.compile(r"%%|%s")
+
+# Записи проверки откатываются; отрицательных id у пользователей Telegram не бывает
+CHECK_USER_ID = -1
+
+@dataclass
+class PlanCheck:
+    statement: str
+    seq_scans: List[str] = field(default_factory=list)
+    index_names: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and (not self.seq_scans or self.statement in FULL_SCAN_ALLOWED)
+
+def to_generic_plan_sql(query: str) -> str:
+    # %s -> $1, $2, ...: EXPLAIN (GENERIC_PLAN) строит план без значений параметров
+    counter = iter(range(1, 1000))
+    return _PLACEHOLDER_RE.sub(lambda m: "%" if m.group(0) == "%%" else f"${next(counter)}", query)
+
+def _walk_plan(node: dict, check: PlanCheck):
+    node_type = node.get("Node Type", "")
+    if node_type == "Seq Scan":
+        check.seq_scans.append(node.get("Relation Name", "?"))
+    if node.get("Index Name"):
+        check.index_names.append(node["Index Name"])
+    for child in node.get("Plans", []):
+        _walk_plan(child, check)
+
+async def register_dynamic_statements():
+    # Варианты списков (фильтры, направление курсора) регистрируются лениво при первом вызове
+    cursor = (datetime.now(timezone.utc), 0)
+    pages = ({}, {"after": cursor}, {"before": cursor})
+    job_repo, activity_repo, app_repo = JobRepository(), ActivityRepository(), ApplicationRepository()
+    for job_type in (None, JobType.VACANCY):
+        for page in pages:
+            await job_repo.get_active_jobs(job_type=job_type, limit=1, **page)
+    for upcoming_only in (True, False):
+        for page in pages:
+            await activity_repo.get_active_activities(upcoming_only=upcoming_only, limit=1, **page)
+    for page in pages:
+        await app_repo.get_user_applications_with_details(user_id=0, limit=1, **page)
+
+async def explain_statements(conn) -> List[PlanCheck]:
+    """
+    Прогоняет EXPLAIN по каждому зарегистрированному запросу репозиториев.
+
+    Seq scan выключается на время проверки: если в плане он все равно
+    остается, подходящего индекса для запроса нет. Нужен PostgreSQL 16+
+    (EXPLAIN GENERIC_PLAN).
+    """
+    checks: List[PlanCheck] = []
+    async with conn.transaction():
+        await conn.execute("SET LOCAL enable_seqscan = off")
+        for repository in REPOSITORIES:
+            for name, query in sorted(repository._statements.items()):
+                check = PlanCheck(statement=f"{repository.__name__}.{name}")
+                try:
+                    async with conn.transaction():
+                        cur = await conn.execute(f"EXPLAIN (GENERIC_PLAN, FORMAT JSON) {to_generic_plan_sql(query)}")
+                        plan = (await cur.fetchone())[0]
+                    _walk_plan(plan[0]["Plan"], check)
+                except Exception as e:
+                    check.error = str(e).strip()
+                checks.append(check)
+    return checks
+
+@dataclass
+class WriteCheck:
+    path: str
+    error: Optional[str] = None
+    skipped: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+class _Rollback(Exception):
+    pass
+
+async def _first_id(unit, table: str) -> Optional[int]:
+    conn = await unit.connection()
+    cur = await conn.execute(f"SELECT id FROM public.{table} ORDER BY id LIMIT 1")
+    row = await cur.fetchone()
+    return row[0] if row else None
+
+async def _new_user(unit) -> Optional[str]:
+    profile, created = await UserRepository().upsert(UserCreate(id=CHECK_USER_ID, full_name="migrations check"))
+    return None if profile is not None and created else "new user without email/phone was not created"
+
+async def _fill_profile(unit) -> Optional[str]:
+    error = await _new_user(unit)
+    if error:
+        return error
+    profile = await UserRepository().update(CHECK_USER_ID, UserUpdate(email="migrations-check@example.com", phone="+70000000000"))
+    return None if profile is not None else "profile update failed"
+
+async def _apply_for_job(unit) -> Optional[str]:
+    job_id = await _first_id(unit, "jobs")
+    if job_id is None:
+        raise LookupError("no jobs in the database")
+    error = await _new_user(unit)
+    if error:
+        return error
+    application, _ = await ApplicationRepository().add(ApplicationCreate(user_id=CHECK_USER_ID, job_id=job_id))
+    return None if application is not None else f"application for job {job_id} failed"
+
+async def _apply_for_activity(unit) -> Optional[str]:
+    activity_id = await _first_id(unit, "activities")
+    if activity_id is None:
+        raise LookupError("no activities in the database")
+    error = await _new_user(unit)
+    if error:
+        return error
+    application, _ = await ApplicationRepository().add(ApplicationCreate(user_id=CHECK_USER_ID, activity_id=activity_id))
+    if application is None:
+        return f"application for activity {activity_id} failed"
+    run_at = datetime.now(timezone.utc) + timedelta(days=1)
+    added = await ActivityReminderRepository().add_pending_reminders(CHECK_USER_ID, activity_id, {ReminderType.H24: run_at})
+    return None if added else f"pending reminder for activity {activity_id} was not stored"
+
+WRITE_PATHS: Dict[str, Callable[..., Awaitable[Optional[str]]]] = {
+    "/start: new user without contacts": _new_user,
+    "profile: fill in email and phone": _fill_profile,
+    "apply for a job": _apply_for_job,
+    "register for an activity + reminders": _apply_for_activity,
+}
+
+async def exercise_write_paths() -> List[WriteCheck]:
+    """
+    Прогоняет записи, которые делает бот, каждую в своей транзакции с откатом.
+
+    EXPLAIN не видит ограничений схемы (NOT NULL, CHECK, внешние ключи),
+    поэтому расхождение схемы с кодом ловится только настоящей записью.
+    Репозитории сами логируют ошибку и возвращают None - это и считается провалом.
+    Нужен открытый пул.
+    """
+    checks: List[WriteCheck] = []
+    for path, scenario in WRITE_PATHS.items():
+        check = WriteCheck(path=path)
+        try:
+            async with unit_of_work(transactional=True) as unit:
+                check.error = await scenario(unit)
+                raise _Rollback()
+        except _Rollback:
+            pass
+        except LookupError as e:
+            check.skipped = str(e)
+        except Exception as e:
+            check.error = str(e).strip()
+        checks.append(check)
+    return checks
@@ -1,25 +1,3 @@
-DROP TRIGGER IF EXISTS set_timestamp_users ON public.users;
-DROP TRIGGER IF EXISTS set_timestamp_jobs ON public.jobs;
-DROP TRIGGER IF EXISTS set_timestamp_activities ON public.activities;
-DROP TRIGGER IF EXISTS set_timestamp_applications ON public.applications;
-DROP TRIGGER IF EXISTS email_check ON public.users;
-DROP TRIGGER IF EXISTS phone_check ON public.users;
-
-DROP TABLE IF EXISTS public.applications;
-DROP TABLE IF EXISTS public.faq;
-DROP TABLE IF EXISTS public.company_contacts;
-DROP TABLE IF EXISTS public.hr_contacts;
-DROP TABLE IF EXISTS public.activities;
-DROP TABLE IF EXISTS public.jobs;
-DROP TABLE IF EXISTS public.users;
-
-DROP FUNCTION IF EXISTS public.check_email_format();
-DROP FUNCTION IF EXISTS public.check_phone_format();
-DROP FUNCTION IF EXISTS public.update_updated_at_column();
-
-DROP TYPE IF EXISTS public.application_status;
-DROP TYPE IF EXISTS public.job_type;
-
 CREATE TYPE public.job_type AS ENUM ('internship', 'vacancy');
 CREATE TYPE public.application_status AS ENUM ('pending', 'under_review', 'interview', 'offer', 'hired', 'rejected', 'withdrawn');
 
@@ -53,6 +31,31 @@ BEGIN
 END;
 $$;
 
+CREATE FUNCTION public.notify_catalogue_change() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    row_id INTEGER;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        row_id := OLD.id;
+    ELSE
+        row_id := NEW.id;
+    END IF;
+    PERFORM pg_notify(TG_ARGV[0], json_build_object('id', row_id, 'operation', TG_OP)::text);
+    RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION public.notify_content_change() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('content_updates', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$;
+
 
 -- Table Creation
 
@@ -145,11 +148,39 @@ CREATE TABLE public.applications (
             (job_id IS NOT NULL AND activity_id IS NULL)
             OR
             (job_id IS NULL AND activity_id IS NOT NULL)
-        )
+        ),
+
+    CONSTRAINT application_user_job_unique UNIQUE (user_id, job_id),
+    CONSTRAINT application_user_activity_unique UNIQUE (user_id, activity_id)
 );
 COMMENT ON TABLE public.applications IS 'User applications for either jobs/internships OR activities';
 COMMENT ON COLUMN public.applications.status IS 'Current status of the application';
 COMMENT ON CONSTRAINT application_target_check ON public.applications IS 'Ensures an application is linked to EITHER a job OR an activity, not both or neither.';
+COMMENT ON CONSTRAINT application_user_job_unique ON public.applications IS 'One application per user and job; target of INSERT ... ON CONFLICT in the bot.';
+COMMENT ON CONSTRAINT application_user_activity_unique ON public.applications IS 'One registration per user and activity; target of INSERT ... ON CONFLICT in the bot.';
+
+CREATE TABLE public.activity_reminders (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    activity_id INTEGER NOT NULL,
+    reminder_type VARCHAR(16) NOT NULL,
+    sent_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    CONSTRAINT fk_reminder_user
+        FOREIGN KEY(user_id)
+        REFERENCES public.users(id)
+        ON DELETE CASCADE,
+
+    CONSTRAINT fk_reminder_activity
+        FOREIGN KEY(activity_id)
+        REFERENCES public.activities(id)
+        ON DELETE CASCADE,
+
+    CONSTRAINT activity_reminder_unique UNIQUE (user_id, activity_id, reminder_type)
+);
+COMMENT ON TABLE public.activity_reminders IS 'Ledger of activity reminders claimed (scheduled or sent) per user';
 
 CREATE TABLE public.hr_contacts (
     id SERIAL PRIMARY KEY,
@@ -209,6 +240,31 @@ BEFORE INSERT OR UPDATE ON public.users
 FOR EACH ROW
 EXECUTE FUNCTION public.check_phone_format();
 
+CREATE TRIGGER jobs_catalogue_notify
+AFTER INSERT OR UPDATE OR DELETE ON public.jobs
+FOR EACH ROW
+EXECUTE FUNCTION public.notify_catalogue_change('jobs_updates');
+
+CREATE TRIGGER activities_catalogue_notify
+AFTER INSERT OR UPDATE OR DELETE ON public.activities
+FOR EACH ROW
+EXECUTE FUNCTION public.notify_catalogue_change('activities');
+
+CREATE TRIGGER faq_content_notify
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.faq
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.notify_content_change();
+
+CREATE TRIGGER hr_contacts_content_notify
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.hr_contacts
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.notify_content_change();
+
+CREATE TRIGGER company_contacts_content_notify
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.company_contacts
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.notify_content_change();
+
 -- Create Indexes for performance
 
 CREATE INDEX idx_applications_user_id ON public.applications(user_id);
@@ -220,5 +276,6 @@ CREATE INDEX idx_jobs_is_active ON public.jobs(is_active);
 CREATE INDEX idx_activities_is_active ON public.activities(is_active);
 CREATE INDEX idx_faq_display_order ON public.faq(display_order);
 CREATE INDEX idx_users_city ON public.users(city);
-
-SELECT 'Database schema created successfully.' as status;
\ No newline at end of file
+CREATE INDEX idx_jobs_active_keyset ON public.jobs(type, created_at DESC, id DESC) WHERE is_active = TRUE;
+CREATE INDEX idx_activities_active_keyset ON public.activities(start_time, id) WHERE is_active = TRUE;
+CREATE INDEX idx_applications_user_keyset ON public.applications(user_id, application_time DESC, id DESC);
@@ -0,0 +1,60 @@
+-- Status/comment changes on applications and time changes on activities
+-- are pushed to the bot via NOTIFY (see db_listener.py).
+
+CREATE FUNCTION public.notify_application_update() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify(
+        'application_updates',
+        json_build_object('id', NEW.id, 'user_id', NEW.user_id, 'status', NEW.status)::text
+    );
+    RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION public.notify_activity_update() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify(
+        'activity_updates',
+        json_build_object('id', NEW.id, 'start_time', NEW.start_time, 'end_time', NEW.end_time)::text
+    );
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER applications_update_notify
+AFTER UPDATE OF status, hr_comment ON public.applications
+FOR EACH ROW
+WHEN (OLD.status IS DISTINCT FROM NEW.status OR OLD.hr_comment IS DISTINCT FROM NEW.hr_comment)
+EXECUTE FUNCTION public.notify_application_update();
+
+CREATE TRIGGER activities_update_notify
+AFTER UPDATE OF start_time, end_time ON public.activities
+FOR EACH ROW
+WHEN (OLD.start_time IS DISTINCT FROM NEW.start_time OR OLD.end_time IS DISTINCT FROM NEW.end_time)
+EXECUTE FUNCTION public.notify_activity_update();
+
+-- Indexes for hot queries
+
+-- Job list without a type filter: WHERE is_active ORDER BY created_at DESC, id DESC
+CREATE INDEX idx_jobs_active_created_keyset ON public.jobs(created_at DESC, id DESC) WHERE is_active = TRUE;
+
+-- "Upcoming" activities: is_active = TRUE AND end_time >= NOW().
+-- NOW() is not immutable and cannot appear in an index predicate, so the
+-- partial index covers is_active and keeps end_time as the key for the range condition.
+CREATE INDEX idx_activities_active_end_time ON public.activities(end_time) WHERE is_active = TRUE;
+
+-- Recipients of activity time-change notifications (get_user_ids_for_activity)
+DROP INDEX IF EXISTS public.idx_applications_activity_id;
+CREATE INDEX idx_applications_activity_user ON public.applications(activity_id, user_id) WHERE activity_id IS NOT NULL;
+
+-- Duplicates of the unique constraints / keyset index added in 0001
+DROP INDEX IF EXISTS public.idx_applications_user_id;
+DROP INDEX IF EXISTS public.idx_applications_job_id;
+CREATE INDEX idx_applications_job_id ON public.applications(job_id) WHERE job_id IS NOT NULL;
+
+-- Reminder ledger lookups by activity (reminder cancellation/rescheduling)
+CREATE INDEX idx_activity_reminders_activity ON public.activity_reminders(activity_id);
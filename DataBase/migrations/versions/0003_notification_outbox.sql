@@ -0,0 +1,60 @@
+-- Durable outbox for user notifications. Triggers write a row in the same
+-- transaction as the change; the bot's outbox worker claims rows with
+-- FOR UPDATE SKIP LOCKED, sends them and marks them delivered (at-least-once).
+
+CREATE TABLE public.notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    kind VARCHAR(32) NOT NULL,
+    user_id BIGINT,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_until TIMESTAMPTZ,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    delivered_at TIMESTAMPTZ,
+
+    CONSTRAINT notification_outbox_status_check CHECK (status IN ('pending', 'delivered', 'failed'))
+);
+COMMENT ON TABLE public.notification_outbox IS 'Pending and delivered user notifications (transactional outbox)';
+COMMENT ON COLUMN public.notification_outbox.locked_until IS 'Lease of the worker that claimed the row; expired leases are claimed again';
+
+CREATE INDEX idx_notification_outbox_pending ON public.notification_outbox(available_at, id) WHERE status = 'pending';
+
+-- Application status/comment change: one row for the applicant
+CREATE OR REPLACE FUNCTION public.notify_application_update() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO public.notification_outbox (kind, user_id, payload)
+    VALUES (
+        'application_status',
+        NEW.user_id,
+        json_build_object(
+            'application_id', NEW.id,
+            'status', NEW.status,
+            'hr_comment', NEW.hr_comment,
+            'target_title', COALESCE(
+                (SELECT title FROM public.jobs WHERE id = NEW.job_id),
+                (SELECT title FROM public.activities WHERE id = NEW.activity_id),
+                'Неизвестная цель'
+            )
+        )::jsonb
+    );
+    PERFORM pg_notify('notification_outbox', '');
+    RETURN NULL;
+END;
+$$;
+
+-- Activity time change: one row per change, the worker fans it out to registrants
+CREATE OR REPLACE FUNCTION public.notify_activity_update() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO public.notification_outbox (kind, payload)
+    VALUES ('activity_time_change', json_build_object('activity_id', NEW.id)::jsonb);
+    PERFORM pg_notify('notification_outbox', '');
+    RETURN NULL;
+END;
+$$;
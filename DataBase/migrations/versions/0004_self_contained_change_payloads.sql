@@ -0,0 +1,45 @@
+-- Change payloads carry everything their consumer needs, so the bot builds
+-- messages and updates the catalogue replica without reading the row back.
+
+-- Catalogue changes carry the whole row. NOTIFY payloads must stay under
+-- 8000 bytes, so an oversized row falls back to id + operation and the
+-- bot refetches it.
+CREATE OR REPLACE FUNCTION public.notify_catalogue_change() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    payload TEXT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        payload := json_build_object('id', OLD.id, 'operation', TG_OP)::text;
+    ELSE
+        payload := json_build_object('id', NEW.id, 'operation', TG_OP, 'row', to_jsonb(NEW))::text;
+        IF octet_length(payload) >= 8000 THEN
+            payload := json_build_object('id', NEW.id, 'operation', TG_OP)::text;
+        END IF;
+    END IF;
+    PERFORM pg_notify(TG_ARGV[0], payload);
+    RETURN NULL;
+END;
+$$;
+
+-- Activity time change: the outbox row carries the activity as of the change
+-- and its previous times (outbox payloads are JSONB, no NOTIFY size limit)
+CREATE OR REPLACE FUNCTION public.notify_activity_update() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO public.notification_outbox (kind, payload)
+    VALUES (
+        'activity_time_change',
+        json_build_object(
+            'activity_id', NEW.id,
+            'activity', to_jsonb(NEW),
+            'old_start_time', OLD.start_time,
+            'old_end_time', OLD.end_time
+        )::jsonb
+    );
+    PERFORM pg_notify('notification_outbox', '');
+    RETURN NULL;
+END;
+$$;
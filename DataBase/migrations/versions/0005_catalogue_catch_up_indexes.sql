@@ -0,0 +1,4 @@
+-- Catalogue catch-up after the listener reconnects reads rows changed since
+-- the replica's watermark: WHERE (updated_at, id) > (...) ORDER BY updated_at, id
+CREATE INDEX idx_jobs_updated_keyset ON public.jobs(updated_at, id);
+CREATE INDEX idx_activities_updated_keyset ON public.activities(updated_at, id);
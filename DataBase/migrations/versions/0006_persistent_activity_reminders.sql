@@ -0,0 +1,13 @@
+-- Reminders are persisted: a claimed reminder keeps its due time in run_at and
+-- stays pending (sent_at IS NULL) until a send claims it. The scheduler
+-- rehydrates pending reminders from this table at startup.
+-- Rows written before this migration did not record whether they were sent;
+-- they keep their sent_at and are treated as handled.
+
+ALTER TABLE public.activity_reminders ADD COLUMN run_at TIMESTAMPTZ;
+ALTER TABLE public.activity_reminders ALTER COLUMN sent_at DROP NOT NULL;
+ALTER TABLE public.activity_reminders ALTER COLUMN sent_at DROP DEFAULT;
+COMMENT ON TABLE public.activity_reminders IS 'Activity reminders per user: pending (sent_at IS NULL) until sent';
+COMMENT ON COLUMN public.activity_reminders.run_at IS 'When the reminder is due';
+
+CREATE INDEX idx_activity_reminders_pending ON public.activity_reminders(run_at) WHERE sent_at IS NULL;
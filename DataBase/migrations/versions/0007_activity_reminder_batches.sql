@@ -0,0 +1,4 @@
+-- Reminders fire once per (activity, reminder type) and claim that
+-- activity's pending rows in batches:
+-- WHERE activity_id = ... AND reminder_type = ... AND sent_at IS NULL
+CREATE INDEX idx_activity_reminders_pending_activity ON public.activity_reminders(activity_id, reminder_type) WHERE sent_at IS NULL;
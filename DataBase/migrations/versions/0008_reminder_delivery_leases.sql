@@ -0,0 +1,11 @@
+-- Reminder delivery is at-least-once: the sweep leases due rows
+-- (locked_until), sends them and only then sets sent_at. Failed sends are
+-- retried with exponential backoff; a lease left by a crashed or demoted
+-- leader expires and the rows are claimed again.
+-- sent_at now means the reminder is closed: sent, skipped (activity withdrawn,
+-- started or moved too close) or given up after max attempts.
+
+ALTER TABLE public.activity_reminders ADD COLUMN locked_until TIMESTAMPTZ;
+ALTER TABLE public.activity_reminders ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0;
+COMMENT ON COLUMN public.activity_reminders.locked_until IS 'Lease of the sweep that claimed the row, or retry backoff after a failed send';
+COMMENT ON COLUMN public.activity_reminders.sent_at IS 'When the reminder was closed: sent, skipped or given up';
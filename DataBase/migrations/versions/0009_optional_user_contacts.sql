@@ -0,0 +1,5 @@
+-- /start creates the user before the profile is filled in: email and phone
+-- are NULL until the user enters them. UNIQUE still allows any number of NULLs.
+
+ALTER TABLE public.users ALTER COLUMN email DROP NOT NULL;
+ALTER TABLE public.users ALTER COLUMN phone DROP NOT NULL;
@@ -0,0 +1,12 @@
+-- Catalogue comments for the reminder sweep (0008). Reminders are not
+-- rehydrated at startup: the leader's periodic sweep leases due rows by
+-- run_at across all activities (idx_activity_reminders_pending) and sets
+-- sent_at once the reminder is closed.
+-- idx_activity_reminders_pending_activity no longer serves the sweep, but it
+-- is still the index for the per-activity maintenance statements:
+-- retime_pending, delete_pending_of_type and delete_pending_for_activities
+-- (WHERE activity_id = ... [AND reminder_type = ...] AND sent_at IS NULL).
+
+COMMENT ON TABLE public.activity_reminders IS 'Activity reminders per user: pending (sent_at IS NULL) until the leader''s sweep leases them by run_at and closes them';
+COMMENT ON INDEX public.idx_activity_reminders_pending IS 'Sweep: due pending reminders across all activities, ordered by run_at';
+COMMENT ON INDEX public.idx_activity_reminders_pending_activity IS 'Retime and cancel pending reminders of one activity (and reminder type) after catalogue changes';
@@ -1,6 +1,6 @@
 from datetime import datetime, date, time
 from decimal import Decimal
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from enum import Enum
 
 from pydantic import BaseModel, EmailStr, model_validator
@@ -23,7 +23,10 @@ class BaseDBModel(BaseModel):
     created_at: datetime
     updated_at: datetime
 
-class User(BaseModel):
+def has_complete_contacts(email: Optional[str], phone: Optional[str]) -> bool:
+    return bool(phone) and phone != "unknown" and bool(email) and "@telegram.user" not in email
+
+class UserProfile(BaseModel):
     id: int
     full_name: str
     email: Optional[EmailStr] = None
@@ -38,10 +41,25 @@ class User(BaseModel):
     desired_employment: Optional[str] = None
     relocation_readiness: bool = False
     about_me: Optional[str] = None
-    photo: Optional[bytes] = None
     created_at: datetime
     updated_at: datetime
 
+    @property
+    def is_profile_complete(self) -> bool:
+        return has_complete_contacts(self.email, self.phone)
+
+class User(UserProfile):
+    photo: Optional[bytes] = None
+
+class UserEligibility(BaseModel):
+    id: int
+    email: Optional[str] = None
+    phone: Optional[str] = None
+
+    @property
+    def is_profile_complete(self) -> bool:
+        return has_complete_contacts(self.email, self.phone)
+
 class UserCreate(BaseModel):
     id: int
     full_name: str
@@ -148,10 +166,36 @@ class ContentRepoData(BaseModel):
     company_contacts: List[CompanyContact] = []
 
 class ReminderType(str, Enum):
+    D7 = "7d"
     H24 = "24h"
+    H1 = "1h"
 
 class ActivityReminder(BaseDBModel):
     user_id: int
     activity_id: int
     reminder_type: ReminderType
-    sent_at: datetime
+    run_at: Optional[datetime] = None
+    sent_at: Optional[datetime] = None
+
+class OutboxKind(str, Enum):
+    APPLICATION_STATUS = "application_status"
+    ACTIVITY_TIME_CHANGE = "activity_time_change"
+
+class OutboxStatus(str, Enum):
+    PENDING = "pending"
+    DELIVERED = "delivered"
+    FAILED = "failed"
+
+class OutboxMessage(BaseModel):
+    id: int
+    # Сырое значение колонки: вид, которого нет в OutboxKind (новый триггер при выкатке), не должен ронять аренду пачки
+    kind: str
+    user_id: Optional[int] = None
+    payload: Dict[str, Any] = {}
+    status: OutboxStatus
+    attempts: int = 0
+    available_at: datetime
+    locked_until: Optional[datetime] = None
+    last_error: Optional[str] = None
+    created_at: datetime
+    delivered_at: Optional[datetime] = None
@@ -1,66 +1,122 @@
-from typing import Optional
+from typing import Dict, List, Sequence, Tuple
 import logging
 from datetime import datetime
 
-from psycopg.rows import class_row
+from psycopg.rows import tuple_row
 
 from . import ActivityReminder, ReminderType 
-from .. import get_db_cursor 
+from .base_repo import BaseRepository
 
 logger = logging.getLogger(__name__)
 
-class ActivityReminderRepository:
+class ActivityReminderRepository(BaseRepository):
     _table_name = "activity_reminders"
     _model = ActivityReminder
+    _queries = {
+        # Все напоминания регистрации (по одному на смещение) одной командой
+        "add_pending_reminders": """
+            INSERT INTO public.{table} (user_id, activity_id, reminder_type, run_at)
+            SELECT %s, %s, v.reminder_type, v.run_at
+            FROM unnest(%s::varchar[], %s::timestamptz[]) AS v(reminder_type, run_at)
+            ON CONFLICT (user_id, activity_id, reminder_type) DO NOTHING
+            RETURNING reminder_type
+        """,
+        # Периодический обход: пачка наступивших напоминаний по idx_activity_reminders_pending,
+        # аренда (FOR UPDATE SKIP LOCKED + locked_until) и данные активности для текста одним запросом.
+        # sent_at ставится только после отправки; просроченная аренда забирается заново
+        "claim_due_batch": """
+            WITH due AS (
+                SELECT id FROM public.{table}
+                WHERE sent_at IS NULL AND run_at <= NOW()
+                  AND (locked_until IS NULL OR locked_until < NOW())
+                ORDER BY run_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE public.{table} r
+            SET locked_until = NOW() + make_interval(secs => %s), attempts = r.attempts + 1
+            FROM due, public.activities a
+            WHERE r.id = due.id AND a.id = r.activity_id
+            RETURNING r.id, r.user_id, r.activity_id, r.reminder_type, r.run_at, r.attempts, a.title, a.start_time, a.is_active
+        """,
+        "mark_closed": "UPDATE public.{table} SET sent_at = NOW(), locked_until = NULL WHERE id = ANY(%s)",
+        # Экспоненциальная задержка от числа попыток; после max_attempts напоминание закрывается
+        "mark_retry": """
+            UPDATE public.{table}
+            SET locked_until = NOW() + make_interval(secs => LEAST(%s * power(2, attempts - 1), %s)),
+                sent_at = CASE WHEN attempts >= %s THEN NOW() END
+            WHERE id = ANY(%s)
+        """,
+        "requeue_claimed": "UPDATE public.{table} SET run_at = %s, locked_until = NULL, attempts = 0 WHERE id = ANY(%s)",
+        "count_pending": "SELECT reminder_type, COUNT(*) FROM public.{table} WHERE sent_at IS NULL GROUP BY reminder_type",
+        "delete_pending_for_user": "DELETE FROM public.{table} WHERE user_id = %s AND activity_id = %s AND sent_at IS NULL",
+        "delete_pending_for_activities": "DELETE FROM public.{table} WHERE activity_id = ANY(%s) AND sent_at IS NULL",
+        "delete_pending_of_type": "DELETE FROM public.{table} WHERE activity_id = ANY(%s) AND reminder_type = %s AND sent_at IS NULL",
+        # После переноса: напоминания записанных, которых еще нет (при регистрации срок уже прошел или
+        # их удалили при переносе в прошлое), тем же ON CONFLICT, что и при регистрации. Уже закрытые не трогаются
+        "add_missing_for_registrants": """
+            INSERT INTO public.{table} (user_id, activity_id, reminder_type, run_at)
+            SELECT app.user_id, v.activity_id, %s, v.run_at
+            FROM unnest(%s::int[], %s::timestamptz[]) AS v(activity_id, run_at)
+            JOIN public.applications app ON app.activity_id = v.activity_id
+            ON CONFLICT (user_id, activity_id, reminder_type) DO NOTHING
+        """,
+        # Перенос времени всех ожидающих напоминаний пачки активностей одной командой
+        "retime_pending": """
+            UPDATE public.{table} r SET run_at = v.run_at
+            FROM unnest(%s::int[], %s::timestamptz[]) AS v(activity_id, run_at)
+            WHERE r.activity_id = v.activity_id AND r.reminder_type = %s
+              AND r.sent_at IS NULL AND r.run_at IS DISTINCT FROM v.run_at
+        """,
+    }
 
-    async def _execute_query(self, query: str, params: Optional[tuple] = None, fetch_one: bool = False, fetch_all: bool = False, row_factory: type = None):
-        factory = row_factory if row_factory else class_row(self._model)
-        async with get_db_cursor(row_factory=factory) as cur:
-            await cur.execute(query, params)
-            if fetch_one:
-                return await cur.fetchone()
-            if fetch_all:
-                return await cur.fetchall()
-            return cur.rowcount if cur.rowcount != -1 else None 
-
-    async def add_reminder_sent(self, user_id: int, activity_id: int, reminder_type: ReminderType) -> Optional[ActivityReminder]:
-        query = (
-            f"INSERT INTO public.{self._table_name} (user_id, activity_id, reminder_type, sent_at) "
-            f"VALUES (%s, %s, %s, %s) RETURNING *"
-        )
-        params = (user_id, activity_id, reminder_type.value, datetime.utcnow())
+    async def delete_pending_for_user(self, user_id: int, activity_id: int) -> int:
         try:
-            created_reminder = await self._execute_query(query, params, fetch_one=True)
-            if created_reminder:
-                logger.info(f"Reminder {reminder_type.value} for activity {activity_id} to user {user_id} marked as sent.")
-            return created_reminder
+            return await self._execute_query("delete_pending_for_user", (user_id, activity_id)) or 0
         except Exception as e:
-            logger.error(f"Error adding reminder entry for user {user_id}, activity {activity_id}, type {reminder_type.value}: {e}", exc_info=True)
-            return None
+            logger.error(f"Error deleting pending reminders for user {user_id}, activity {activity_id}: {e}", exc_info=True)
+            return 0
 
-    async def has_reminder_been_sent(self, user_id: int, activity_id: int, reminder_type: ReminderType) -> bool:
-        query = f"SELECT EXISTS (SELECT 1 FROM public.{self._table_name} WHERE user_id = %s AND activity_id = %s AND reminder_type = %s)"
-        params = (user_id, activity_id, reminder_type.value)
-        try:
-            async with get_db_cursor() as cur: 
-                await cur.execute(query, params)
-                result = await cur.fetchone()
-                return result[0] if result else False
-        except Exception as e:
-            logger.error(f"Error checking if reminder was sent for user {user_id}, activity {activity_id}, type {reminder_type.value}: {e}", exc_info=True)
-            return False 
+    async def delete_pending_for_activities(self, activity_ids: List[int]) -> int:
+        return await self._execute_query("delete_pending_for_activities", (list(activity_ids),)) or 0
 
-    async def delete_reminder(self, user_id: int, activity_id: int, reminder_type: ReminderType) -> bool:
-        query = f"DELETE FROM public.{self._table_name} WHERE user_id = %s AND activity_id = %s AND reminder_type = %s"
-        params = (user_id, activity_id, reminder_type.value)
-        try:
-            rows_affected = await self._execute_query(query, params, row_factory=None) 
-            deleted = rows_affected is not None and rows_affected > 0
-            if deleted:
-                logger.info(f"Reminder entry for user {user_id}, activity {activity_id}, type {reminder_type.value} deleted from DB.")
-            else:
-                logger.info(f"No reminder entry found in DB to delete for user {user_id}, activity {activity_id}, type {reminder_type.value}.")
-            return deleted
-        except Exception as e:
-            logger.error(f"Error deleting reminder entry from DB for user {user_id}, activity {activity_id}, type {reminder_type.value}: {e}", exc_info=True)
-            return False 
+    async def delete_pending_of_type(self, reminder_type: ReminderType, activity_ids: List[int]) -> int:
+        return await self._execute_query("delete_pending_of_type", (list(activity_ids), reminder_type.value)) or 0
+
+    async def retime_pending(self, reminder_type: ReminderType, run_at_by_activity: Dict[int, datetime]) -> int:
+        activity_ids = list(run_at_by_activity)
+        params = (activity_ids, [run_at_by_activity[activity_id] for activity_id in activity_ids], reminder_type.value)
+        return await self._execute_query("retime_pending", params) or 0
+
+    async def add_missing_for_registrants(self, reminder_type: ReminderType, run_at_by_activity: Dict[int, datetime]) -> int:
+        activity_ids = list(run_at_by_activity)
+        params = (reminder_type.value, activity_ids, [run_at_by_activity[activity_id] for activity_id in activity_ids])
+        return await self._execute_query("add_missing_for_registrants", params) or 0
+
+    async def add_pending_reminders(self, user_id: int, activity_id: int, run_at_by_type: Dict[ReminderType, datetime]) -> List[ReminderType]:
+        # Возвращает типы, которых еще не было: повторная регистрация ничего не дублирует
+        reminder_types = list(run_at_by_type)
+        params = (user_id, activity_id, [reminder_type.value for reminder_type in reminder_types], [run_at_by_type[reminder_type] for reminder_type in reminder_types])
+        rows = await self._execute_query("add_pending_reminders", params, fetch_all=True, row_factory=tuple_row) or []
+        return [ReminderType(row[0]) for row in rows]
+
+    async def claim_due_batch(self, limit: int, lease_seconds: float) -> List[Tuple[int, int, int, str, datetime, int, str, datetime, bool]]:
+        # (id, user_id, activity_id, reminder_type, run_at, attempts, title, start_time, is_active); строки арендованы до отправки
+        return await self._execute_query("claim_due_batch", (limit, lease_seconds), fetch_all=True, row_factory=tuple_row) or []
+
+    async def mark_closed(self, ids: Sequence[int]) -> int:
+        if not ids:
+            return 0
+        return await self._execute_query("mark_closed", (list(ids),)) or 0
+
+    async def mark_retry(self, ids: Sequence[int], base_delay: float, max_delay: float, max_attempts: int) -> int:
+        if not ids:
+            return 0
+        return await self._execute_query("mark_retry", (base_delay, max_delay, max_attempts, list(ids))) or 0
+
+    async def requeue_claimed(self, ids: Sequence[int], run_at: datetime) -> int:
+        return await self._execute_query("requeue_claimed", (run_at, list(ids))) or 0
+
+    async def count_pending(self) -> Dict[str, int]:
+        rows = await self._execute_query("count_pending", fetch_all=True, row_factory=tuple_row) or []
+        return {reminder_type: count for reminder_type, count in rows}
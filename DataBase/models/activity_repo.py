@@ -1,52 +1,91 @@
-from typing import Optional, List
+from datetime import datetime
+from typing import Optional, List, Set, Tuple
 import logging
+from psycopg.rows import dict_row, tuple_row
 
 from . import Activity
-from .. import get_db_cursor
-from psycopg.rows import class_row
+from .base_repo import BaseRepository, build_trusted
+from .pagination import Page, Cursor, build_keyset_clause, make_page
 
 logger = logging.getLogger(__name__)
 
-class ActivityRepository:
+class ActivityRepository(BaseRepository):
     _table_name = "activities"
     _model = Activity
-
-    async def _execute_query(self, query: str, params: Optional[tuple] = None, fetch_one: bool = False, fetch_all: bool = False):
-        factory = class_row(self._model)
-        async with get_db_cursor(row_factory=factory) as cur:
-            await cur.execute(query, params)
-            if fetch_one:
-                return await cur.fetchone()
-            if fetch_all:
-                return await cur.fetchall()
-            return None
+    _queries = {
+        "get_by_id": "SELECT * FROM public.{table} WHERE id = %s AND is_active = TRUE AND end_time >= NOW()",
+        "get_active_by_ids": "SELECT * FROM public.{table} WHERE id = ANY(%s) AND is_active = TRUE AND end_time >= NOW()",
+        "get_changed_since": "SELECT * FROM public.{table} WHERE (updated_at, id) > (%s, %s) ORDER BY updated_at, id LIMIT %s",
+        "get_all_ids": "SELECT id FROM public.{table}",
+        "get_activity_details_for_notification": "SELECT * FROM public.{table} WHERE id = %s",
+        "get_all_active_activities": "SELECT * FROM public.{table} WHERE is_active = TRUE AND end_time >= NOW() ORDER BY start_time ASC, id ASC",
+        "get_with_application_state": """
+            SELECT act.*, app.id AS application_id
+            FROM public.{table} act
+            LEFT JOIN public.applications app ON app.activity_id = act.id AND app.user_id = %s
+            WHERE act.id = %s AND act.is_active = TRUE AND act.end_time >= NOW()
+        """,
+    }
 
     async def get_by_id(self, activity_id: int) -> Optional[Activity]:
-        query = f"SELECT * FROM public.{self._table_name} WHERE id = %s AND is_active = TRUE AND end_time >= NOW()"
         try:
-            return await self._execute_query(query, (activity_id,), fetch_one=True)
+            return await self._execute_query("get_by_id", (activity_id,), fetch_one=True)
         except Exception as e:
             logger.error(f"Error fetching activity {activity_id}: {e}", exc_info=True)
             return None
 
+    async def get_with_application_state(self, activity_id: int, user_id: int) -> Tuple[Optional[Activity], bool]:
+        # Активность и признак "пользователь уже зарегистрирован" одним запросом
+        try:
+            row = await self._execute_query("get_with_application_state", (user_id, activity_id), fetch_one=True, row_factory=dict_row)
+        except Exception as e:
+            logger.error(f"Error fetching activity {activity_id} with application state for user {user_id}: {e}", exc_info=True)
+            return None, False
+        if not row:
+            return None, False
+        application_id = row.pop('application_id')
+        return build_trusted(Activity, row), application_id is not None
+
     async def get_activity_details_for_notification(self, activity_id: int) -> Optional[Activity]:
-        query = f"SELECT * FROM public.{self._table_name} WHERE id = %s"
         try:
-            return await self._execute_query(query, (activity_id,), fetch_one=True)
+            return await self._execute_query("get_activity_details_for_notification", (activity_id,), fetch_one=True)
         except Exception as e:
             logger.error(f"Error fetching activity details for notification {activity_id}: {e}", exc_info=True)
             return None
 
-    async def get_active_activities(self, upcoming_only: bool = True, limit: int = 20, offset: int = 0) -> List[Activity]:
+    async def get_active_activities(self, upcoming_only: bool = True, limit: int = 20, after: Optional[Cursor] = None, before: Optional[Cursor] = None) -> Page[Activity]:
         params = []
         where_clauses = ["is_active = TRUE"]
         if upcoming_only:
             where_clauses.append("end_time >= NOW()")
+        keyset_sql, keyset_params, order_sql = build_keyset_clause(("start_time", "id"), descending=False, after=after, before=before)
+        if keyset_sql:
+            where_clauses.append(keyset_sql)
+            params.extend(keyset_params)
         where_sql = " AND ".join(where_clauses)
-        params.extend([limit, offset])
-        query = f"SELECT * FROM public.{self._table_name} WHERE {where_sql} ORDER BY start_time ASC, id ASC LIMIT %s OFFSET %s"
+        params.append(limit + 1)
+        variant = f"{'upcoming' if upcoming_only else 'all'}:{'before' if before else 'after' if after else 'first'}"
         try:
-            return await self._execute_query(query, tuple(params), fetch_all=True) or []
+            rows = await self._execute_query(
+                f"get_active_activities:{variant}", tuple(params), fetch_all=True,
+                build=lambda: f"SELECT * FROM public.{self._table_name} WHERE {where_sql} ORDER BY {order_sql} LIMIT %s"
+            ) or []
+            return make_page(rows, limit, after=after, before=before)
         except Exception as e:
             logger.error(f"Error fetching active activities: {e}", exc_info=True)
-            return []
+            return Page()
+
+    async def get_all_active_activities(self) -> List[Activity]:
+        return await self._execute_query("get_all_active_activities", fetch_all=True) or []
+
+    async def get_active_by_ids(self, activity_ids: List[int]) -> List[Activity]:
+        # Пачка изменений каталога одним запросом; отсутствующие в ответе id неактивны или удалены
+        return await self._execute_query("get_active_by_ids", (list(activity_ids),), fetch_all=True) or []
+
+    async def get_changed_since(self, updated_at: datetime, after_id: int, limit: int) -> List[Activity]:
+        # Keyset по (updated_at, id), включая неактивные строки: догоняем реплику после переподключения
+        return await self._execute_query("get_changed_since", (updated_at, after_id, limit), fetch_all=True) or []
+
+    async def get_all_ids(self) -> Set[int]:
+        rows = await self._execute_query("get_all_ids", fetch_all=True, row_factory=tuple_row) or []
+        return {row[0] for row in rows}
@@ -1,133 +1,174 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Union
 import logging
 from psycopg import errors as psycopg_errors
-from psycopg.rows import dict_row, class_row
+from psycopg.rows import dict_row
 import asyncio
 from aiogram import Bot
 
-from . import Application, ApplicationCreate, ApplicationStatus, Activity
+from . import Application, ApplicationCreate, ApplicationStatus, Activity, Job
 from .activity_repo import ActivityRepository
-from .. import get_db_cursor
+from .base_repo import BaseRepository, build_trusted
+from .pagination import Page, Cursor, build_keyset_clause, make_page
 
 logger = logging.getLogger(__name__)
 
-class ApplicationRepository:
+DELETABLE_STATUSES = (ApplicationStatus.PENDING, ApplicationStatus.UNDER_REVIEW)
+
+# Вставка и чтение существующей заявки одним запросом; уникальность (user_id, job_id) / (user_id, activity_id) держит БД
+_ADD_QUERY_TEMPLATE = """
+    WITH inserted AS (
+        INSERT INTO public.{{table}} (user_id, {target}) VALUES (%s, %s)
+        ON CONFLICT (user_id, {target}) DO NOTHING
+        RETURNING *
+    )
+    SELECT inserted.*, FALSE AS existed FROM inserted
+    UNION ALL
+    SELECT app.*, TRUE AS existed FROM public.{{table}} app
+    WHERE app.user_id = %s AND app.{target} = %s AND NOT EXISTS (SELECT 1 FROM inserted)
+    LIMIT 1
+"""
+
+class ApplicationRepository(BaseRepository):
     _table_name = "applications"
     _model = Application
-
-    async def _execute_query(self, query: str, params: Optional[tuple] = None, fetch_one: bool = False, fetch_all: bool = False, row_factory: type = None):
-        factory = row_factory if row_factory else class_row(self._model)
-        async with get_db_cursor(row_factory=factory) as cur:
-            await cur.execute(query, params)
-            if fetch_one:
-                return await cur.fetchone()
-            if fetch_all:
-                return await cur.fetchall()
-            return cur.rowcount if cur.rowcount != -1 else None
-
-    async def add(self, app_data: ApplicationCreate) -> Optional[Application]:
-        existing_app = await self.get_by_user_and_target(
-            user_id=app_data.user_id,
-            job_id=app_data.job_id,
-            activity_id=app_data.activity_id
-        )
-
-        if existing_app:
-             logger.warning(f"User {app_data.user_id} already has an active application {existing_app.id} for this target.")
-             return existing_app
-
-        data_dict = app_data.model_dump(exclude_unset=True)
-        fields = ', '.join(data_dict.keys())
-        placeholders = ', '.join(['%s'] * len(data_dict))
-        values = tuple(data_dict.values())
-        query = (
-            f"INSERT INTO public.{self._table_name} ({fields}) "
-            f"VALUES ({placeholders}) RETURNING *"
-        )
+    _queries = {
+        "get_by_id_and_user": "SELECT * FROM public.{table} WHERE id = %s AND user_id = %s",
+        "get_by_user_and_job": "SELECT * FROM public.{table} WHERE user_id = %s AND job_id = %s",
+        "get_by_user_and_activity": "SELECT * FROM public.{table} WHERE user_id = %s AND activity_id = %s",
+        "get_with_target": """
+            SELECT app.*, to_jsonb(j) AS job, to_jsonb(act) AS activity
+            FROM public.{table} app
+            LEFT JOIN public.jobs j ON app.job_id = j.id AND j.is_active = TRUE
+            LEFT JOIN public.activities act ON app.activity_id = act.id AND act.is_active = TRUE AND act.end_time >= NOW()
+            WHERE app.id = %s AND app.user_id = %s
+        """,
+        "add_for_job": _ADD_QUERY_TEMPLATE.format(target="job_id"),
+        "add_for_activity": _ADD_QUERY_TEMPLATE.format(target="activity_id"),
+        "delete_by_user": (
+            "DELETE FROM public.{table} WHERE id = %s AND user_id = %s "
+            f"AND status IN ({', '.join(repr(status.value) for status in DELETABLE_STATUSES)}) "
+            "RETURNING *"
+        ),
+        "get_application_details_for_notification": """
+            SELECT
+                app.id, app.user_id, app.status, app.hr_comment,
+                COALESCE(j.title, act.title, 'Неизвестная цель') AS target_title,
+                app.job_id, app.activity_id
+            FROM public.applications app
+            LEFT JOIN public.jobs j ON app.job_id = j.id
+            LEFT JOIN public.activities act ON app.activity_id = act.id
+            WHERE app.id = %s;
+        """,
+    }
+
+    async def add(self, app_data: ApplicationCreate) -> Tuple[Optional[Application], bool]:
+        # Возвращает (заявка, existed): existed=True, если заявка на эту цель уже была
+        if app_data.job_id is not None:
+            name, target_id = "add_for_job", app_data.job_id
+        else:
+            name, target_id = "add_for_activity", app_data.activity_id
+        params = (app_data.user_id, target_id, app_data.user_id, target_id)
         try:
-            created_app = await self._execute_query(query, values, fetch_one=True, row_factory=class_row(self._model))
-            if created_app:
-                logger.info(f"Application {created_app.id} created by user {created_app.user_id}.")
-                return created_app
+            row = await self._execute_query(name, params, fetch_one=True, row_factory=dict_row)
+            if row is None:
+                # Конкурентная вставка из параллельного клика еще не видна в снимке этого запроса
+                existing_app = await self.get_by_user_and_target(user_id=app_data.user_id, job_id=app_data.job_id, activity_id=app_data.activity_id)
+                return existing_app, existing_app is not None
+            existed = row.pop('existed')
+            application = build_trusted(Application, row)
+            if existed:
+                logger.warning(f"User {app_data.user_id} already has an active application {application.id} for this target.")
             else:
-                 logger.error(f"Failed to retrieve created application data for user {app_data.user_id}.")
-                 return None
+                logger.info(f"Application {application.id} created by user {application.user_id}.")
+            return application, existed
         except psycopg_errors.ForeignKeyViolation as e:
              logger.error(f"Error adding application for user {app_data.user_id}: Foreign key violation. {e}")
-             return None
+             return None, False
         except Exception as e:
             logger.error(f"Error adding application for user {app_data.user_id}: {e}", exc_info=True)
-            return None
+            return None, False
 
     async def get_by_id_and_user(self, app_id: int, user_id: int) -> Optional[Application]:
-        query = f"SELECT * FROM public.{self._table_name} WHERE id = %s AND user_id = %s"
         try:
-            return await self._execute_query(query, (app_id, user_id), fetch_one=True, row_factory=class_row(self._model))
+            return await self._execute_query("get_by_id_and_user", (app_id, user_id), fetch_one=True)
         except Exception as e:
             logger.error(f"Error fetching application {app_id} for user {user_id}: {e}", exc_info=True)
             return None
 
-    async def get_user_applications_with_details(self, user_id: int, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
-        query = """
-            SELECT
-                app.id, app.status, app.application_time, app.job_id, app.activity_id,
-                COALESCE(j.title, act.title, 'Неизвестная цель') AS target_title
-            FROM public.applications app
-            LEFT JOIN public.jobs j ON app.job_id = j.id
-            LEFT JOIN public.activities act ON app.activity_id = act.id
-            WHERE app.user_id = %s
-            ORDER BY app.application_time DESC
-            LIMIT %s OFFSET %s;
-        """
-        params = (user_id, limit, offset)
+    async def get_with_target(self, app_id: int, user_id: int) -> Tuple[Optional[Application], Union[Job, Activity, None]]:
+        # Заявка вместе с ее вакансией/активностью (если та еще доступна) одним запросом
+        try:
+            row = await self._execute_query("get_with_target", (app_id, user_id), fetch_one=True, row_factory=dict_row)
+        except Exception as e:
+            logger.error(f"Error fetching application {app_id} with target for user {user_id}: {e}", exc_info=True)
+            return None, None
+        if not row:
+            return None, None
+        job_data, activity_data = row.pop('job'), row.pop('activity')
+        # Цель приходит как jsonb (даты строками), поэтому ее собираем с валидацией
+        target: Union[Job, Activity, None] = None
+        if job_data:
+            target = Job.model_validate(job_data)
+        elif activity_data:
+            target = Activity.model_validate(activity_data)
+        return build_trusted(Application, row), target
+
+    async def get_user_applications_with_details(self, user_id: int, limit: int = 20, after: Optional[Cursor] = None, before: Optional[Cursor] = None) -> Page[Dict[str, Any]]:
+        keyset_sql, keyset_params, order_sql = build_keyset_clause(("app.application_time", "app.id"), descending=True, after=after, before=before)
+        where_sql = "app.user_id = %s" + (f" AND {keyset_sql}" if keyset_sql else "")
+        params = (user_id, *keyset_params, limit + 1)
+        variant = 'before' if before else 'after' if after else 'first'
         try:
-            results = await self._execute_query(query, params, fetch_all=True, row_factory=dict_row)
+            results = await self._execute_query(
+                f"get_user_applications_with_details:{variant}", params, fetch_all=True, row_factory=dict_row,
+                build=lambda: f"""
+                    SELECT
+                        app.id, app.status, app.application_time, app.job_id, app.activity_id,
+                        COALESCE(j.title, act.title, 'Неизвестная цель') AS target_title
+                    FROM public.applications app
+                    LEFT JOIN public.jobs j ON app.job_id = j.id
+                    LEFT JOIN public.activities act ON app.activity_id = act.id
+                    WHERE {where_sql}
+                    ORDER BY {order_sql}
+                    LIMIT %s;
+                """
+            )
             if results:
                 for row in results:
                      if 'status' in row and isinstance(row['status'], str):
                          try: row['status'] = ApplicationStatus(row['status'])
                          except ValueError: logger.warning(f"Unknown status '{row['status']}' for app {row.get('id')}")
-            return results or []
+            return make_page(results or [], limit, after=after, before=before)
         except Exception as e:
             logger.error(f"Error fetching applications with details for user {user_id}: {e}", exc_info=True)
-            return []
+            return Page()
 
     async def get_by_user_and_target(self, user_id: int, job_id: Optional[int] = None, activity_id: Optional[int] = None) -> Optional[Application]:
          if job_id is not None:
-             query = f"SELECT * FROM public.{self._table_name} WHERE user_id = %s AND job_id = %s"
+             name = "get_by_user_and_job"
              params = (user_id, job_id)
          elif activity_id is not None:
-             query = f"SELECT * FROM public.{self._table_name} WHERE user_id = %s AND activity_id = %s"
+             name = "get_by_user_and_activity"
              params = (user_id, activity_id)
          else:
              return None
          try:
-             return await self._execute_query(query, params, fetch_one=True, row_factory=class_row(self._model))
+             return await self._execute_query(name, params, fetch_one=True)
          except Exception as e:
               logger.error(f"Error checking application for user {user_id}, target job={job_id}, activity={activity_id}: {e}", exc_info=True)
               return None
 
-    async def delete_by_user(self, app_id: int, user_id: int) -> bool:
-        current_app = await self.get_by_id_and_user(app_id, user_id)
-        if not current_app:
-            logger.warning(f"Application {app_id} not found or does not belong to user {user_id} for deletion.")
-            return False
-        allowed_statuses_for_deletion = [ApplicationStatus.PENDING, ApplicationStatus.UNDER_REVIEW]
-        if current_app.status not in allowed_statuses_for_deletion:
-             logger.warning(f"Application {app_id} cannot be deleted by user {user_id} due to current status: {current_app.status}")
-             return False
-        query = f"DELETE FROM public.{self._table_name} WHERE id = %s AND user_id = %s"
+    async def delete_by_user(self, app_id: int, user_id: int) -> Optional[Application]:
         try:
-            rows_affected = await self._execute_query(query, (app_id, user_id), row_factory=None)
-            deleted = rows_affected is not None and rows_affected > 0
-            if deleted:
+            deleted_app = await self._execute_query("delete_by_user", (app_id, user_id), fetch_one=True)
+            if deleted_app:
                 logger.info(f"Application {app_id} deleted by user {user_id}.")
             else:
-                logger.warning(f"Application {app_id} was not found during deletion for user {user_id} (maybe deleted concurrently?).")
-            return deleted
+                logger.warning(f"Application {app_id} not found, does not belong to user {user_id} or its status does not allow deletion.")
+            return deleted_app
         except Exception as e:
             logger.error(f"Error deleting application {app_id} for user {user_id}: {e}", exc_info=True)
-            return False
+            return None
 
     async def update_status_and_comment(
         self,
@@ -148,13 +189,15 @@ class ApplicationRepository:
         set_clause = ", ".join(set_parts)
         params.append(application_id)
 
-        query = (
-            f"UPDATE public.{self._table_name} "
-            f"SET {set_clause}, updated_at = NOW() "
-            f"WHERE id = %s"
-        )
         try:
-            rows_affected = await self._execute_query(query, tuple(params), row_factory=None)
+            rows_affected = await self._execute_query(
+                f"update_status_and_comment:{'comment' if hr_comment is not None else 'no_comment'}", tuple(params),
+                build=lambda: (
+                    f"UPDATE public.{self._table_name} "
+                    f"SET {set_clause}, updated_at = NOW() "
+                    f"WHERE id = %s"
+                )
+            )
             updated = rows_affected is not None and rows_affected > 0
             if updated:
                 logger.info(f"Application {application_id} status updated to {new_status}, hr_comment processed.")
@@ -166,18 +209,8 @@ class ApplicationRepository:
             return False
 
     async def get_application_details_for_notification(self, application_id: int) -> Optional[dict]:
-        query = """
-            SELECT
-                app.id, app.user_id, app.status, app.hr_comment,
-                COALESCE(j.title, act.title, 'Неизвестная цель') AS target_title,
-                app.job_id, app.activity_id
-            FROM public.applications app
-            LEFT JOIN public.jobs j ON app.job_id = j.id
-            LEFT JOIN public.activities act ON app.activity_id = act.id
-            WHERE app.id = %s;
-        """
         try:
-            result = await self._execute_query(query, (application_id,), fetch_one=True, row_factory=dict_row)
+            result = await self._execute_query("get_application_details_for_notification", (application_id,), fetch_one=True, row_factory=dict_row)
             if result and 'status' in result and isinstance(result['status'], str):
                  try:
                      result['status'] = ApplicationStatus(result['status'])
@@ -187,17 +220,3 @@ class ApplicationRepository:
         except Exception as e:
             logger.error(f"Error fetching application details for notification (app_id {application_id}): {e}", exc_info=True)
             return None
-
-    async def get_user_ids_for_activity(self, activity_id: int) -> List[int]:
-        query = f"SELECT DISTINCT user_id FROM public.{self._table_name} WHERE activity_id = %s"
-        params = (activity_id,)
-        user_ids = []
-        try:
-            results = await self._execute_query(query, params, fetch_all=True, row_factory=dict_row)
-            if results:
-                user_ids = [row['user_id'] for row in results]
-            logger.debug(f"Found {len(user_ids)} users for activity {activity_id}: {user_ids}")
-            return user_ids
-        except Exception as e:
-            logger.error(f"Error fetching user IDs for activity {activity_id}: {e}", exc_info=True)
-            return []
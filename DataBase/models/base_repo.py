@@ -1,46 +1,159 @@
-from abc import ABC, abstractmethod
-from typing import TypeVar, Generic, Optional, List, Type, Any
-from psycopg.rows import class_row, dict_row
+import logging
+import time
+import typing
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional, Type, Any, Callable, Dict, Sequence, Mapping, TypeVar
 from pydantic import BaseModel
 
-from .. import get_db_cursor
+from .. import get_db_cursor, app_config
 
-ModelType = TypeVar("ModelType", bound=BaseModel)
-CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
-UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
+logger = logging.getLogger(__name__)
 
-class BaseRepository(ABC, Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+SLOW_QUERY_MS = app_config.db.slow_query_ms if app_config and app_config.db else 200
 
-    def __init__(self, model: Type[ModelType]):
-        self._model = model
+@dataclass
+class QueryStats:
+    calls: int = 0
+    rows: int = 0
+    errors: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
 
     @property
-    @abstractmethod
-    def _table_name(self) -> str:
-        pass
-
-    async def _execute_query(self, query: str, params: Optional[tuple] = None, fetch_one: bool = False, fetch_all: bool = False, model_factory: bool = True):
-        factory = class_row(self._model) if model_factory and self._model else dict_row
-        async with get_db_cursor(row_factory=factory) as cur:
-            await cur.execute(query, params)
-            if fetch_one:
-                return await cur.fetchone()
-            if fetch_all:
-                return await cur.fetchall()
-            return cur.rowcount if cur.rowcount != -1 else None
-
-    async def get_by_id(self, item_id: Any) -> Optional[ModelType]:
-        query = f"SELECT * FROM public.{self._table_name} WHERE id = %s"
-        return await self._execute_query(query, (item_id,), fetch_one=True)
-
-    async def get_all(self, limit: int = 100, offset: int = 0) -> List[ModelType]:
-        query = f"SELECT * FROM public.{self._table_name} ORDER BY id LIMIT %s OFFSET %s"
-        return await self._execute_query(query, (limit, offset), fetch_all=True)
-
-    @abstractmethod
-    async def add(self, item_data: CreateSchemaType) -> Optional[ModelType]:
-        pass
-
-    @abstractmethod
-    async def update(self, item_id: Any, item_data: UpdateSchemaType) -> Optional[ModelType]:
-        pass
\ No newline at end of file
+    def avg_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
+
+_query_stats: Dict[str, QueryStats] = {}
+_model_row_factories: Dict[Type[BaseModel], Any] = {}
+_model_enum_fields: Dict[Type[BaseModel], Dict[str, Type[Enum]]] = {}
+
+ModelType = TypeVar("ModelType", bound=BaseModel)
+
+def get_query_stats() -> Dict[str, QueryStats]:
+    return dict(_query_stats)
+
+def _enum_fields(model: Type[BaseModel]) -> Dict[str, Type[Enum]]:
+    # Колонки-ENUM приходят из psycopg строками; без валидации их нужно привести к Enum вручную
+    fields = _model_enum_fields.get(model)
+    if fields is None:
+        fields = {}
+        for name, field in model.model_fields.items():
+            candidates = typing.get_args(field.annotation) or (field.annotation,)
+            for candidate in candidates:
+                if isinstance(candidate, type) and issubclass(candidate, Enum):
+                    fields[name] = candidate
+                    break
+        _model_enum_fields[model] = fields
+    return fields
+
+def build_trusted(model: Type[ModelType], data: Mapping[str, Any]) -> ModelType:
+    # Строки из наших же таблиц уже прошли ограничения БД, поэтому pydantic-валидация пропускается.
+    # Пользовательский ввод (UserUpdate, ApplicationCreate и т.п.) по-прежнему создается обычным конструктором.
+    values = dict(data)
+    for name, enum_type in _enum_fields(model).items():
+        value = values.get(name)
+        if value is not None and not isinstance(value, enum_type):
+            values[name] = enum_type(value)
+    return model.model_construct(**values)
+
+def model_row_factory(model: Type[BaseModel]):
+    factory = _model_row_factories.get(model)
+    if factory is None:
+        enum_fields = _enum_fields(model)
+
+        def factory(cursor):
+            if cursor.description is None:
+                return lambda values: None
+            names = [column.name for column in cursor.description]
+            converters = [(index, enum_fields[name]) for index, name in enumerate(names) if name in enum_fields]
+            construct = model.model_construct
+
+            def make_row(values: Sequence[Any]):
+                if converters:
+                    values = list(values)
+                    for index, enum_type in converters:
+                        value = values[index]
+                        if value is not None and not isinstance(value, enum_type):
+                            values[index] = enum_type(value)
+                return construct(**dict(zip(names, values)))
+            return make_row
+
+        _model_row_factories[model] = factory
+    return factory
+
+def _record_query(statement: str, elapsed_ms: float, rows: int, failed: bool):
+    stats = _query_stats.get(statement)
+    if stats is None:
+        stats = _query_stats[statement] = QueryStats()
+    stats.calls += 1
+    stats.rows += rows
+    stats.total_ms += elapsed_ms
+    stats.max_ms = max(stats.max_ms, elapsed_ms)
+    if failed:
+        stats.errors += 1
+    if elapsed_ms >= SLOW_QUERY_MS:
+        logger.warning(f"Slow query {statement}: {elapsed_ms:.1f} ms, {rows} rows.")
+
+class BaseRepository:
+    """
+    Общее ядро выполнения запросов для репозиториев.
+
+    SQL регистрируется один раз под именем (из _queries или лениво через build)
+    и выполняется как server-side prepared statement. Для каждого имени
+    копится статистика: число вызовов, строк, ошибок и время выполнения.
+    Строки превращаются в модели через model_row_factory, без валидации.
+    """
+    _table_name: str = ""
+    _model: Optional[Type[BaseModel]] = None
+    _queries: Dict[str, str] = {}
+    _statements: Dict[str, str] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._statements = {name: sql.format(table=cls._table_name) for name, sql in cls._queries.items()}
+
+    @classmethod
+    def _statement(cls, name: str, build: Optional[Callable[[], str]] = None) -> str:
+        sql = cls._statements.get(name)
+        if sql is None:
+            if build is None:
+                raise KeyError(f"Statement '{name}' is not registered in {cls.__name__}.")
+            sql = build()
+            cls._statements[name] = sql
+        return sql
+
+    async def _execute_query(
+        self,
+        name: str,
+        params: Optional[Sequence[Any]] = None,
+        fetch_one: bool = False,
+        fetch_all: bool = False,
+        row_factory: Any = None,
+        build: Optional[Callable[[], str]] = None,
+    ):
+        query = self._statement(name, build)
+        if row_factory is None and self._model is not None:
+            row_factory = model_row_factory(self._model)
+        statement = f"{type(self).__name__}.{name}"
+        rows = 0
+        failed = False
+        started = time.perf_counter()
+        try:
+            async with get_db_cursor(row_factory=row_factory) as cur:
+                await cur.execute(query, params, prepare=True)
+                if fetch_one:
+                    result = await cur.fetchone()
+                    rows = 1 if result is not None else 0
+                    return result
+                if fetch_all:
+                    result = await cur.fetchall()
+                    rows = len(result)
+                    return result
+                rows = cur.rowcount if cur.rowcount != -1 else 0
+                return cur.rowcount if cur.rowcount != -1 else None
+        except Exception:
+            failed = True
+            raise
+        finally:
+            _record_query(statement, (time.perf_counter() - started) * 1000, rows, failed)
@@ -1,29 +1,26 @@
 import logging
-from psycopg.rows import class_row
+from typing import Optional
+from psycopg.rows import dict_row
 
-from . import FAQ, HRContact, CompanyContact, ContentRepoData
-from .. import get_db_cursor
+from . import ContentRepoData
+from .base_repo import BaseRepository
 
 logger = logging.getLogger(__name__)
 
-class ContentRepository:
+class ContentRepository(BaseRepository):
+    _queries = {
+        "get_all_content": """
+            SELECT
+                (SELECT COALESCE(json_agg(f ORDER BY f.display_order ASC, f.id ASC), '[]'::json) FROM public.faq f) AS faqs,
+                (SELECT COALESCE(json_agg(h ORDER BY h.id ASC), '[]'::json) FROM public.hr_contacts h) AS hr_contacts,
+                (SELECT COALESCE(json_agg(c ORDER BY c.id ASC), '[]'::json) FROM public.company_contacts c) AS company_contacts;
+        """,
+    }
 
-    async def get_all_content(self) -> ContentRepoData:
-        content = ContentRepoData()
+    async def get_all_content(self) -> Optional[ContentRepoData]:
         try:
-            async with get_db_cursor(row_factory=class_row(FAQ)) as cur:
-                await cur.execute("SELECT * FROM public.faq ORDER BY display_order ASC, id ASC")
-                content.faqs = await cur.fetchall() or []
-
-            async with get_db_cursor(row_factory=class_row(HRContact)) as cur:
-                await cur.execute("SELECT * FROM public.hr_contacts ORDER BY id ASC")
-                content.hr_contacts = await cur.fetchall() or []
-
-            async with get_db_cursor(row_factory=class_row(CompanyContact)) as cur:
-                await cur.execute("SELECT * FROM public.company_contacts ORDER BY id ASC")
-                content.company_contacts = await cur.fetchall() or []
-
+            row = await self._execute_query("get_all_content", fetch_one=True, row_factory=dict_row)
+            return ContentRepoData(**row) if row else ContentRepoData()
         except Exception as e:
             logger.error(f"Error loading content data: {e}", exc_info=True)
-            return ContentRepoData()
-        return content
\ No newline at end of file
+            return None
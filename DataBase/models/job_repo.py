@@ -1,47 +1,87 @@
-from typing import Optional, List
+from datetime import datetime
+from typing import Optional, List, Set, Tuple
 import logging
+from psycopg.rows import dict_row, tuple_row
 
 from . import Job, JobType
-from .. import get_db_cursor
-from psycopg.rows import class_row
+from .base_repo import BaseRepository, build_trusted
+from .pagination import Page, Cursor, build_keyset_clause, make_page
 
 logger = logging.getLogger(__name__)
 
-class JobRepository:
+class JobRepository(BaseRepository):
     _table_name = "jobs"
     _model = Job
-
-    async def _execute_query(self, query: str, params: Optional[tuple] = None, fetch_one: bool = False, fetch_all: bool = False):
-        factory = class_row(self._model)
-        async with get_db_cursor(row_factory=factory) as cur:
-            await cur.execute(query, params)
-            if fetch_one:
-                return await cur.fetchone()
-            if fetch_all:
-                return await cur.fetchall()
-            return None
+    _queries = {
+        "get_by_id": "SELECT * FROM public.{table} WHERE id = %s AND is_active = TRUE",
+        "get_active_by_ids": "SELECT * FROM public.{table} WHERE id = ANY(%s) AND is_active = TRUE",
+        "get_changed_since": "SELECT * FROM public.{table} WHERE (updated_at, id) > (%s, %s) ORDER BY updated_at, id LIMIT %s",
+        "get_all_ids": "SELECT id FROM public.{table}",
+        "get_all_active_jobs": "SELECT * FROM public.{table} WHERE is_active = TRUE ORDER BY created_at DESC, id DESC",
+        "get_with_application_state": """
+            SELECT j.*, app.id AS application_id
+            FROM public.{table} j
+            LEFT JOIN public.applications app ON app.job_id = j.id AND app.user_id = %s
+            WHERE j.id = %s AND j.is_active = TRUE
+        """,
+    }
 
     async def get_by_id(self, job_id: int) -> Optional[Job]:
-        query = f"SELECT * FROM public.{self._table_name} WHERE id = %s AND is_active = TRUE"
         try:
-            return await self._execute_query(query, (job_id,), fetch_one=True)
+            return await self._execute_query("get_by_id", (job_id,), fetch_one=True)
         except Exception as e:
             logger.error(f"Error fetching job {job_id}: {e}", exc_info=True)
             return None
 
-    async def get_active_jobs(self, job_type: Optional[JobType] = None, limit: int = 20, offset: int = 0) -> List[Job]:
+    async def get_with_application_state(self, job_id: int, user_id: int) -> Tuple[Optional[Job], bool]:
+        # Вакансия и признак "пользователь уже откликался" одним запросом
+        try:
+            row = await self._execute_query("get_with_application_state", (user_id, job_id), fetch_one=True, row_factory=dict_row)
+        except Exception as e:
+            logger.error(f"Error fetching job {job_id} with application state for user {user_id}: {e}", exc_info=True)
+            return None, False
+        if not row:
+            return None, False
+        application_id = row.pop('application_id')
+        return build_trusted(Job, row), application_id is not None
+
+    async def get_active_jobs(self, job_type: Optional[JobType] = None, limit: int = 20, after: Optional[Cursor] = None, before: Optional[Cursor] = None) -> Page[Job]:
         params = []
         where_clauses = ["is_active = TRUE"]
         if job_type:
             where_clauses.append("type = %s")
             params.append(job_type.value)
 
+        keyset_sql, keyset_params, order_sql = build_keyset_clause(("created_at", "id"), descending=True, after=after, before=before)
+        if keyset_sql:
+            where_clauses.append(keyset_sql)
+            params.extend(keyset_params)
+
         where_sql = " AND ".join(where_clauses)
-        params.extend([limit, offset])
+        params.append(limit + 1)
 
-        query = f"SELECT * FROM public.{self._table_name} WHERE {where_sql} ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s"
+        variant = f"{'by_type' if job_type else 'all'}:{'before' if before else 'after' if after else 'first'}"
         try:
-            return await self._execute_query(query, tuple(params), fetch_all=True) or []
+            rows = await self._execute_query(
+                f"get_active_jobs:{variant}", tuple(params), fetch_all=True,
+                build=lambda: f"SELECT * FROM public.{self._table_name} WHERE {where_sql} ORDER BY {order_sql} LIMIT %s"
+            ) or []
+            return make_page(rows, limit, after=after, before=before)
         except Exception as e:
             logger.error(f"Error fetching active jobs: {e}", exc_info=True)
-            return []
\ No newline at end of file
+            return Page()
+
+    async def get_all_active_jobs(self) -> List[Job]:
+        return await self._execute_query("get_all_active_jobs", fetch_all=True) or []
+
+    async def get_active_by_ids(self, job_ids: List[int]) -> List[Job]:
+        # Пачка изменений каталога одним запросом; отсутствующие в ответе id неактивны или удалены
+        return await self._execute_query("get_active_by_ids", (list(job_ids),), fetch_all=True) or []
+
+    async def get_changed_since(self, updated_at: datetime, after_id: int, limit: int) -> List[Job]:
+        # Keyset по (updated_at, id), включая неактивные строки: догоняем реплику после переподключения
+        return await self._execute_query("get_changed_since", (updated_at, after_id, limit), fetch_all=True) or []
+
+    async def get_all_ids(self) -> Set[int]:
+        rows = await self._execute_query("get_all_ids", fetch_all=True, row_factory=tuple_row) or []
+        return {row[0] for row in rows}
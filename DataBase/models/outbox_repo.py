@@ -0,0 +1,87 @@
+from typing import Any, Dict, List, Sequence
+import json
+import logging
+
+from . import OutboxMessage
+from .base_repo import BaseRepository
+
+logger = logging.getLogger(__name__)
+
+class NotificationOutboxRepository(BaseRepository):
+    _table_name = "notification_outbox"
+    _model = OutboxMessage
+    _queries = {
+        # Аренда пачки: строки, занятые другим воркером, пропускаются; просроченная аренда забирается заново
+        "claim_batch": """
+            UPDATE public.{table} o
+            SET locked_until = NOW() + make_interval(secs => %s), attempts = o.attempts + 1
+            WHERE o.id IN (
+                SELECT id FROM public.{table}
+                WHERE status = 'pending' AND available_at <= NOW()
+                  AND (locked_until IS NULL OR locked_until < NOW())
+                ORDER BY available_at, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING o.*
+        """,
+        "mark_delivered": """
+            UPDATE public.{table}
+            SET status = 'delivered', delivered_at = NOW(), locked_until = NULL, last_error = NULL
+            WHERE id = ANY(%s)
+        """,
+        "mark_failed": """
+            UPDATE public.{table}
+            SET status = 'failed', locked_until = NULL, last_error = %s
+            WHERE id = ANY(%s)
+        """,
+        # Экспоненциальная задержка от числа попыток; после max_attempts строка остается в failed
+        "mark_retry": """
+            UPDATE public.{table}
+            SET locked_until = NULL,
+                last_error = %s,
+                available_at = NOW() + make_interval(secs => LEAST(%s * power(2, attempts - 1), %s)),
+                status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END
+            WHERE id = ANY(%s)
+        """,
+        # Изменение активности разворачивается в строку на каждого записанного и закрывается
+        # той же командой: повторная аренда исходной строки ничего не задублирует.
+        # Записанные идут по idx_applications_activity_user
+        "expand_to_activity_registrants": """
+            WITH source AS (
+                UPDATE public.{table}
+                SET status = 'delivered', delivered_at = NOW(), locked_until = NULL, last_error = NULL
+                WHERE id = %s AND status = 'pending'
+                RETURNING kind
+            )
+            INSERT INTO public.{table} (kind, user_id, payload)
+            SELECT source.kind, app.user_id, %s::jsonb
+            FROM source
+            JOIN public.applications app ON app.activity_id = %s
+        """,
+    }
+
+    async def claim_batch(self, batch_size: int, lease_seconds: float) -> List[OutboxMessage]:
+        try:
+            return await self._execute_query("claim_batch", (lease_seconds, batch_size), fetch_all=True) or []
+        except Exception as e:
+            logger.error(f"Error claiming outbox batch: {e}", exc_info=True)
+            return []
+
+    async def mark_delivered(self, ids: Sequence[int]) -> int:
+        if not ids:
+            return 0
+        return await self._execute_query("mark_delivered", (list(ids),)) or 0
+
+    async def mark_failed(self, ids: Sequence[int], error: str) -> int:
+        if not ids:
+            return 0
+        return await self._execute_query("mark_failed", (error, list(ids))) or 0
+
+    async def mark_retry(self, ids: Sequence[int], error: str, base_delay: float, max_delay: float, max_attempts: int) -> int:
+        if not ids:
+            return 0
+        return await self._execute_query("mark_retry", (error, base_delay, max_delay, max_attempts, list(ids))) or 0
+
+    async def expand_to_activity_registrants(self, message_id: int, activity_id: int, payload: Dict[str, Any]) -> int:
+        return await self._execute_query("expand_to_activity_registrants", (message_id, json.dumps(payload), activity_id)) or 0
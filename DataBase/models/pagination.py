@@ -0,0 +1,53 @@
+from dataclasses import dataclass, field
+from typing import TypeVar, Generic, Optional, List, Tuple, Any, Callable, Sequence
+
+ItemType = TypeVar("ItemType")
+Cursor = Tuple[Any, int]
+
+@dataclass
+class Page(Generic[ItemType]):
+    items: List[ItemType] = field(default_factory=list)
+    has_next: bool = False
+    has_prev: bool = False
+
+def build_keyset_clause(columns: Tuple[str, str], descending: bool, after: Optional[Cursor] = None, before: Optional[Cursor] = None) -> Tuple[Optional[str], list, str]:
+    # Возвращает условие по курсору, его параметры и ORDER BY; при движении назад порядок обращается (см. make_page)
+    row = f"({columns[0]}, {columns[1]})"
+    if before is not None:
+        comparison = ">" if descending else "<"
+        direction = "ASC" if descending else "DESC"
+        cursor = before
+    else:
+        comparison = "<" if descending else ">"
+        direction = "DESC" if descending else "ASC"
+        cursor = after
+    order_sql = f"{columns[0]} {direction}, {columns[1]} {direction}"
+    if cursor is None:
+        return None, [], order_sql
+    return f"{row} {comparison} (%s, %s)", [cursor[0], cursor[1]], order_sql
+
+def make_page(rows: Sequence[ItemType], limit: int, after: Optional[Cursor] = None, before: Optional[Cursor] = None) -> Page[ItemType]:
+    # Запрос выбирает limit + 1 строк: лишняя строка означает, что в этом направлении есть еще страница
+    has_more = len(rows) > limit
+    items = list(rows[:limit])
+    if before is not None:
+        items.reverse()
+        return Page(items=items, has_next=True, has_prev=has_more)
+    return Page(items=items, has_next=has_more, has_prev=after is not None)
+
+def paginate_sorted(items: Sequence[ItemType], key: Callable[[ItemType], Cursor], limit: int, descending: bool, after: Optional[Cursor] = None, before: Optional[Cursor] = None) -> Page[ItemType]:
+    # То же самое для уже отсортированного списка в памяти
+    if before is not None:
+        if descending:
+            candidates = [item for item in items if key(item) > before]
+        else:
+            candidates = [item for item in items if key(item) < before]
+        rows = list(reversed(candidates))[:limit + 1]
+    elif after is not None:
+        if descending:
+            rows = [item for item in items if key(item) < after][:limit + 1]
+        else:
+            rows = [item for item in items if key(item) > after][:limit + 1]
+    else:
+        rows = list(items[:limit + 1])
+    return make_page(rows, limit, after=after, before=before)
@@ -1,50 +1,61 @@
-from typing import Optional
+from typing import Optional, Tuple
 import logging
 from psycopg import errors as psycopg_errors
+from psycopg.rows import tuple_row, dict_row
 
-from . import User, UserCreate, UserUpdate
-from .. import get_db_cursor
-from psycopg.rows import class_row
+from . import User, UserProfile, UserEligibility, UserCreate, UserUpdate
+from .base_repo import BaseRepository, model_row_factory, build_trusted
 
 logger = logging.getLogger(__name__)
 
-class UserRepository:
+# Проекции без бинарной колонки photo: ее читаем только через get_photo
+PROFILE_COLUMNS = ", ".join(UserProfile.model_fields.keys())
+ELIGIBILITY_COLUMNS = ", ".join(UserEligibility.model_fields.keys())
+
+class UserRepository(BaseRepository):
     _table_name = "users"
     _model = User
-
-    async def _execute_query(self, query: str, params: Optional[tuple] = None, fetch_one: bool = False, fetch_all: bool = False, model_factory: bool = True):
-        factory = class_row(self._model) if model_factory and self._model else None
-        async with get_db_cursor(row_factory=factory) as cur:
-            await cur.execute(query, params)
-            if fetch_one:
-                return await cur.fetchone()
-            if fetch_all:
-                return await cur.fetchall()
-            return cur.rowcount if cur.rowcount != -1 else None
+    _queries = {
+        "get_by_id": "SELECT * FROM public.{table} WHERE id = %s",
+        "get_profile": f"SELECT {PROFILE_COLUMNS} FROM public.{{table}} WHERE id = %s",
+        "get_eligibility": f"SELECT {ELIGIBILITY_COLUMNS} FROM public.{{table}} WHERE id = %s",
+        "get_photo": "SELECT photo FROM public.{table} WHERE id = %s",
+    }
 
     async def get_by_id(self, user_id: int) -> Optional[User]:
-        query = f"SELECT * FROM public.{self._table_name} WHERE id = %s"
-        return await self._execute_query(query, (user_id,), fetch_one=True)
+        return await self._execute_query("get_by_id", (user_id,), fetch_one=True)
+
+    async def get_profile(self, user_id: int) -> Optional[UserProfile]:
+        return await self._execute_query("get_profile", (user_id,), fetch_one=True, row_factory=model_row_factory(UserProfile))
+
+    async def get_eligibility(self, user_id: int) -> Optional[UserEligibility]:
+        return await self._execute_query("get_eligibility", (user_id,), fetch_one=True, row_factory=model_row_factory(UserEligibility))
 
-    async def add(self, user_data: UserCreate) -> Optional[User]:
+    async def get_photo(self, user_id: int) -> Optional[bytes]:
+        row = await self._execute_query("get_photo", (user_id,), fetch_one=True, row_factory=tuple_row)
+        return row[0] if row else None
+
+    async def add(self, user_data: UserCreate) -> Optional[UserProfile]:
         data_dict = user_data.model_dump(exclude_unset=True)
         fields = ', '.join(data_dict.keys())
         placeholders = ', '.join(['%s'] * len(data_dict))
         values = tuple(data_dict.values())
 
-        query = (
-            f"INSERT INTO public.{self._table_name} ({fields}) "
-            f"VALUES ({placeholders}) "
-            f"ON CONFLICT (id) DO NOTHING "
-            f"RETURNING *"
-        )
         try:
-            created_user = await self._execute_query(query, values, fetch_one=True)
+            created_user = await self._execute_query(
+                f"add:{fields}", values, fetch_one=True, row_factory=model_row_factory(UserProfile),
+                build=lambda: (
+                    f"INSERT INTO public.{self._table_name} ({fields}) "
+                    f"VALUES ({placeholders}) "
+                    f"ON CONFLICT (id) DO NOTHING "
+                    f"RETURNING {PROFILE_COLUMNS}"
+                )
+            )
             if created_user:
                  logger.info(f"User profile for {created_user.id} created.")
             else:
                  logger.warning(f"User profile for {user_data.id} already exists.")
-                 return await self.get_by_id(user_data.id)
+                 return await self.get_profile(user_data.id)
             return created_user
         except psycopg_errors.UniqueViolation as e:
              logger.error(f"Error adding user {user_data.id}: Unique constraint violated. {e}")
@@ -53,22 +64,56 @@ class UserRepository:
             logger.error(f"Error adding user {user_data.id}: {e}", exc_info=True)
             return None
 
-    async def update(self, user_id: int, user_data: UserUpdate) -> Optional[User]:
+    async def upsert(self, user_data: UserCreate) -> Tuple[Optional[UserProfile], bool]:
+        # Первый контакт: вставка или чтение существующего профиля одним запросом. Возвращает (профиль, created)
+        data_dict = user_data.model_dump(exclude_unset=True)
+        fields = ', '.join(data_dict.keys())
+        placeholders = ', '.join(['%s'] * len(data_dict))
+        values = tuple(data_dict.values()) + (user_data.id,)
+
+        try:
+            row = await self._execute_query(
+                f"upsert:{fields}", values, fetch_one=True, row_factory=dict_row,
+                build=lambda: (
+                    f"WITH inserted AS ("
+                    f"INSERT INTO public.{self._table_name} ({fields}) VALUES ({placeholders}) "
+                    f"ON CONFLICT (id) DO NOTHING RETURNING {PROFILE_COLUMNS}) "
+                    f"SELECT {PROFILE_COLUMNS}, TRUE AS created FROM inserted "
+                    f"UNION ALL "
+                    f"SELECT {PROFILE_COLUMNS}, FALSE AS created FROM public.{self._table_name} "
+                    f"WHERE id = %s AND NOT EXISTS (SELECT 1 FROM inserted) "
+                    f"LIMIT 1"
+                )
+            )
+            if row is None:
+                # Параллельная вставка того же пользователя еще не видна в снимке этого запроса
+                return await self.get_profile(user_data.id), False
+            created = row.pop('created')
+            if created:
+                logger.info(f"User profile for {user_data.id} created.")
+            return build_trusted(UserProfile, row), created
+        except Exception as e:
+            logger.error(f"Error upserting user {user_data.id}: {e}", exc_info=True)
+            return None, False
+
+    async def update(self, user_id: int, user_data: UserUpdate) -> Optional[UserProfile]:
         data_dict = user_data.model_dump(exclude_unset=True)
 
         if not data_dict:
             logger.warning(f"User {user_id} update called with no data.")
-            return await self.get_by_id(user_id)
+            return await self.get_profile(user_id)
 
         set_clause = ', '.join([f"{key} = %s" for key in data_dict.keys()])
         values = tuple(data_dict.values()) + (user_id,)
 
-        query = (
-            f"UPDATE public.{self._table_name} SET {set_clause} "
-            f"WHERE id = %s RETURNING *"
-        )
         try:
-            updated_user = await self._execute_query(query, values, fetch_one=True)
+            updated_user = await self._execute_query(
+                f"update:{','.join(data_dict.keys())}", values, fetch_one=True, row_factory=model_row_factory(UserProfile),
+                build=lambda: (
+                    f"UPDATE public.{self._table_name} SET {set_clause} "
+                    f"WHERE id = %s RETURNING {PROFILE_COLUMNS}"
+                )
+            )
             if updated_user:
                 logger.info(f"User profile {user_id} updated successfully.")
             else:
@@ -79,4 +124,4 @@ class UserRepository:
              return None
         except Exception as e:
             logger.error(f"Error updating user {user_id}: {e}", exc_info=True)
-            return None
\ No newline at end of file
+            return None
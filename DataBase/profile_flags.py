@@ -0,0 +1,47 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from config import config
+
+
+class ProfileFlagsCache:
+    """
+    Небольшой LRU флагов "профиль заполнен" с коротким TTL.
+
+    Повторные клики "Откликнуться" не ходят в БД за email/телефоном.
+    После изменения профиля запись сбрасывается (см. UserContext).
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[bool, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[bool]:
+        entry = self._entries.get(user_id)
+        if entry is None or time.monotonic() - entry[1] >= self._ttl_seconds:
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, user_id: int, is_complete: bool):
+        self._entries[user_id] = (is_complete, time.monotonic())
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+
+profile_flags = ProfileFlagsCache(
+    ttl_seconds=config.cache.profile_flags_ttl_seconds,
+    max_entries=config.cache.profile_flags_max_entries,
+)
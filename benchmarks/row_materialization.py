@@ -0,0 +1,111 @@
+"""
+Микробенчмарк материализации строк: class_row (полная pydantic-валидация)
+против доверенной сборки model_row_factory (model_construct).
+
+БД не нужна: строки генерируются в памяти в том же виде, в каком их отдает psycopg.
+Запуск из корня проекта:
+
+    python -m benchmarks.row_materialization [--rounds 5]
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+# config.py требует переменные окружения; для офлайн-замера хватает заглушек
+for name, value in (("BOT_TOKEN", "benchmark"), ("DB_USER", "benchmark"), ("DB_PASSWORD", "benchmark"), ("DB_NAME", "benchmark")):
+    os.environ.setdefault(name, value)
+
+from DataBase.models import Job, Activity, Application, UserProfile
+from DataBase.models.base_repo import model_row_factory
+
+NOW = datetime.now(timezone.utc)
+
+
+def job_row(i: int) -> dict:
+    return {
+        "id": i, "created_at": NOW, "updated_at": NOW, "title": f"Вакансия {i}", "description": "Описание " * 20,
+        "type": "vacancy" if i % 2 else "internship", "required_education": "Высшее", "required_experience": "1 год",
+        "required_skills": "Python, SQL", "additional_skills": None, "employment_type": "Полная", "work_schedule": "5/2",
+        "workday_start": None, "workday_end": None, "salary": Decimal("100000.00"), "additional_info": None, "is_active": True,
+    }
+
+
+def activity_row(i: int) -> dict:
+    return {
+        "id": i, "created_at": NOW, "updated_at": NOW, "title": f"Активность {i}", "description": "Описание " * 20,
+        "start_time": NOW + timedelta(days=i % 30), "end_time": NOW + timedelta(days=i % 30, hours=2),
+        "address": "Пермь", "target_audience": "Студенты", "is_active": True,
+    }
+
+
+def application_row(i: int) -> dict:
+    return {
+        "id": i, "created_at": NOW, "updated_at": NOW, "user_id": 1000 + i, "job_id": None, "activity_id": i % 50,
+        "status": "pending", "hr_comment": None, "application_time": NOW,
+    }
+
+
+def profile_row(i: int) -> dict:
+    return {
+        "id": i, "full_name": f"Пользователь {i}", "email": f"user{i}@example.com", "phone": "+79990000000",
+        "gender": None, "birth_date": None, "city": "Пермь", "education": None, "work_experience": None, "skills": None,
+        "desired_salary": None, "desired_employment": None, "relocation_readiness": False, "about_me": None,
+        "created_at": NOW, "updated_at": NOW,
+    }
+
+
+# (сценарий, модель, генератор строки, строк за проход)
+SCENARIOS = (
+    ("list page: jobs", Job, job_row, 21),
+    ("list page: activities", Activity, activity_row, 21),
+    ("fan-out: applications", Application, application_row, 5000),
+    ("user load: profiles", UserProfile, profile_row, 1000),
+)
+
+
+def validated_row_factory(model):
+    # То же, что psycopg.rows.class_row: конструктор модели с полной валидацией
+    def factory(cursor):
+        names = [column.name for column in cursor.description]
+        return lambda values: model(**dict(zip(names, values)))
+    return factory
+
+
+def fake_cursor(columns):
+    return SimpleNamespace(description=[SimpleNamespace(name=name) for name in columns])
+
+
+def measure(row_factory, cursor, rows, rounds: int) -> float:
+    best = None
+    for _ in range(rounds):
+        make_row = row_factory(cursor)
+        started = time.perf_counter()
+        for values in rows:
+            make_row(values)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(rows) / best if best else float("inf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5, help="число повторов, берется лучший результат")
+    parser.add_argument("--repeat", type=int, default=20, help="во сколько раз размножить строки сценария")
+    args = parser.parse_args()
+
+    print(f"{'scenario':<26}{'class_row rows/s':>20}{'trusted rows/s':>20}{'speedup':>10}")
+    for title, model, make, count in SCENARIOS:
+        sample = [make(i) for i in range(1, count * args.repeat + 1)]
+        columns = list(sample[0].keys())
+        rows = [tuple(row[column] for column in columns) for row in sample]
+        cursor = fake_cursor(columns)
+        validated = measure(validated_row_factory(model), cursor, rows, args.rounds)
+        trusted = measure(model_row_factory(model), cursor, rows, args.rounds)
+        print(f"{title:<26}{validated:>20,.0f}{trusted:>20,.0f}{trusted / validated:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import os
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Tuple
 from dotenv import load_dotenv
 import logging
 
@@ -26,6 +27,14 @@ class DbConfig:
     user: str
     password: str
     name: str
+    slow_query_ms: int = 200
+    pool_min_size: int = 1
+    pool_max_size: int = 10
+    pool_max_lifetime: float = 3600.0
+    pool_max_idle: float = 600.0
+    pool_timeout: float = 30.0
+    pool_reconnect_timeout: float = 300.0
+    pool_slow_checkout_ms: int = 100
 
     @property
     def dsn_psycopg(self) -> str:
@@ -33,10 +42,70 @@ class DbConfig:
                 f"dbname={self.name} user={self.user} "
                 f"password={self.password}")
 
+@dataclass
+class CacheConfig:
+    content_ttl_seconds: int = 600
+    profile_flags_ttl_seconds: int = 60
+    profile_flags_max_entries: int = 1024
+
+@dataclass
+class SendConfig:
+    global_rate: float = 25.0
+    background_rate: float = 18.0
+    per_chat_rate: float = 1.0
+    per_chat_burst: int = 3
+    max_retries: int = 3
+    workers: int = 4
+    max_queue_size: int = 10000
+    fanout_concurrency: int = 20
+    notify_coalesce_seconds: float = 3.0
+    notify_dedup_ttl_seconds: float = 3600.0
+
+@dataclass
+class OutboxConfig:
+    workers: int = 2
+    batch_size: int = 50
+    lease_seconds: float = 300.0
+    max_attempts: int = 8
+    retry_base_seconds: float = 10.0
+    retry_max_seconds: float = 3600.0
+    poll_interval: float = 15.0
+
+@dataclass
+class ListenerConfig:
+    workers: int = 2
+    queue_size: int = 1000
+    batch_size: int = 100
+    lag_warning_seconds: float = 5.0
+    reconnect_base_seconds: float = 0.5
+    reconnect_max_seconds: float = 30.0
+
+@dataclass
+class LeaderConfig:
+    lock_key: int = 7340001
+    check_interval: float = 2.0
+
+@dataclass
+class ReminderConfig:
+    offsets: Tuple[str, ...] = ("24h",)
+    sweep_interval_seconds: float = 30.0
+    batch_size: int = 500
+    lease_seconds: float = 300.0
+    max_attempts: int = 5
+    retry_base_seconds: float = 30.0
+    retry_max_seconds: float = 600.0
+    metrics_log_interval_seconds: float = 300.0
+
 @dataclass
 class Config:
     bot: BotConfig
     db: DbConfig
+    cache: CacheConfig
+    send: SendConfig
+    outbox: OutboxConfig
+    listener: ListenerConfig
+    leader: LeaderConfig
+    reminders: ReminderConfig
 
 def load_config() -> Config:
     try:
@@ -50,6 +119,50 @@ def load_config() -> Config:
         db_name = os.getenv("DB_NAME")
         if not all([db_user, db_password, db_name]):
              raise ValueError("One or more DB environment variables (DB_USER, DB_PASSWORD, DB_NAME) are missing.")
+        db_slow_query_ms = int(os.getenv("DB_SLOW_QUERY_MS", 200))
+        db_pool_min_size = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+        db_pool_max_size = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+        db_pool_max_lifetime = float(os.getenv("DB_POOL_MAX_LIFETIME", 3600))
+        db_pool_max_idle = float(os.getenv("DB_POOL_MAX_IDLE", 600))
+        db_pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", 30))
+        db_pool_reconnect_timeout = float(os.getenv("DB_POOL_RECONNECT_TIMEOUT", 300))
+        db_pool_slow_checkout_ms = int(os.getenv("DB_POOL_SLOW_CHECKOUT_MS", 100))
+        content_cache_ttl = int(os.getenv("CONTENT_CACHE_TTL", 600))
+        profile_flags_ttl = int(os.getenv("PROFILE_FLAGS_TTL", 60))
+        profile_flags_max_entries = int(os.getenv("PROFILE_FLAGS_MAX_ENTRIES", 1024))
+        send_global_rate = float(os.getenv("SEND_GLOBAL_RATE", 25))
+        send_background_rate = float(os.getenv("SEND_BACKGROUND_RATE", 18))
+        send_per_chat_rate = float(os.getenv("SEND_PER_CHAT_RATE", 1))
+        send_per_chat_burst = int(os.getenv("SEND_PER_CHAT_BURST", 3))
+        send_max_retries = int(os.getenv("SEND_MAX_RETRIES", 3))
+        send_workers = int(os.getenv("SEND_WORKERS", 4))
+        send_max_queue_size = int(os.getenv("SEND_MAX_QUEUE_SIZE", 10000))
+        fanout_concurrency = int(os.getenv("FANOUT_CONCURRENCY", 20))
+        notify_coalesce_seconds = float(os.getenv("NOTIFY_COALESCE_SECONDS", 3))
+        notify_dedup_ttl_seconds = float(os.getenv("NOTIFY_DEDUP_TTL_SECONDS", 3600))
+        outbox_workers = int(os.getenv("OUTBOX_WORKERS", 2))
+        outbox_batch_size = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+        outbox_lease_seconds = float(os.getenv("OUTBOX_LEASE_SECONDS", 300))
+        outbox_max_attempts = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+        outbox_retry_base_seconds = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", 10))
+        outbox_retry_max_seconds = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", 3600))
+        outbox_poll_interval = float(os.getenv("OUTBOX_POLL_INTERVAL", 15))
+        listener_workers = int(os.getenv("LISTENER_WORKERS", 2))
+        listener_queue_size = int(os.getenv("LISTENER_QUEUE_SIZE", 1000))
+        listener_batch_size = int(os.getenv("LISTENER_BATCH_SIZE", 100))
+        listener_lag_warning_seconds = float(os.getenv("LISTENER_LAG_WARNING_SECONDS", 5))
+        listener_reconnect_base_seconds = float(os.getenv("LISTENER_RECONNECT_BASE_SECONDS", 0.5))
+        listener_reconnect_max_seconds = float(os.getenv("LISTENER_RECONNECT_MAX_SECONDS", 30))
+        leader_lock_key = int(os.getenv("LEADER_LOCK_KEY", 7340001))
+        leader_check_interval = float(os.getenv("LEADER_CHECK_INTERVAL", 2))
+        reminder_offsets = tuple(o.strip() for o in os.getenv("REMINDER_OFFSETS", "24h").split(",") if o.strip())
+        reminder_sweep_interval = float(os.getenv("REMINDER_SWEEP_INTERVAL", 30))
+        reminder_batch_size = int(os.getenv("REMINDER_BATCH_SIZE", 500))
+        reminder_lease_seconds = float(os.getenv("REMINDER_LEASE_SECONDS", 300))
+        reminder_max_attempts = int(os.getenv("REMINDER_MAX_ATTEMPTS", 5))
+        reminder_retry_base_seconds = float(os.getenv("REMINDER_RETRY_BASE_SECONDS", 30))
+        reminder_retry_max_seconds = float(os.getenv("REMINDER_RETRY_MAX_SECONDS", 600))
+        reminder_metrics_log_interval = float(os.getenv("REMINDER_METRICS_LOG_INTERVAL", 300))
         return Config(
             bot=BotConfig(token=bot_token),
             db=DbConfig(
@@ -57,7 +170,63 @@ def load_config() -> Config:
                 port=db_port,
                 user=db_user,
                 password=db_password,
-                name=db_name
+                name=db_name,
+                slow_query_ms=db_slow_query_ms,
+                pool_min_size=db_pool_min_size,
+                pool_max_size=db_pool_max_size,
+                pool_max_lifetime=db_pool_max_lifetime,
+                pool_max_idle=db_pool_max_idle,
+                pool_timeout=db_pool_timeout,
+                pool_reconnect_timeout=db_pool_reconnect_timeout,
+                pool_slow_checkout_ms=db_pool_slow_checkout_ms
+            ),
+            cache=CacheConfig(
+                content_ttl_seconds=content_cache_ttl,
+                profile_flags_ttl_seconds=profile_flags_ttl,
+                profile_flags_max_entries=profile_flags_max_entries
+            ),
+            send=SendConfig(
+                global_rate=send_global_rate,
+                background_rate=send_background_rate,
+                per_chat_rate=send_per_chat_rate,
+                per_chat_burst=send_per_chat_burst,
+                max_retries=send_max_retries,
+                workers=send_workers,
+                max_queue_size=send_max_queue_size,
+                fanout_concurrency=fanout_concurrency,
+                notify_coalesce_seconds=notify_coalesce_seconds,
+                notify_dedup_ttl_seconds=notify_dedup_ttl_seconds
+            ),
+            outbox=OutboxConfig(
+                workers=outbox_workers,
+                batch_size=outbox_batch_size,
+                lease_seconds=outbox_lease_seconds,
+                max_attempts=outbox_max_attempts,
+                retry_base_seconds=outbox_retry_base_seconds,
+                retry_max_seconds=outbox_retry_max_seconds,
+                poll_interval=outbox_poll_interval
+            ),
+            listener=ListenerConfig(
+                workers=listener_workers,
+                queue_size=listener_queue_size,
+                batch_size=listener_batch_size,
+                lag_warning_seconds=listener_lag_warning_seconds,
+                reconnect_base_seconds=listener_reconnect_base_seconds,
+                reconnect_max_seconds=listener_reconnect_max_seconds
+            ),
+            leader=LeaderConfig(
+                lock_key=leader_lock_key,
+                check_interval=leader_check_interval
+            ),
+            reminders=ReminderConfig(
+                offsets=reminder_offsets,
+                sweep_interval_seconds=reminder_sweep_interval,
+                batch_size=reminder_batch_size,
+                lease_seconds=reminder_lease_seconds,
+                max_attempts=reminder_max_attempts,
+                retry_base_seconds=reminder_retry_base_seconds,
+                retry_max_seconds=reminder_retry_max_seconds,
+                metrics_log_interval_seconds=reminder_metrics_log_interval
             )
         )
     except ValueError as e:
@@ -1,91 +1,160 @@
 import asyncio
 import logging
-import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List
 import psycopg
 from aiogram import Bot
 
-from notifications import send_application_status_update, process_activity_update_from_db_notify
-from DataBase.models import ApplicationStatus
-from DataBase.models.application_repo import ApplicationRepository
+from config import config
+from outbox import outbox_worker
+from scheduler import sync_activity_reminders
 
 from DataBase import get_dedicated_db_connection
+from DataBase.catalogue import catalogue
+from DataBase.content_cache import content_cache
 
 logger = logging.getLogger(__name__)
 
-APPLICATION_UPDATES_CHANNEL = "application_updates"
-ACTIVITY_UPDATES_CHANNEL = "activity_updates"
+OUTBOX_CHANNEL = "notification_outbox"
+JOBS_CATALOGUE_CHANNEL = "jobs_updates"
+ACTIVITIES_CATALOGUE_CHANNEL = "activities"
+CONTENT_UPDATES_CHANNEL = "content_updates"
 
-async def process_application_notification(bot_instance: Bot, payload_str: str, app_repo: ApplicationRepository):
-    try:
-        payload_data = json.loads(payload_str)
-        app_id = int(payload_data.get("id"))
-        user_id = int(payload_data.get("user_id"))
-        status = payload_data.get("status")
-        hr_comment = payload_data.get("hr_comment")
 
-        if not all([app_id, user_id, status]):
-            logger.error(f"DB Listener ({APPLICATION_UPDATES_CHANNEL}): Missing required data in payload: {payload_str}")
-            return
+@dataclass
+class _QueuedNotification:
+    channel: str
+    payload: str
+    received_at: float
+
+
+@dataclass
+class ListenerStats:
+    received: int = 0
+    processed: int = 0
+    batches: int = 0
+    max_depth: int = 0
+    last_lag: float = 0.0
+    max_lag: float = 0.0
+
+
+async def _invalidate_content(payloads: List[str]):
+    content_cache.invalidate()
+
+async def _apply_activity_changes(payloads: List[str]):
+    # Перенос или снятие активности сразу переставляет/отменяет ее напоминания
+    await sync_activity_reminders(await catalogue.apply_activity_notifications(payloads))
+
+# Обработчик получает все payload своего канала из пачки, в порядке поступления
+CHANNEL_HANDLERS: Dict[str, Callable[[List[str]], Awaitable[Any]]] = {
+    JOBS_CATALOGUE_CHANNEL: catalogue.apply_job_notifications,
+    ACTIVITIES_CATALOGUE_CHANNEL: _apply_activity_changes,
+    CONTENT_UPDATES_CHANNEL: _invalidate_content,
+}
 
+listener_stats = ListenerStats()
+_queue: "asyncio.Queue[_QueuedNotification] | None" = None
+
+
+def get_listener_stats() -> Dict[str, Any]:
+    return {**listener_stats.__dict__, "depth": _queue.qsize() if _queue else 0}
+
+
+async def _process_batch(batch: List[_QueuedNotification]):
+    lag = time.monotonic() - batch[0].received_at
+    listener_stats.batches += 1
+    listener_stats.last_lag = lag
+    listener_stats.max_lag = max(listener_stats.max_lag, lag)
+    if lag > config.listener.lag_warning_seconds:
+        logger.warning(f"DB Listener: Processing lag {lag:.1f}s, {len(batch)} notifications in batch, {_queue.qsize()} still queued.")
+
+    by_channel: Dict[str, List[str]] = {}
+    for item in batch:
+        by_channel.setdefault(item.channel, []).append(item.payload)
+    for channel, payloads in by_channel.items():
         try:
-            status_enum = ApplicationStatus(status)
-        except ValueError:
-            logger.error(f"DB Listener ({APPLICATION_UPDATES_CHANNEL}): Invalid status value: {status}")
-            return
-
-        app_details = await app_repo.get_application_details_for_notification(app_id)
-        if not app_details:
-            logger.error(f"DB Listener ({APPLICATION_UPDATES_CHANNEL}): Application {app_id} details not found. Skipping.")
-            return
-        
-        target_title = app_details.get('target_title', 'Неизвестная цель')
+            await CHANNEL_HANDLERS[channel](payloads)
+        except Exception as e:
+            logger.error(f"DB Listener: Failed to process {len(payloads)} notifications on '{channel}': {e}", exc_info=True)
+    listener_stats.processed += len(batch)
+
+
+async def _notification_worker(queue: "asyncio.Queue[_QueuedNotification]"):
+    # Забираем все, что накопилось (не больше batch_size), чтобы всплеск изменений ушел одним запросом
+    while True:
+        batch = [await queue.get()]
+        while len(batch) < config.listener.batch_size and not queue.empty():
+            batch.append(queue.get_nowait())
+        try:
+            await _process_batch(batch)
+        finally:
+            for _ in batch:
+                queue.task_done()
 
-        logger.info(f"DB Listener ({APPLICATION_UPDATES_CHANNEL}): Queuing notification for app_id: {app_id}, user_id: {user_id}, status: {status_enum}")
-        
-        asyncio.create_task(
-            send_application_status_update(
-                bot=bot_instance,
-                user_id=user_id,
-                application_id=app_id,
-                target_title=target_title,
-                new_status=status_enum, 
-                hr_comment=hr_comment
-            )
-        )
-
-    except json.JSONDecodeError:
-        logger.error(f"DB Listener ({APPLICATION_UPDATES_CHANNEL}): Failed to decode JSON payload: {payload_str}")
-    except (ValueError, TypeError) as e: 
-        logger.error(f"DB Listener ({APPLICATION_UPDATES_CHANNEL}): Invalid data in payload '{payload_str}': {e}")
-    except Exception as e:
-        logger.error(f"DB Listener ({APPLICATION_UPDATES_CHANNEL}): Error processing notification for payload '{payload_str}': {e}", exc_info=True)
 
 async def listen_for_db_notifications(bot_instance: Bot):
+    global _queue
     logger.info("Starting PostgreSQL listener for DB notifications...")
+    # Цикл notifies() только кладет уведомления в очередь; запросы к БД делают воркеры.
+    # Полная очередь притормаживает чтение, уведомления копятся на стороне Postgres.
+    _queue = asyncio.Queue(maxsize=config.listener.queue_size)
+    workers = [asyncio.create_task(_notification_worker(_queue)) for _ in range(config.listener.workers)]
+
+    try:
+        await _listen(_queue)
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        logger.info(f"DB Listener: Stopped. Stats: {get_listener_stats()}")
+
+
+def _reconnect_delay(attempt: int) -> float:
+    # Экспоненциальная задержка со случайным разбросом, чтобы экземпляры не переподключались хором
+    cap = min(config.listener.reconnect_max_seconds, config.listener.reconnect_base_seconds * 2 ** attempt)
+    return random.uniform(cap / 2, cap)
+
+
+async def _listen(queue: "asyncio.Queue[_QueuedNotification]"):
     conn = None
-    app_repo = ApplicationRepository() 
+    attempt = 0
 
     while True:
         try:
             conn = await get_dedicated_db_connection() 
             if conn is None:
-                logger.error("DB Listener: Failed to get DB connection. Retrying in 30s.")
-                await asyncio.sleep(30)
+                delay = _reconnect_delay(attempt)
+                attempt += 1
+                logger.error(f"DB Listener: Failed to get DB connection. Retrying in {delay:.1f}s.")
+                await asyncio.sleep(delay)
                 continue
 
             async with conn.cursor() as cur:
-                await cur.execute(f"LISTEN {APPLICATION_UPDATES_CHANNEL};")
-                await cur.execute(f"LISTEN {ACTIVITY_UPDATES_CHANNEL};")
-                logger.info(f"DB Listener: Successfully listening on channels: '{APPLICATION_UPDATES_CHANNEL}', '{ACTIVITY_UPDATES_CHANNEL}'.")
+                await cur.execute(f"LISTEN {OUTBOX_CHANNEL};")
+                await cur.execute(f"LISTEN {JOBS_CATALOGUE_CHANNEL};")
+                await cur.execute(f"LISTEN {ACTIVITIES_CATALOGUE_CHANNEL};")
+                await cur.execute(f"LISTEN {CONTENT_UPDATES_CHANNEL};")
+                logger.info(f"DB Listener: Successfully listening on channels: '{OUTBOX_CHANNEL}', '{JOBS_CATALOGUE_CHANNEL}', '{ACTIVITIES_CATALOGUE_CHANNEL}', '{CONTENT_UPDATES_CHANNEL}'.")
+
+                # Догоняем реплику каталога уже после LISTEN, чтобы не потерять изменения между чтением и подпиской
+                await catalogue.catch_up()
+                content_cache.invalidate()
+                # Уведомления пользователям не теряются: они ждут в outbox, пока слушатель был отключен
+                outbox_worker.wake()
+                attempt = 0
 
                 while True:
                     async for notification in conn.notifies():
                         logger.info(f"DB Listener: Received DB notification: PID={notification.pid}, Channel='{notification.channel}', Payload='{notification.payload}'")
                         
-                        if notification.channel == APPLICATION_UPDATES_CHANNEL:
-                            await process_application_notification(bot_instance, notification.payload, app_repo)
-                        elif notification.channel == ACTIVITY_UPDATES_CHANNEL:
-                            asyncio.create_task(process_activity_update_from_db_notify(bot_instance, notification.payload))
+                        if notification.channel == OUTBOX_CHANNEL:
+                            outbox_worker.wake()
+                        elif notification.channel in CHANNEL_HANDLERS:
+                            listener_stats.received += 1
+                            await queue.put(_QueuedNotification(notification.channel, notification.payload, time.monotonic()))
+                            listener_stats.max_depth = max(listener_stats.max_depth, queue.qsize())
                         else:
                             logger.warning(f"DB Listener: Received notification on unhandled channel: {notification.channel}")
         
@@ -96,9 +165,11 @@ async def listen_for_db_notifications(bot_instance: Bot):
                 except Exception as e: logger.error(f"DB Listener: Error closing DB connection on stop: {e}")
             break
         except Exception as e:
-            logger.error(f"DB Listener: Unexpected error: {e}. Retrying in 30 seconds...", exc_info=True)
+            delay = _reconnect_delay(attempt)
+            attempt += 1
+            logger.error(f"DB Listener: Unexpected error: {e}. Retrying in {delay:.1f}s...", exc_info=True)
             if conn and not conn.closed:
                 try: await conn.close()
                 except Exception as e_close: logger.error(f"DB Listener: Error closing DB connection during generic error handling: {e_close}")
             conn = None
-            await asyncio.sleep(30)
+            await asyncio.sleep(delay)
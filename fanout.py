@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_LOG_EVERY = 500
+REPORTS_KEPT = 50
+
+
+@dataclass
+class FanoutReport:
+    label: str
+    total: int = 0
+    delivered: int = 0
+    failed: int = 0
+    stream_failed: bool = False
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def in_progress(self) -> bool:
+        return self.finished_at is None
+
+
+_reports: "OrderedDict[str, FanoutReport]" = OrderedDict()
+
+
+def get_fanout_reports() -> Dict[str, FanoutReport]:
+    return dict(_reports)
+
+
+async def fan_out(
+    label: str,
+    recipients: AsyncIterator[List[int]],
+    send: Callable[[int], Awaitable[bool]],
+    concurrency: Optional[int] = None,
+) -> FanoutReport:
+    """
+    Рассылка по потоку получателей (пачками). Поток не должен держать
+    соединение с БД между пачками: рассылка идет в темпе send_queue.
+
+    Одновременно в работе не больше concurrency отправок; пока они не
+    освободятся, следующая пачка не читается, поэтому память не растет
+    с размером аудитории. Темп отправки ограничивает send_queue.
+    """
+    concurrency = concurrency or config.send.fanout_concurrency
+    report = FanoutReport(label=label)
+    _reports[label] = report
+    _reports.move_to_end(label)
+    while len(_reports) > REPORTS_KEPT:
+        _reports.popitem(last=False)
+
+    slots = asyncio.Semaphore(concurrency)
+    in_flight = set()
+
+    async def deliver(user_id: int):
+        try:
+            ok = await send(user_id)
+        except Exception as e:
+            logger.error(f"Fan-out {label}: Unexpected error for user {user_id}: {e}", exc_info=True)
+            ok = False
+        finally:
+            slots.release()
+        if ok:
+            report.delivered += 1
+        else:
+            report.failed += 1
+        done = report.delivered + report.failed
+        if done % PROGRESS_LOG_EVERY == 0:
+            logger.info(f"Fan-out {label}: {done}/{report.total}+ processed ({report.delivered} delivered, {report.failed} failed).")
+
+    try:
+        async for chunk in recipients:
+            for user_id in chunk:
+                await slots.acquire()
+                report.total += 1
+                task = asyncio.create_task(deliver(user_id))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+    except Exception as e:
+        report.stream_failed = True
+        logger.error(f"Fan-out {label}: Recipient stream failed after {report.total} recipients: {e}", exc_info=True)
+    finally:
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+        report.finished_at = time.monotonic()
+
+    logger.info(
+        f"Fan-out {label}: Finished in {report.duration:.1f}s: "
+        f"{report.total} recipients, {report.delivered} delivered, {report.failed} failed."
+    )
+    return report
@@ -1,20 +1,23 @@
 import logging
-import asyncio
 from aiogram import Router, F, types
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from typing import Optional
 
-from DataBase.models.activity_repo import ActivityRepository
+from DataBase import spawn_detached
+from DataBase.catalogue import catalogue
 from DataBase.models.application_repo import ApplicationRepository
-from DataBase.models.user_repo import UserRepository
+from middlewares import UserContext
 from DataBase.models import ApplicationCreate, Activity
+from DataBase.models.pagination import Cursor
 
 from keyboards.inline_keyboards import (
     ActivityCallbackData,
     get_list_keyboard,
     get_item_details_keyboard,
     format_activity_details,
+    encode_cursor,
+    decode_cursor,
 )
 
 from scheduler import schedule_reminder_for_activity
@@ -28,30 +31,43 @@ LIST_LIMIT = 5
 async def handle_activities(message: types.Message, state: FSMContext):
     await show_activities_list(message)
 
-async def show_activities_list(message: types.Message, page: int = 0):
-    activity_repo = ActivityRepository()
-    offset = page * LIST_LIMIT
-    activities = await activity_repo.get_active_activities(upcoming_only=True, limit=LIST_LIMIT, offset=offset)
-    if not activities: await message.answer("Актуальных активностей пока нет."); return
-    await message.answer(
-        text=f"Найдено {len(activities)} активностей. Выберите для просмотра:",
-        reply_markup=get_list_keyboard(items=activities, data_fabric=ActivityCallbackData)
-    )
+async def show_activities_list(target: types.Message | types.CallbackQuery, after: Optional[Cursor] = None, before: Optional[Cursor] = None):
+    page = await catalogue.get_active_activities(upcoming_only=True, limit=LIST_LIMIT, after=after, before=before)
+    if not page.items:
+        if isinstance(target, types.CallbackQuery): await target.answer("Больше активностей нет."); return
+        await target.answer("Актуальных активностей пока нет."); return
+    first_activity, last_activity = page.items[0], page.items[-1]
+    prev_data = ActivityCallbackData(action="prev", item_id=0, cursor=encode_cursor(first_activity.start_time, first_activity.id)) if page.has_prev else None
+    next_data = ActivityCallbackData(action="next", item_id=0, cursor=encode_cursor(last_activity.start_time, last_activity.id)) if page.has_next else None
+    text = f"Найдено {len(page.items)} активностей. Выберите для просмотра:"
+    keyboard = get_list_keyboard(items=page.items, data_fabric=ActivityCallbackData, prev_data=prev_data, next_data=next_data)
+    if isinstance(target, types.CallbackQuery):
+        try: await target.message.edit_text(text=text, reply_markup=keyboard)
+        except Exception as e: logger.error(f"Error editing activities list page: {e}")
+        await target.answer()
+    else:
+        await target.answer(text=text, reply_markup=keyboard)
+
+@router.callback_query(ActivityCallbackData.filter(F.action.in_({"next", "prev"})))
+async def handle_activities_page(query: types.CallbackQuery, callback_data: ActivityCallbackData):
+    cursor = decode_cursor(callback_data.cursor)
+    if callback_data.action == "next":
+        await show_activities_list(query, after=cursor)
+    else:
+        await show_activities_list(query, before=cursor)
 
 @router.callback_query(ActivityCallbackData.filter(F.action == "view"))
 async def handle_view_activity(query: types.CallbackQuery, callback_data: ActivityCallbackData):
     activity_id = callback_data.item_id; user_id = query.from_user.id
     logger.info(f"User {user_id} viewing activity {activity_id}")
-    activity_repo = ActivityRepository(); app_repo = ApplicationRepository()
-    activity = await activity_repo.get_by_id(activity_id)
+    activity, already_applied = await catalogue.get_activity_for_user(activity_id, user_id)
     if not activity:
         await query.answer("Активность недоступна.", show_alert=True)
         try: await query.message.delete()
         except Exception: pass
         return
-    existing_application = await app_repo.get_by_user_and_target(user_id=user_id, activity_id=activity_id)
     details_text = format_activity_details(activity)
-    keyboard = get_item_details_keyboard(item_id=activity.id, data_fabric=ActivityCallbackData, already_applied=(existing_application is not None))
+    keyboard = get_item_details_keyboard(item_id=activity.id, data_fabric=ActivityCallbackData, already_applied=already_applied)
     try:
         await query.answer()
         await query.message.edit_text(text=details_text, reply_markup=keyboard, parse_mode="Markdown")
@@ -59,13 +75,11 @@ async def handle_view_activity(query: types.CallbackQuery, callback_data: Activi
 
 
 @router.callback_query(ActivityCallbackData.filter(F.action == "apply"))
-async def handle_apply_activity(query: types.CallbackQuery, callback_data: ActivityCallbackData):
+async def handle_apply_activity(query: types.CallbackQuery, callback_data: ActivityCallbackData, user_ctx: UserContext):
     activity_id = callback_data.item_id
     user_id = query.from_user.id
     logger.info(f"User {user_id} attempting to apply for activity {activity_id}")
-    user_repo = UserRepository()
-    user = await user_repo.get_by_id(user_id)
-    if not user or not user.phone or user.phone == "unknown" or not user.email or "@telegram.user" in user.email:
+    if not await user_ctx.is_profile_complete():
         logger.warning(f"User {user_id} profile is incomplete. Denying application for activity {activity_id}.")
         await query.answer(
             "Пожалуйста, сначала заполните ваш Профиль.\n"
@@ -76,19 +90,19 @@ async def handle_apply_activity(query: types.CallbackQuery, callback_data: Activ
     logger.info(f"User {user_id} profile is complete. Proceeding with application for activity {activity_id}.")
     app_repo = ApplicationRepository()
     app_data = ApplicationCreate(user_id=user_id, activity_id=activity_id)
-    created_app = await app_repo.add(app_data)
-    if created_app:
+    created_app, existed = await app_repo.add(app_data)
+    if created_app and existed:
+        await query.answer("Вы уже регистрировались на эту активность.", show_alert=True)
+    elif created_app:
         await query.answer("Вы успешно зарегистрировались на активность!", show_alert=True)
-        logger.info(f"Application {created_app.id} created/found for user {user_id}, activity {activity_id}")
+        logger.info(f"Application {created_app.id} created for user {user_id}, activity {activity_id}")
 
-        activity_repo_for_reminder = ActivityRepository()
-        activity_details: Optional[Activity] = await activity_repo_for_reminder.get_activity_details_for_notification(activity_id)
+        activity_details: Optional[Activity] = await catalogue.get_activity(activity_id)
 
         if activity_details and activity_details.start_time:
             logger.info(f"Handler: Attempting to schedule reminder for user {user_id} on activity {activity_id}")
-            asyncio.create_task(
+            spawn_detached(
                 schedule_reminder_for_activity(
-                    bot=query.bot, 
                     user_id=user_id, 
                     activity=activity_details
                 )
@@ -99,22 +113,14 @@ async def handle_apply_activity(query: types.CallbackQuery, callback_data: Activ
             logger.error(f"Handler: Could not schedule reminder. Activity {activity_id} start_time is not set after application.")
 
         try:
-            activity_repo_inner = ActivityRepository()
-            activity = await activity_repo_inner.get_by_id(activity_id)
-            if activity:
-                details_text = format_activity_details(activity)
-                keyboard = get_item_details_keyboard(
-                    item_id=activity_id,
-                    data_fabric=ActivityCallbackData,
-                    already_applied=True
-                )
-                await query.message.edit_text(text=details_text, reply_markup=keyboard, parse_mode="Markdown")
+            keyboard = get_item_details_keyboard(
+                item_id=activity_id,
+                data_fabric=ActivityCallbackData,
+                already_applied=True
+            )
+            await query.message.edit_reply_markup(reply_markup=keyboard)
         except Exception as e:
             logger.warning(f"Could not edit message after applying for activity {activity_id}: {e}")
     else:
-        existing_app = await app_repo.get_by_user_and_target(user_id=user_id, activity_id=activity_id)
-        if existing_app:
-             await query.answer("Вы уже регистрировались на эту активность.", show_alert=True)
-        else:
-            await query.answer("Не удалось зарегистрироваться. Попробуйте позже.", show_alert=True)
-            logger.error(f"Failed to process application for user {user_id} and activity {activity_id}")
+        await query.answer("Не удалось зарегистрироваться. Попробуйте позже.", show_alert=True)
+        logger.error(f"Failed to process application for user {user_id} and activity {activity_id}")
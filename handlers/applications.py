@@ -1,18 +1,20 @@
 import logging
+from typing import Optional
 from aiogram import Router, F, types
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 
 from DataBase.models.application_repo import ApplicationRepository
-from DataBase.models.job_repo import JobRepository
-from DataBase.models.activity_repo import ActivityRepository
-from DataBase.models import Job, Activity
+from DataBase.models.pagination import Cursor
+from scheduler import cancel_scheduled_reminder
 
 from keyboards.inline_keyboards import (
     ApplicationCallbackData,
     get_my_applications_keyboard,
     get_application_details_keyboard,
     format_application_details,
+    encode_cursor,
+    decode_cursor,
 )
 
 logger = logging.getLogger(__name__)
@@ -26,18 +28,20 @@ async def handle_my_applications_button(message: types.Message, state: FSMContex
     logger.info(f"User {user_id} requested their applications list via button.")
     await show_my_applications(message, user_id, is_new_message=True)
 
-async def show_my_applications(target: types.Message | types.CallbackQuery, user_id: int, page: int = 0, is_new_message: bool = False):
+async def show_my_applications(target: types.Message | types.CallbackQuery, user_id: int, after: Optional[Cursor] = None, before: Optional[Cursor] = None, is_new_message: bool = False):
     app_repo = ApplicationRepository()
-    offset = page * LIST_LIMIT
-    applications_data = await app_repo.get_user_applications_with_details(
-        user_id=user_id, limit=LIST_LIMIT, offset=offset
+    page = await app_repo.get_user_applications_with_details(
+        user_id=user_id, limit=LIST_LIMIT, after=after, before=before
     )
-    if not applications_data:
+    if not page.items:
         text = "У вас пока нет отправленных заявок."
         keyboard = None
     else:
+        first_app, last_app = page.items[0], page.items[-1]
+        prev_data = ApplicationCallbackData(action="prev", item_id=0, cursor=encode_cursor(first_app['application_time'], first_app['id'])) if page.has_prev else None
+        next_data = ApplicationCallbackData(action="next", item_id=0, cursor=encode_cursor(last_app['application_time'], last_app['id'])) if page.has_next else None
         text = "Ваши заявки (нажмите для просмотра деталей):"
-        keyboard = get_my_applications_keyboard(applications_data)
+        keyboard = get_my_applications_keyboard(page.items, prev_data=prev_data, next_data=next_data)
     current_message: types.Message | None = None
     if isinstance(target, types.CallbackQuery):
         current_message = target.message
@@ -78,17 +82,12 @@ async def handle_view_application_details(query: types.CallbackQuery, callback_d
     user_id = query.from_user.id
     logger.info(f"User {user_id} viewing details for application {app_id}")
     app_repo = ApplicationRepository()
-    application = await app_repo.get_by_id_and_user(app_id, user_id)
+    application, target_details = await app_repo.get_with_target(app_id, user_id)
     if not application:
         await query.answer("Не удалось найти информацию по этой заявке.", show_alert=True)
         try: await query.message.delete()
         except Exception: pass
         return
-    target_details: Job | Activity | None = None
-    if application.job_id:
-        job_repo = JobRepository(); target_details = await job_repo.get_by_id(application.job_id)
-    elif application.activity_id:
-        activity_repo = ActivityRepository(); target_details = await activity_repo.get_by_id(application.activity_id)
     details_text = format_application_details(application, target_details)
     keyboard = get_application_details_keyboard(application)
     try:
@@ -107,6 +106,8 @@ async def handle_delete_application(query: types.CallbackQuery, callback_data: A
     deleted = await app_repo.delete_by_user(app_id=app_id, user_id=user_id)
     if deleted:
         logger.info(f"Application {app_id} successfully deleted by user {user_id}.")
+        if deleted.activity_id:
+            await cancel_scheduled_reminder(user_id, deleted.activity_id)
         await query.answer("Заявка успешно удалена.", show_alert=False)
         await show_my_applications(query, user_id, is_new_message=True)
     else:
@@ -115,11 +116,8 @@ async def handle_delete_application(query: types.CallbackQuery, callback_data: A
             "Не удалось удалить заявку.\\nВозможно, ее статус уже изменился или произошла ошибка.",
             show_alert=True
         )
-        application = await app_repo.get_by_id_and_user(app_id, user_id)
+        application, target_details = await app_repo.get_with_target(app_id, user_id)
         if application:
-             target_details: Job | Activity | None = None
-             if application.job_id: job_repo = JobRepository(); target_details = await job_repo.get_by_id(application.job_id)
-             elif application.activity_id: activity_repo = ActivityRepository(); target_details = await activity_repo.get_by_id(application.activity_id)
              details_text = format_application_details(application, target_details)
              keyboard = get_application_details_keyboard(application)
              try:
@@ -128,6 +126,15 @@ async def handle_delete_application(query: types.CallbackQuery, callback_data: A
         else:
              await show_my_applications(query, user_id, is_new_message=True)
 
+@router.callback_query(ApplicationCallbackData.filter(F.action.in_({"next", "prev"})))
+async def handle_applications_page(query: types.CallbackQuery, callback_data: ApplicationCallbackData):
+    user_id = query.from_user.id
+    cursor = decode_cursor(callback_data.cursor)
+    if callback_data.action == "next":
+        await show_my_applications(query, user_id, after=cursor)
+    else:
+        await show_my_applications(query, user_id, before=cursor)
+
 @router.callback_query(ApplicationCallbackData.filter(F.action == "back_to_list"))
 async def handle_back_to_applications_list(query: types.CallbackQuery, callback_data: ApplicationCallbackData):
     user_id = query.from_user.id
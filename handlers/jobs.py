@@ -1,18 +1,22 @@
 import logging
+from typing import Optional
 from aiogram import Router, F, types
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 
-from DataBase.models.job_repo import JobRepository
+from DataBase.catalogue import catalogue
 from DataBase.models.application_repo import ApplicationRepository
-from DataBase.models.user_repo import UserRepository
+from middlewares import UserContext
 from DataBase.models import JobType, ApplicationCreate
+from DataBase.models.pagination import Cursor
 
 from keyboards.inline_keyboards import (
     JobCallbackData,
     get_list_keyboard,
     get_item_details_keyboard,
     format_job_details,
+    encode_cursor,
+    decode_cursor,
 )
 
 logger = logging.getLogger(__name__)
@@ -28,31 +32,44 @@ async def handle_internships(message: types.Message, state: FSMContext):
 async def handle_vacancies(message: types.Message, state: FSMContext):
     await show_jobs_list(message, job_type=JobType.VACANCY)
 
-async def show_jobs_list(message: types.Message, job_type: JobType, page: int = 0):
-    job_repo = JobRepository()
-    offset = page * LIST_LIMIT
-    jobs = await job_repo.get_active_jobs(job_type=job_type, limit=LIST_LIMIT, offset=offset)
+async def show_jobs_list(target: types.Message | types.CallbackQuery, job_type: JobType, after: Optional[Cursor] = None, before: Optional[Cursor] = None):
+    page = await catalogue.get_active_jobs(job_type=job_type, limit=LIST_LIMIT, after=after, before=before)
     type_text = "стажировок" if job_type == JobType.INTERNSHIP else "вакансий"
-    if not jobs: await message.answer(f"Активных {type_text} пока нет."); return
-    await message.answer(
-        text=f"Найдено {len(jobs)} {type_text}. Выберите для просмотра:",
-        reply_markup=get_list_keyboard(items=jobs, data_fabric=JobCallbackData)
-    )
+    if not page.items:
+        if isinstance(target, types.CallbackQuery): await target.answer(f"Больше {type_text} нет."); return
+        await target.answer(f"Активных {type_text} пока нет."); return
+    first_job, last_job = page.items[0], page.items[-1]
+    prev_data = JobCallbackData(action="prev", item_id=0, job_type=job_type, cursor=encode_cursor(first_job.created_at, first_job.id)) if page.has_prev else None
+    next_data = JobCallbackData(action="next", item_id=0, job_type=job_type, cursor=encode_cursor(last_job.created_at, last_job.id)) if page.has_next else None
+    text = f"Найдено {len(page.items)} {type_text}. Выберите для просмотра:"
+    keyboard = get_list_keyboard(items=page.items, data_fabric=JobCallbackData, prev_data=prev_data, next_data=next_data)
+    if isinstance(target, types.CallbackQuery):
+        try: await target.message.edit_text(text=text, reply_markup=keyboard)
+        except Exception as e: logger.error(f"Error editing jobs list page: {e}")
+        await target.answer()
+    else:
+        await target.answer(text=text, reply_markup=keyboard)
+
+@router.callback_query(JobCallbackData.filter(F.action.in_({"next", "prev"})))
+async def handle_jobs_page(query: types.CallbackQuery, callback_data: JobCallbackData):
+    cursor = decode_cursor(callback_data.cursor)
+    if callback_data.action == "next":
+        await show_jobs_list(query, job_type=callback_data.job_type, after=cursor)
+    else:
+        await show_jobs_list(query, job_type=callback_data.job_type, before=cursor)
 
 @router.callback_query(JobCallbackData.filter(F.action == "view"))
 async def handle_view_job(query: types.CallbackQuery, callback_data: JobCallbackData):
     job_id = callback_data.item_id; user_id = query.from_user.id
     logger.info(f"User {user_id} viewing job {job_id}")
-    job_repo = JobRepository(); app_repo = ApplicationRepository()
-    job = await job_repo.get_by_id(job_id)
+    job, already_applied = await catalogue.get_job_for_user(job_id, user_id)
     if not job:
         await query.answer("Вакансия/стажировка недоступна.", show_alert=True)
         try: await query.message.delete()
         except Exception: pass
         return
-    existing_application = await app_repo.get_by_user_and_target(user_id=user_id, job_id=job_id)
     details_text = format_job_details(job)
-    keyboard = get_item_details_keyboard(item_id=job.id, data_fabric=JobCallbackData, already_applied=(existing_application is not None))
+    keyboard = get_item_details_keyboard(item_id=job.id, data_fabric=JobCallbackData, already_applied=already_applied)
     try:
         await query.answer()
         await query.message.edit_text(text=details_text, reply_markup=keyboard, parse_mode="Markdown")
@@ -60,13 +77,11 @@ async def handle_view_job(query: types.CallbackQuery, callback_data: JobCallback
 
 
 @router.callback_query(JobCallbackData.filter(F.action == "apply"))
-async def handle_apply_job(query: types.CallbackQuery, callback_data: JobCallbackData):
+async def handle_apply_job(query: types.CallbackQuery, callback_data: JobCallbackData, user_ctx: UserContext):
     job_id = callback_data.item_id
     user_id = query.from_user.id
     logger.info(f"User {user_id} attempting to apply for job {job_id}")
-    user_repo = UserRepository()
-    user = await user_repo.get_by_id(user_id)
-    if not user or not user.phone or user.phone == "unknown" or not user.email or "@telegram.user" in user.email:
+    if not await user_ctx.is_profile_complete():
         logger.warning(f"User {user_id} profile is incomplete. Denying application for job {job_id}.")
         await query.answer(
             "Пожалуйста, сначала заполните ваш Профиль.\n"
@@ -79,31 +94,24 @@ async def handle_apply_job(query: types.CallbackQuery, callback_data: JobCallbac
     app_repo = ApplicationRepository()
     app_data = ApplicationCreate(user_id=user_id, job_id=job_id)
 
-    created_app = await app_repo.add(app_data)
+    created_app, existed = await app_repo.add(app_data)
 
-    if created_app:
+    if created_app and existed:
+        await query.answer("Вы уже откликались на эту вакансию/стажировку.", show_alert=True)
+    elif created_app:
         await query.answer("Ваш отклик успешно отправлен!", show_alert=True)
-        logger.info(f"Application {created_app.id} created/found for user {user_id}, job {job_id}")
+        logger.info(f"Application {created_app.id} created for user {user_id}, job {job_id}")
         try:
-            job_repo_inner = JobRepository()
-            job = await job_repo_inner.get_by_id(job_id)
-            if job:
-                details_text = format_job_details(job)
-                keyboard = get_item_details_keyboard(
-                    item_id=job_id,
-                    data_fabric=JobCallbackData,
-                    already_applied=True
-                )
-                await query.message.edit_text(
-                    text=details_text, reply_markup=keyboard, parse_mode="Markdown"
-                )
+            # Текст карточки уже на экране, меняется только кнопка отклика
+            keyboard = get_item_details_keyboard(
+                item_id=job_id,
+                data_fabric=JobCallbackData,
+                already_applied=True
+            )
+            await query.message.edit_reply_markup(reply_markup=keyboard)
         except Exception as e:
             logger.warning(f"Could not edit message after applying for job {job_id}: {e}")
 
     else:
-        existing_app = await app_repo.get_by_user_and_target(user_id=user_id, job_id=job_id)
-        if existing_app:
-             await query.answer("Вы уже откликались на эту вакансию/стажировку.", show_alert=True)
-        else:
-            await query.answer("Не удалось отправить отклик. Попробуйте позже.", show_alert=True)
-            logger.error(f"Failed to process application for user {user_id} and job {job_id}")
\ No newline at end of file
+        await query.answer("Не удалось отправить отклик. Попробуйте позже.", show_alert=True)
+        logger.error(f"Failed to process application for user {user_id} and job {job_id}")
\ No newline at end of file
@@ -11,6 +11,7 @@ from pydantic import BaseModel, EmailStr, ValidationError
 
 from DataBase.models.user_repo import UserRepository
 from DataBase.models import UserUpdate
+from middlewares import UserContext
 
 from keyboards.inline_keyboards import (
     ProfileCallbackData,
@@ -27,9 +28,10 @@ class EditProfileStates(StatesGroup):
     choosing_field = State()
     waiting_for_input = State()
 
-async def show_profile(target: types.Message | types.CallbackQuery, user_id: int, state: FSMContext):
+async def show_profile(target: types.Message | types.CallbackQuery, user_ctx: UserContext, state: FSMContext):
     await state.clear()
-    user_repo = UserRepository(); user = await user_repo.get_by_id(user_id)
+    user_id = user_ctx.user_id
+    user = await user_ctx.get_profile()
     if not user:
         logger.warning(f"User {user_id} not found when trying to show profile.")
         text = "Не удалось загрузить профиль."; keyboard = get_main_menu_keyboard(); reply_keyboard = True
@@ -53,8 +55,8 @@ async def show_profile(target: types.Message | types.CallbackQuery, user_id: int
 
 
 @router.message(StateFilter(None), F.text == "👤 Мой профиль")
-async def handle_my_profile_button(message: types.Message, state: FSMContext):
-    await show_profile(message, message.from_user.id, state)
+async def handle_my_profile_button(message: types.Message, state: FSMContext, user_ctx: UserContext):
+    await show_profile(message, user_ctx, state)
 
 @router.message(StateFilter(EditProfileStates), F.text == "❌ Отмена")
 async def handle_edit_cancel_text(message: types.Message, state: FSMContext):
@@ -64,7 +66,7 @@ async def handle_edit_cancel_text(message: types.Message, state: FSMContext):
 
 
 @router.message(EditProfileStates.waiting_for_input)
-async def handle_profile_field_input(message: types.Message, state: FSMContext):
+async def handle_profile_field_input(message: types.Message, state: FSMContext, user_ctx: UserContext):
     user_id = message.from_user.id
     user_data = await state.get_data()
     field_to_edit = user_data.get('field_to_edit')
@@ -126,10 +128,11 @@ async def handle_profile_field_input(message: types.Message, state: FSMContext):
     update_data = UserUpdate(**{field_to_edit: validated_value})
     updated_user = await user_repo.update(user_id, update_data)
     if updated_user:
+        user_ctx.set_profile(updated_user)
         logger.info(f"User {user_id} successfully updated field '{field_to_edit}'.")
         await state.clear()
         await message.answer(f"Поле '{field_name_ru}' успешно обновлено!", reply_markup=get_main_menu_keyboard())
-        await show_profile(message, user_id, state)
+        await show_profile(message, user_ctx, state)
     else:
         logger.error(f"Failed to update user {user_id} field '{field_to_edit}' in DB.")
         await state.clear()
@@ -158,10 +161,10 @@ async def handle_profile_edit_field_choice(query: types.CallbackQuery, callback_
     await query.answer()
 
 @router.callback_query(StateFilter(EditProfileStates), ProfileCallbackData.filter(F.action == "edit_cancel"))
-async def handle_profile_edit_cancel_callback(query: types.CallbackQuery, state: FSMContext):
+async def handle_profile_edit_cancel_callback(query: types.CallbackQuery, state: FSMContext, user_ctx: UserContext):
     logger.info(f"User {query.from_user.id} canceled profile editing via inline button.")
     await state.clear(); await query.answer("Редактирование отменено.")
     try: await query.message.delete()
     except Exception: pass
     await query.message.answer("Возврат в главное меню.", reply_markup=get_main_menu_keyboard())
-    await show_profile(query.message, query.from_user.id, state)
+    await show_profile(query.message, user_ctx, state)
@@ -1,15 +1,13 @@
 import logging
 from aiogram import Router, F, types
 
-from DataBase.models.content_repo import ContentRepository
+from DataBase.models import ContentRepoData
+from DataBase.content_cache import content_cache
 
 logger = logging.getLogger(__name__)
 router = Router()
 
-@router.message(F.text == "🆘 Поддержка / FAQ")
-async def handle_support_faq(message: types.Message):
-    content_repo = ContentRepository()
-    content = await content_repo.get_all_content()
+def render_support_content(content: ContentRepoData) -> str:
     response_lines = ["**Часто задаваемые вопросы (FAQ):**\n"]
     if content.faqs:
         for faq in content.faqs:
@@ -29,7 +27,13 @@ async def handle_support_faq(message: types.Message):
 
     if not content.hr_contacts and not content.company_contacts:
         response_lines.append("Контактная информация не найдена.")
-    await message.answer(
-        "\n".join(response_lines),
-        parse_mode="Markdown"
-    )
\ No newline at end of file
+    return "\n".join(response_lines)
+
+@router.message(F.text == "🆘 Поддержка / FAQ")
+async def handle_support_faq(message: types.Message):
+    chunks = await content_cache.get_rendered(render_support_content)
+    for chunk in chunks:
+        await message.answer(
+            chunk,
+            parse_mode="Markdown"
+        )
@@ -1,32 +1,65 @@
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional
 from aiogram.filters.callback_data import CallbackData
-from aiogram.types import InlineKeyboardMarkup
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from DataBase.models import User, Job, Activity, Application, JobType, ApplicationStatus
+from DataBase.models import UserProfile, Job, Activity, Application, JobType, ApplicationStatus
+from DataBase.models.pagination import Cursor
 from notifications import STATUS_TRANSLATIONS
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
 class JobCallbackData(CallbackData, prefix="job"):
     action: str
     item_id: int
+    job_type: JobType | None = None
+    cursor: str | None = None
 
 class ActivityCallbackData(CallbackData, prefix="activity"):
     action: str
     item_id: int
+    cursor: str | None = None
 
 class ApplicationCallbackData(CallbackData, prefix="app"):
     action: str
     item_id: int
+    cursor: str | None = None
 
 class ProfileCallbackData(CallbackData, prefix="profile"):
     action: str
     field: str | None = None
 
-def get_list_keyboard(items: List[Job | Activity], data_fabric: type[CallbackData]) -> InlineKeyboardMarkup:
+def encode_cursor(sort_value: datetime, item_id: int) -> str:
+    # Курсор вида "<микросекунды с эпохи в hex>.<id в hex>", чтобы уложиться в 64 байта callback_data
+    micros = (sort_value - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros:x}.{item_id:x}"
+
+def decode_cursor(cursor: str | None) -> Optional[Cursor]:
+    if not cursor:
+        return None
+    try:
+        micros_hex, id_hex = cursor.split(".")
+        return _EPOCH + timedelta(microseconds=int(micros_hex, 16)), int(id_hex, 16)
+    except ValueError:
+        return None
+
+def get_page_navigation_buttons(prev_data: CallbackData | None, next_data: CallbackData | None) -> List[InlineKeyboardButton]:
+    buttons = []
+    if prev_data:
+        buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=prev_data.pack()))
+    if next_data:
+        buttons.append(InlineKeyboardButton(text="Далее ➡️", callback_data=next_data.pack()))
+    return buttons
+
+def get_list_keyboard(items: List[Job | Activity], data_fabric: type[CallbackData], prev_data: CallbackData | None = None, next_data: CallbackData | None = None) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     for item in items:
         builder.button(text=f"🔎 {item.title[:40]}...", callback_data=data_fabric(action="view", item_id=item.id))
     builder.adjust(1)
+    navigation = get_page_navigation_buttons(prev_data, next_data)
+    if navigation:
+        builder.row(*navigation)
     return builder.as_markup()
 
 def get_item_details_keyboard(item_id: int, data_fabric: type[CallbackData], already_applied: bool = False) -> InlineKeyboardMarkup:
@@ -38,7 +71,7 @@ def get_item_details_keyboard(item_id: int, data_fabric: type[CallbackData], alr
     builder.adjust(1)
     return builder.as_markup()
 
-def get_my_applications_keyboard(applications: List[Dict[str, Any]]) -> InlineKeyboardMarkup:
+def get_my_applications_keyboard(applications: List[Dict[str, Any]], prev_data: CallbackData | None = None, next_data: CallbackData | None = None) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     if not applications: return builder.as_markup()
     for app_data in applications:
@@ -56,6 +89,9 @@ def get_my_applications_keyboard(applications: List[Dict[str, Any]]) -> InlineKe
         button_text = f"📄 {target_title[:35]}... ({status_text})"
         builder.button(text=button_text, callback_data=ApplicationCallbackData(action="view_details", item_id=app_id))
     builder.adjust(1)
+    navigation = get_page_navigation_buttons(prev_data, next_data)
+    if navigation:
+        builder.row(*navigation)
     return builder.as_markup()
 
 def get_application_details_keyboard(application: Application) -> InlineKeyboardMarkup:
@@ -132,7 +168,7 @@ def format_application_details(application: Application, target_details: Job | A
     else: details.append("Информация о цели заявки не найдена.")
     return "\n".join(details)
 
-def format_profile_details(user: User) -> str:
+def format_profile_details(user: UserProfile) -> str:
     details = [
         "**👤 Ваш профиль:**",
         f"*ID:* `{user.id}`",
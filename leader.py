@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+from config import config, LeaderConfig
+from DataBase import get_dedicated_db_connection
+
+logger = logging.getLogger(__name__)
+
+LeaderCallback = Callable[[], Awaitable[None]]
+
+
+class LeaderElection:
+    """
+    Выбор одного ведущего экземпляра среди реплик бота.
+
+    Ведущий держит сессионный pg_try_advisory_lock на выделенном соединении
+    и раз в check_interval проверяет его запросом. Если соединение рвется
+    (процесс упал, сеть), Postgres сам снимает блокировку, и ее забирает
+    другой экземпляр при следующей попытке - через check_interval секунд.
+    Ведущий, потерявший соединение, сразу слагает с себя роль.
+    Остальные экземпляры продолжают обслуживать интерактивные апдейты.
+    """
+
+    def __init__(self, leader_config: LeaderConfig):
+        self._config = leader_config
+        self._elected: List[LeaderCallback] = []
+        self._demoted: List[LeaderCallback] = []
+        self._task: Optional[asyncio.Task] = None
+        self._is_leader = False
+
+    @property
+    def is_leader(self) -> bool:
+        return self._is_leader
+
+    def on_elected(self, callback: LeaderCallback):
+        self._elected.append(callback)
+
+    def on_demoted(self, callback: LeaderCallback):
+        self._demoted.append(callback)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _become_leader(self):
+        self._is_leader = True
+        logger.info(f"Leader: This instance is now the leader (lock {self._config.lock_key}).")
+        for callback in self._elected:
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"Leader: Elected callback failed: {e}", exc_info=True)
+
+    async def _step_down(self):
+        if not self._is_leader:
+            return
+        self._is_leader = False
+        logger.warning("Leader: Leadership lost, stopping leader-only work.")
+        for callback in self._demoted:
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"Leader: Demoted callback failed: {e}", exc_info=True)
+
+    async def _check(self, conn) -> bool:
+        if self._is_leader:
+            # Блокировка живет, пока живо соединение: достаточно убедиться, что оно отвечает
+            await conn.execute("SELECT 1")
+            return True
+        cur = await conn.execute("SELECT pg_try_advisory_lock(%s)", (self._config.lock_key,))
+        row = await cur.fetchone()
+        return bool(row and row[0])
+
+    async def _run(self):
+        conn = None
+        while True:
+            try:
+                conn = await get_dedicated_db_connection()
+                if conn is None:
+                    logger.error(f"Leader: Failed to get DB connection. Retrying in {self._config.check_interval}s.")
+                    await asyncio.sleep(self._config.check_interval)
+                    continue
+                while True:
+                    # Зависший запрос (обрыв сети) не должен держать роль дольше пары интервалов
+                    acquired = await asyncio.wait_for(self._check(conn), self._config.check_interval * 2)
+                    if acquired and not self._is_leader:
+                        await self._become_leader()
+                    await asyncio.sleep(self._config.check_interval)
+            except asyncio.CancelledError:
+                await self._step_down()
+                if conn and not conn.closed:
+                    await conn.close()
+                raise
+            except Exception as e:
+                logger.error(f"Leader: Lock connection failed: {e}", exc_info=True)
+                await self._step_down()
+                if conn and not conn.closed:
+                    try: await conn.close()
+                    except Exception as e_close: logger.error(f"Leader: Error closing lock connection: {e_close}")
+                conn = None
+                await asyncio.sleep(self._config.check_interval)
+
+
+leader = LeaderElection(config.leader)
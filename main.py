@@ -21,8 +21,13 @@ from config import config
 
 from DataBase import init_db_pool, close_db_pool
 from handlers import routers_list
+from middlewares import UserContextMiddleware, UnitOfWorkMiddleware
 from db_listener import listen_for_db_notifications
-from scheduler import setup_scheduler_jobs, shutdown_scheduler
+from scheduler import setup_scheduler_jobs, shutdown_scheduler, start_reminder_sweep, stop_reminder_sweep
+from send_queue import send_queue
+from outbox import outbox_worker
+from notifications import register_outbox_handlers
+from leader import leader
 
 listener_task = None
 
@@ -35,6 +40,8 @@ async def main():
     default_properties = DefaultBotProperties(parse_mode=ParseMode.HTML)
     bot = Bot(token=config.bot.token, default=default_properties)
 
+    dp.update.outer_middleware(UnitOfWorkMiddleware())
+    dp.update.outer_middleware(UserContextMiddleware())
     for router in routers_list:
         dp.include_router(router)
 
@@ -60,8 +67,19 @@ async def main():
 
 async def on_startup(dispatcher: Dispatcher, bot: Bot):
     logger.info("Bot started successfully.")
+    send_queue.start(bot)
+    register_outbox_handlers()
     await set_bot_commands(bot)
     setup_scheduler_jobs(bot)
+    # Уведомления из outbox доставляет только ведущий экземпляр: журнал склейки в notifications живет в памяти процесса.
+    # Он же обходит activity_reminders и рассылает наступившие напоминания
+    async def on_leader_elected():
+        outbox_worker.start(bot)
+        start_reminder_sweep()
+    leader.on_elected(on_leader_elected)
+    leader.on_demoted(outbox_worker.stop)
+    leader.on_demoted(stop_reminder_sweep)
+    leader.start()
 
 async def on_shutdown(dispatcher: Dispatcher, bot: Bot):
     global listener_task
@@ -74,6 +92,9 @@ async def on_shutdown(dispatcher: Dispatcher, bot: Bot):
         except asyncio.CancelledError:
             logger.info("OnShutdown: Listener task cancelled successfully.")
     await shutdown_scheduler()
+    await leader.stop()
+    await outbox_worker.stop()
+    await send_queue.stop()
     await close_db_pool()
     logger.info("Database pool closed.")
 
@@ -0,0 +1,2 @@
+from .user_context import UserContext, UserContextMiddleware
+from .unit_of_work import UnitOfWorkMiddleware
@@ -0,0 +1,22 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from DataBase import unit_of_work
+
+
+class UnitOfWorkMiddleware(BaseMiddleware):
+    """Все запросы репозиториев внутри одного апдейта идут через одно соединение пула."""
+
+    def __init__(self, transactional: bool = False):
+        self._transactional = transactional
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with unit_of_work(transactional=self._transactional):
+            return await handler(event, data)
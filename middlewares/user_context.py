@@ -0,0 +1,79 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User as TelegramUser
+
+from DataBase.models import UserProfile, UserCreate
+from DataBase.models.user_repo import UserRepository
+from DataBase.profile_flags import profile_flags
+
+logger = logging.getLogger(__name__)
+
+_NOT_LOADED = object()
+
+
+class UserContext:
+    """
+    Пользователь текущего апдейта. Профиль читается из БД не более одного раза
+    и только если он действительно понадобился хендлеру.
+    """
+
+    def __init__(self, telegram_user: TelegramUser, user_repo: UserRepository):
+        self.telegram_user = telegram_user
+        self.user_id = telegram_user.id
+        self._user_repo = user_repo
+        self._profile: Any = _NOT_LOADED
+
+    async def get_profile(self) -> Optional[UserProfile]:
+        if self._profile is _NOT_LOADED:
+            self._profile = await self._user_repo.get_profile(self.user_id)
+        return self._profile
+
+    def set_profile(self, profile: Optional[UserProfile]):
+        # Вызывается после изменения профиля: новая версия уже на руках, флаг заполненности устарел
+        self._profile = profile
+        profile_flags.invalidate(self.user_id)
+
+    async def ensure_profile(self) -> Tuple[Optional[UserProfile], bool]:
+        # Первый контакт (/start): создаем пользователя, если его нет. Возвращает (профиль, created)
+        if self._profile is not _NOT_LOADED and self._profile is not None:
+            return self._profile, False
+        profile, created = await self._user_repo.upsert(UserCreate(
+            id=self.user_id,
+            full_name=self.telegram_user.full_name,
+            email=None,
+            phone=None
+        ))
+        self._profile = profile
+        return profile, created
+
+    async def is_profile_complete(self) -> bool:
+        if self._profile is _NOT_LOADED:
+            cached = profile_flags.get(self.user_id)
+            if cached is not None:
+                return cached
+            eligibility = await self._user_repo.get_eligibility(self.user_id)
+            is_complete = bool(eligibility and eligibility.is_profile_complete)
+        else:
+            is_complete = bool(self._profile and self._profile.is_profile_complete)
+        profile_flags.set(self.user_id, is_complete)
+        return is_complete
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """Внешний middleware: кладет в data["user_ctx"] ленивый UserContext отправителя апдейта."""
+
+    def __init__(self):
+        self._user_repo = UserRepository()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        telegram_user: Optional[TelegramUser] = data.get("event_from_user")
+        if telegram_user is not None:
+            data["user_ctx"] = UserContext(telegram_user, self._user_repo)
+        return await handler(event, data)
@@ -1,5 +1,10 @@
+import asyncio
+import hashlib
 import logging
-from typing import Optional
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
 from aiogram import Bot
 from aiogram.utils.markdown import hbold, hitalic
 from DataBase.models import ApplicationStatus, Application, Activity 
@@ -7,9 +12,124 @@ from DataBase.models.application_repo import ApplicationRepository
 from DataBase.models.activity_repo import ActivityRepository
 from datetime import datetime
 import json
+from pydantic import ValidationError
+from send_queue import send_queue, Priority
+from config import config
+from outbox import outbox_worker
+from DataBase.models import OutboxKind, OutboxMessage
+from DataBase.models.outbox_repo import NotificationOutboxRepository
 
 logger = logging.getLogger(__name__)
 
+# Сколько последних отправленных состояний помнит журнал дедупликации
+NOTIFY_LEDGER_LIMIT = 10000
+
+NotificationKey = Tuple[int, int]
+
+
+@dataclass
+class _PendingNotification:
+    digest: str
+    version: Optional[int]
+    send: Callable[[], Awaitable[bool]]
+    waiters: List[asyncio.Future] = field(default_factory=list)
+
+
+@dataclass
+class CoalesceStats:
+    sent: int = 0
+    coalesced: int = 0
+    duplicates: int = 0
+    stale: int = 0
+
+
+class NotificationCoalescer:
+    """
+    Склейка и дедупликация уведомлений по ключу (user_id, application_id).
+
+    Первое уведомление по ключу ждет window секунд; пришедшие за это время
+    заменяют его, и уходит только последнее состояние. Все вызывающие
+    получают результат этой одной отправки. Журнал помнит хэш последнего
+    отправленного текста: точный повтор (например, повторная доставка из
+    outbox) не отправляется. version (id строки outbox) отсекает устаревшие
+    состояния, пришедшие после более новых.
+    """
+
+    def __init__(self, window: float, dedup_ttl: float):
+        self._window = window
+        self._dedup_ttl = dedup_ttl
+        self._pending: Dict[NotificationKey, _PendingNotification] = {}
+        self._sent: "OrderedDict[NotificationKey, Tuple[str, Optional[int], float]]" = OrderedDict()
+        self._flushes: Set[asyncio.Task] = set()
+        self.stats = CoalesceStats()
+
+    def _last_sent(self, key: NotificationKey) -> Optional[Tuple[str, Optional[int], float]]:
+        entry = self._sent.get(key)
+        if entry is not None and time.monotonic() - entry[2] > self._dedup_ttl:
+            del self._sent[key]
+            return None
+        return entry
+
+    def _remember(self, key: NotificationKey, digest: str, version: Optional[int]):
+        self._sent[key] = (digest, version, time.monotonic())
+        self._sent.move_to_end(key)
+        while len(self._sent) > NOTIFY_LEDGER_LIMIT:
+            self._sent.popitem(last=False)
+
+    async def submit(self, key: NotificationKey, text: str, send: Callable[[], Awaitable[bool]], version: Optional[int] = None) -> bool:
+        last = self._last_sent(key)
+        if last is not None and version is not None and last[1] is not None and version < last[1]:
+            self.stats.stale += 1
+            logger.info(f"Notifications: Skipping stale update for {key} (version {version} < {last[1]}).")
+            return True
+
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        future = asyncio.get_running_loop().create_future()
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = _PendingNotification(digest=digest, version=version, send=send)
+            self._pending[key] = pending
+            task = asyncio.create_task(self._flush(key, pending))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+        else:
+            self.stats.coalesced += 1
+            if version is None or pending.version is None or version >= pending.version:
+                pending.digest, pending.version, pending.send = digest, version, send
+        pending.waiters.append(future)
+        return await future
+
+    async def _flush(self, key: NotificationKey, pending: _PendingNotification):
+        delivered = False
+        try:
+            if self._window > 0:
+                await asyncio.sleep(self._window)
+            self._pending.pop(key, None)
+            last = self._last_sent(key)
+            if last is not None and last[0] == pending.digest:
+                self.stats.duplicates += 1
+                logger.info(f"Notifications: Suppressed duplicate update for {key}.")
+                delivered = True
+            else:
+                delivered = await pending.send()
+                if delivered:
+                    self.stats.sent += 1
+                    self._remember(key, pending.digest, pending.version)
+        except Exception as e:
+            logger.error(f"Notifications: Failed to flush update for {key}: {e}", exc_info=True)
+        finally:
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+            for waiter in pending.waiters:
+                if not waiter.done():
+                    waiter.set_result(delivered)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self.stats.__dict__, "pending": len(self._pending), "ledger": len(self._sent)}
+
+
+status_notifications = NotificationCoalescer(config.send.notify_coalesce_seconds, config.send.notify_dedup_ttl_seconds)
+
 STATUS_TRANSLATIONS = {
     ApplicationStatus.PENDING: "Рассматривается",
     ApplicationStatus.UNDER_REVIEW: "На рассмотрении",
@@ -26,10 +146,12 @@ async def send_application_status_update(
     application_id: int,
     target_title: str,
     new_status: ApplicationStatus,
-    hr_comment: Optional[str] = None
-) -> None:
+    hr_comment: Optional[str] = None,
+    version: Optional[int] = None
+) -> bool:
     """
     Отправляет уведомление пользователю об изменении статуса заявки.
+    Быстрые смены статуса одной заявки склеиваются, повторы не отправляются.
     
     Args:
         bot: Экземпляр бота
@@ -38,6 +160,7 @@ async def send_application_status_update(
         target_title: Название цели
         new_status: Новый статус заявки
         hr_comment: Комментарий HR (опционально)
+        version: Порядковый номер изменения (id строки outbox), если известен
     """
     try:
         # Формируем сообщение в зависимости от статуса
@@ -62,15 +185,17 @@ async def send_application_status_update(
             hr_comment = hr_comment.replace('\\n', '\n')
             message += f"\n\nКомментарий HR:\n{hr_comment}"
 
-        # Отправляем сообщение
-        await bot.send_message(
-            chat_id=user_id,
-            text=message,
-            parse_mode="HTML"
-        )
-        logger.info(f"Sent application status update to user {user_id} for application {application_id}")
+        # Отправляем сообщение через общую очередь с лимитами
+        async def send() -> bool:
+            sent = await send_queue.send_message(user_id, message, priority=Priority.NOTIFICATION, parse_mode="HTML")
+            if sent:
+                logger.info(f"Sent application status update to user {user_id} for application {application_id}")
+            return sent is not None
+
+        return await status_notifications.submit((user_id, application_id), message, send, version=version)
     except Exception as e:
         logger.error(f"Error sending application status update to user {user_id}: {e}", exc_info=True)
+        return False
         
 async def process_status_change_and_notify(
     bot_instance: Bot,
@@ -87,7 +212,6 @@ async def process_status_change_and_notify(
         return
 
     user_id_to_notify = app_details.get('user_id')
-    target_title = app_details.get('target_title', 'Неизвестная цель')
 
     if not user_id_to_notify:
         logger.error(f"User ID not found for application {application_id_to_update}. Cannot send notification.")
@@ -100,125 +224,112 @@ async def process_status_change_and_notify(
     )
 
     if update_successful:
+        # Уведомление пишет в outbox триггер applications_update_notify в той же транзакции
         logger.info(f"(Via process_status_change_and_notify) Application {application_id_to_update} status successfully updated to {new_status_for_app}.")
-        await send_application_status_update(
-            bot=bot_instance,
-            user_id=user_id_to_notify,
-            application_id=application_id_to_update,
-            target_title=target_title,
-            new_status=new_status_for_app,
-            hr_comment=hr_comment_for_app
-        )
+        outbox_worker.wake()
     else:
         logger.error(f"(Via process_status_change_and_notify) Failed to update status for application {application_id_to_update}.")
 
-async def process_application_update_from_db_notify(
-    bot_instance: Bot,
-    application_id: int
-):
-    app_repo = ApplicationRepository()
-    logger.info(f"DB Notify: Processing update for application_id: {application_id}")
-
-    app_details = await app_repo.get_application_details_for_notification(application_id)
-
-    if not app_details:
-        logger.error(f"DB Notify: Application {application_id} not found. Cannot send notification.")
-        return
-
-    user_id_to_notify = app_details.get('user_id')
-    target_title = app_details.get('target_title', 'Неизвестная цель')
-    actual_new_status: Optional[ApplicationStatus] = app_details.get('status') 
-    actual_hr_comment: Optional[str] = app_details.get('hr_comment')
-
-    if not user_id_to_notify:
-        logger.error(f"DB Notify: User ID not found for application {application_id}. Cannot send notification.")
-        return
-    
-    if not actual_new_status:
-        logger.error(f"DB Notify: Status not found for application {application_id} after fetching details. Cannot send notification.")
-        return
-
-    logger.info(f"DB Notify: Sending notification for application {application_id}, new status {actual_new_status}.")
-    await send_application_status_update(
-        bot=bot_instance,
-        user_id=user_id_to_notify,
-        application_id=application_id,
-        target_title=target_title,
-        new_status=actual_new_status,
-        hr_comment=actual_hr_comment
-    )
-
 async def send_activity_time_change_notification(
     bot: Bot,
     user_id: int,
     activity_title: str,
     activity_id: int,
     new_start_time: datetime,
-    new_end_time: datetime
-):
+    new_end_time: datetime,
+    old_start_time: Optional[datetime] = None
+) -> bool:
+    previous_time = (
+        f"Прежнее начало: {old_start_time.strftime('%d.%m.%Y в %H:%M %Z')}\\n\\n"
+        if old_start_time else ""
+    )
     message_text = (
         f"🔔 Важное обновление по активности!\\n\\n"
         f"Время проведения мероприятия {hbold(activity_title)} (ID: {activity_id}) было изменено.\\n\\n"
+        f"{previous_time}"
         f"Новое время:\\n"
         f"▶️ Начало: {hbold(new_start_time.strftime('%d.%m.%Y в %H:%M %Z'))}\\n"
         f"⏹️ Окончание: {hbold(new_end_time.strftime('%d.%m.%Y в %H:%M %Z'))}\\n\\n"
         f"Пожалуйста, проверьте актуальное расписание."
     )
-    try:
-        await bot.send_message(user_id, message_text)
-        logger.info(f"Sent activity time change notification to user {user_id} for activity {activity_id}.")
-    except Exception as e:
-        logger.error(f"Failed to send activity time change notification to user {user_id} for activity {activity_id}: {e}")
+    sent = await send_queue.send_message(user_id, message_text, priority=Priority.BULK)
+    if sent:
+        logger.debug(f"Sent activity time change notification to user {user_id} for activity {activity_id}.")
+    else:
+        logger.error(f"Failed to send activity time change notification to user {user_id} for activity {activity_id}.")
+    return sent is not None
 
-async def process_activity_update_from_db_notify(bot_instance: Bot, payload_str: str):
-    logger.info(f"DB Notify: Processing activity update with payload: {payload_str}")
+async def deliver_application_status_from_outbox(bot_instance: Bot, message: OutboxMessage) -> bool:
+    payload = message.payload
     try:
-        payload = json.loads(payload_str)
-        activity_id = payload.get('id')
-        if activity_id is None:
-            logger.error(f"DB Notify: 'id' (for activity_id) not found in payload: {payload_str}")
-            return
-        
-    except json.JSONDecodeError:
-        logger.error(f"DB Notify: Invalid JSON payload for activity update: {payload_str}")
-        try:
-            activity_id = int(payload_str)
-            logger.warning(f"DB Notify: Payload was not JSON, attempting to parse as int activity_id: {activity_id}")
-        except ValueError:
-            logger.error(f"DB Notify: Payload is not valid JSON and not a simple activity_id: {payload_str}")
-            return
-    
-    if not isinstance(activity_id, int):
-        logger.error(f"DB Notify: Extracted activity_id is not an integer: {activity_id}. Payload was: {payload_str}")
-        return
+        status = ApplicationStatus(payload.get('status'))
+    except ValueError:
+        logger.error(f"Outbox: Invalid status in message {message.id}: {payload}")
+        return True
+    return await send_application_status_update(
+        bot=bot_instance,
+        user_id=message.user_id,
+        application_id=payload.get('application_id'),
+        target_title=payload.get('target_title') or 'Неизвестная цель',
+        new_status=status,
+        hr_comment=payload.get('hr_comment'),
+        version=message.id
+    )
 
-    activity_repo = ActivityRepository()
-    app_repo = ApplicationRepository()
+async def deliver_activity_time_change_from_outbox(bot_instance: Bot, message: OutboxMessage) -> bool:
+    """
+    Строка изменения (без user_id) разворачивается в outbox-строку на каждого
+    записанного, дальше каждая доставляется и повторяется отдельно: аренда
+    покрывает одну отправку, а сбой не отправляет сообщение повторно тем,
+    кто его уже получил.
+    """
+    # Триггер кладет в payload активность на момент изменения; старые строки outbox содержат только id
+    payload = message.payload
+    activity_id = int(payload.get('activity_id'))
+    activity_details: Optional[Activity] = None
+    old_start_time: Optional[datetime] = None
+    try:
+        if payload.get('activity'):
+            activity_details = Activity.model_validate(payload['activity'])
+        if payload.get('old_start_time'):
+            old_start_time = datetime.fromisoformat(payload['old_start_time'])
+    except (ValidationError, ValueError) as e:
+        logger.warning(f"Outbox: Incomplete activity payload in message {message.id}, will fetch activity {activity_id}: {e}")
+        activity_details, old_start_time = None, None
 
-    activity_details = await activity_repo.get_activity_details_for_notification(activity_id)
+    if activity_details is None:
+        activity_details = await ActivityRepository().get_activity_details_for_notification(activity_id)
 
     if not activity_details:
-        logger.error(f"DB Notify: Activity {activity_id} not found. Cannot send notifications.")
-        return
+        logger.error(f"Outbox: Activity {activity_id} not found. Cannot send notifications.")
+        return True
 
     if not activity_details.start_time or not activity_details.end_time:
-        logger.error(f"DB Notify: Activity {activity_id} fetched, but start_time or end_time is missing. Title: {activity_details.title}. Cannot send notifications.")
-        return
+        logger.error(f"Outbox: Activity {activity_id} fetched, but start_time or end_time is missing. Title: {activity_details.title}. Cannot send notifications.")
+        return True
 
-    user_ids_to_notify = await app_repo.get_user_ids_for_activity(activity_id)
+    if message.user_id is None:
+        recipient_payload = {**payload, 'activity': activity_details.model_dump(mode='json')}
+        if old_start_time is None:
+            recipient_payload.pop('old_start_time', None)
+        recipients = await NotificationOutboxRepository().expand_to_activity_registrants(message.id, activity_id, recipient_payload)
+        if recipients:
+            logger.info(f"Outbox: Activity {activity_id} time change queued for {recipients} registrants.")
+            outbox_worker.wake()
+        else:
+            logger.info(f"Outbox: No users found for activity {activity_id}. No notifications to send.")
+        return True
 
-    if not user_ids_to_notify:
-        logger.info(f"DB Notify: No users found for activity {activity_id}. No notifications to send.")
-        return
+    return await send_activity_time_change_notification(
+        bot=bot_instance,
+        user_id=message.user_id,
+        activity_title=activity_details.title,
+        activity_id=activity_id,
+        new_start_time=activity_details.start_time,
+        new_end_time=activity_details.end_time,
+        old_start_time=old_start_time
+    )
 
-    logger.info(f"DB Notify: Sending activity time change notifications for activity {activity_id} (Title: {activity_details.title}) to users: {user_ids_to_notify}")
-
-    for user_id in user_ids_to_notify:
-        await send_activity_time_change_notification(
-            bot=bot_instance,
-            user_id=user_id,
-            activity_title=activity_details.title,
-            activity_id=activity_id,
-            new_start_time=activity_details.start_time,
-            new_end_time=activity_details.end_time
-        )
+def register_outbox_handlers():
+    outbox_worker.register(OutboxKind.APPLICATION_STATUS, deliver_application_status_from_outbox)
+    outbox_worker.register(OutboxKind.ACTIVITY_TIME_CHANGE, deliver_activity_time_change_from_outbox)
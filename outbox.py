@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiogram import Bot
+
+from config import config, OutboxConfig
+from DataBase.models import OutboxKind, OutboxMessage
+from DataBase.models.outbox_repo import NotificationOutboxRepository
+
+logger = logging.getLogger(__name__)
+
+# Обработчик возвращает True, если сообщение доставлено и строку можно закрыть
+OutboxHandler = Callable[[Bot, OutboxMessage], Awaitable[bool]]
+
+
+@dataclass
+class OutboxStats:
+    claimed: int = 0
+    delivered: int = 0
+    retried: int = 0
+    failed: int = 0
+    batches: int = 0
+
+
+class OutboxWorker:
+    """
+    Доставка уведомлений из notification_outbox (at-least-once).
+
+    Каждый воркер арендует пачку строк (FOR UPDATE SKIP LOCKED + lease),
+    отправляет их параллельно и закрывает одной командой; неудачные
+    возвращаются в очередь с экспоненциальной задержкой. Если процесс
+    упал посреди пачки, аренда истечет и строки заберет другой воркер.
+    Будится через NOTIFY notification_outbox, иначе опрашивает таблицу
+    раз в poll_interval.
+    """
+
+    def __init__(self, outbox_config: OutboxConfig):
+        self._config = outbox_config
+        self._repo = NotificationOutboxRepository()
+        self._handlers: Dict[OutboxKind, OutboxHandler] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._bot: Optional[Bot] = None
+        self.stats = OutboxStats()
+
+    def register(self, kind: OutboxKind, handler: OutboxHandler):
+        self._handlers[kind] = handler
+
+    def wake(self):
+        self._wakeup.set()
+
+    def start(self, bot: Bot):
+        if self._tasks:
+            return
+        self._bot = bot
+        self._tasks = [asyncio.create_task(self._run(i)) for i in range(self._config.workers)]
+        logger.info(f"Outbox: Started {self._config.workers} workers.")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info(f"Outbox: Stopped. Stats: {self.stats}")
+
+    async def _run(self, index: int):
+        while True:
+            try:
+                processed = await self.process_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox: Worker {index} failed: {e}", exc_info=True)
+                processed = 0
+            if processed < self._config.batch_size:
+                # Пачка неполная - очередь разобрана, ждем NOTIFY или следующего опроса
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._config.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _handler_for(self, message: OutboxMessage) -> Optional[OutboxHandler]:
+        try:
+            return self._handlers.get(OutboxKind(message.kind))
+        except ValueError:
+            return None
+
+    async def _deliver(self, message: OutboxMessage, handler: OutboxHandler) -> Optional[str]:
+        try:
+            return None if await handler(self._bot, message) else "delivery failed"
+        except Exception as e:
+            logger.error(f"Outbox: Handler for message {message.id} ({message.kind}) raised: {e}", exc_info=True)
+            return str(e)
+
+    async def process_batch(self) -> int:
+        messages = await self._repo.claim_batch(self._config.batch_size, self._config.lease_seconds)
+        if not messages:
+            return 0
+        claimed = len(messages)
+        self.stats.batches += 1
+        self.stats.claimed += claimed
+
+        # Неизвестный вид или вид без обработчика повтором не исправится: строка сразу уходит в failed
+        handlers = {message.id: self._handler_for(message) for message in messages}
+        unhandled: Dict[str, List[int]] = {}
+        for message in messages:
+            if handlers[message.id] is None:
+                unhandled.setdefault(f"no handler for kind {message.kind}", []).append(message.id)
+        for error, ids in unhandled.items():
+            logger.error(f"Outbox: {len(ids)} messages failed: {error}.")
+            await self._repo.mark_failed(ids, error)
+            self.stats.failed += len(ids)
+        messages = [message for message in messages if handlers[message.id] is not None]
+
+        errors = await asyncio.gather(*(self._deliver(message, handlers[message.id]) for message in messages))
+
+        delivered = [message.id for message, error in zip(messages, errors) if error is None]
+        failed: Dict[str, List[int]] = {}
+        for message, error in zip(messages, errors):
+            if error is not None:
+                failed.setdefault(error, []).append(message.id)
+
+        await self._repo.mark_delivered(delivered)
+        for error, ids in failed.items():
+            await self._repo.mark_retry(ids, error, self._config.retry_base_seconds, self._config.retry_max_seconds, self._config.max_attempts)
+        self.stats.delivered += len(delivered)
+        self.stats.retried += len(messages) - len(delivered)
+        if failed:
+            logger.warning(f"Outbox: {len(messages) - len(delivered)} of {len(messages)} messages will be retried.")
+        return claimed
+
+
+outbox_worker = OutboxWorker(config.outbox)
@@ -1,106 +1,396 @@
 import asyncio
 import logging
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 
 from aiogram import Bot
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.jobstores.base import JobLookupError
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED, JobExecutionEvent
 
-from DataBase.models import ReminderType, Activity 
-from DataBase.models.activity_repo import ActivityRepository 
+from DataBase.models import ReminderType, Activity
 from DataBase.models.activity_reminder_repo import ActivityReminderRepository
+from send_queue import send_queue, Priority
+from fanout import fan_out
+from config import config
+from leader import leader
 
 logger = logging.getLogger(__name__)
-scheduler = AsyncIOScheduler(timezone="Europe/Moscow") 
+scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
+
+REMINDER_SWEEP_JOB_ID = "activity_reminder_sweep"
+REMINDER_METRICS_JOB_ID = "activity_reminder_metrics"
+# Напоминание, до срока которого активность перенесли дальше чем на это, возвращается в ожидание
+RETIME_TOLERANCE = timedelta(minutes=1)
+# Напоминание, опоздавшее больше чем на эту долю смещения (24h -> 2.4 ч, 1h -> 6 мин), закрывается без отправки
+REMINDER_MAX_LATENESS_SHARE = 0.1
+
+_OFFSET_UNITS = {"d": "days", "h": "hours", "m": "minutes"}
+
+REMINDER_LEAD_TEXT: Dict[ReminderType, str] = {
+    ReminderType.D7: "через неделю",
+    ReminderType.H24: "примерно через 24 часа",
+    ReminderType.H1: "примерно через час",
+}
+
+def _parse_offsets(values: Tuple[str, ...]) -> Dict[ReminderType, timedelta]:
+    offsets: Dict[ReminderType, timedelta] = {}
+    for value in values:
+        try:
+            reminder_type = ReminderType(value)
+            offsets[reminder_type] = timedelta(**{_OFFSET_UNITS[value[-1]]: int(value[:-1])})
+        except (ValueError, KeyError):
+            logger.error(f"Scheduler: Unknown reminder offset '{value}' in REMINDER_OFFSETS, ignoring. Known: {[t.value for t in ReminderType]}.")
+    return offsets
+
+REMINDER_OFFSETS: Dict[ReminderType, timedelta] = _parse_offsets(config.reminders.offsets)
+
+# Границы корзин гистограмм, секунды
+LATENESS_BUCKETS = (1, 5, 15, 30, 60, 300, 900, 3600)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 15, 60)
+
+
+class Histogram:
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        index = next((i for i, bound in enumerate(self.bounds) if value <= bound), len(self.bounds))
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": dict(zip(labels, self.buckets)),
+        }
+
+
+@dataclass
+class ReminderTypeMetrics:
+    sent: int = 0
+    failed: int = 0
+    skipped: int = 0
+    requeued: int = 0
+    # Неудачные отправки после последней попытки
+    abandoned: int = 0
+    # Фактическая отправка относительно run_at
+    lateness: Histogram = field(default_factory=lambda: Histogram(LATENESS_BUCKETS))
+    # Постановка в send_queue -> ответ Telegram
+    send_latency: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+
+
+@dataclass
+class SchedulerMetrics:
+    sweeps: int = 0
+    misfires: int = 0
+    job_errors: int = 0
+    sweep_duration: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+    # Старт задачи APScheduler относительно запланированного времени
+    job_lag: Histogram = field(default_factory=lambda: Histogram(LATENESS_BUCKETS))
+    by_type: Dict[ReminderType, ReminderTypeMetrics] = field(default_factory=dict)
+    pending: Dict[str, int] = field(default_factory=dict)
+
+    def for_type(self, reminder_type: ReminderType) -> ReminderTypeMetrics:
+        metrics = self.by_type.get(reminder_type)
+        if metrics is None:
+            metrics = self.by_type[reminder_type] = ReminderTypeMetrics()
+        return metrics
+
+
+scheduler_metrics = SchedulerMetrics()
+
+
+def get_scheduler_metrics() -> Dict[str, Any]:
+    return {
+        "sweeps": scheduler_metrics.sweeps,
+        "misfires": scheduler_metrics.misfires,
+        "job_errors": scheduler_metrics.job_errors,
+        "scheduled_jobs": len(scheduler.get_jobs()),
+        "pending_reminders": dict(scheduler_metrics.pending),
+        "sweep_duration": scheduler_metrics.sweep_duration.snapshot(),
+        "job_lag": scheduler_metrics.job_lag.snapshot(),
+        "by_type": {
+            reminder_type.value: {
+                "sent": metrics.sent,
+                "failed": metrics.failed,
+                "skipped": metrics.skipped,
+                "requeued": metrics.requeued,
+                "abandoned": metrics.abandoned,
+                "lateness": metrics.lateness.snapshot(),
+                "send_latency": metrics.send_latency.snapshot(),
+            }
+            for reminder_type, metrics in scheduler_metrics.by_type.items()
+        },
+    }
+
+
+def _on_job_event(event: JobExecutionEvent):
+    if event.code == EVENT_JOB_MISSED:
+        scheduler_metrics.misfires += 1
+        logger.warning(f"Scheduler: Job {event.job_id} missed its run time {event.scheduled_run_time}.")
+        return
+    if event.code == EVENT_JOB_ERROR:
+        scheduler_metrics.job_errors += 1
+    if event.scheduled_run_time is not None:
+        lag = (datetime.now(scheduler.timezone) - event.scheduled_run_time).total_seconds()
+        scheduler_metrics.job_lag.observe(max(lag, 0.0))
+
+scheduler.add_listener(_on_job_event, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+
+async def log_scheduler_metrics():
+    try:
+        scheduler_metrics.pending = await ActivityReminderRepository().count_pending()
+    except Exception as e:
+        logger.error(f"Scheduler: Failed to count pending reminders: {e}", exc_info=True)
+    logger.info(f"Scheduler: Metrics: {get_scheduler_metrics()}")
+
+def _format_start_time(activity_start_time: datetime) -> str:
+    start_time_for_message = activity_start_time.strftime("%d.%m.%Y в %H:%M")
+    if activity_start_time.tzinfo:
+        start_time_for_message += f" {activity_start_time.tzinfo}"
+    else:
+        start_time_for_message += f" ({scheduler.timezone})"
+    return start_time_for_message
 
 async def send_actual_reminder_message(
-    bot: Bot, 
-    user_id: int, 
-    activity_id: int, 
-    activity_title: str, 
-    activity_start_time_str: str 
-):
+    user_id: int,
+    activity_id: int,
+    activity_title: str,
+    activity_start_time_str: str,
+    reminder_type: ReminderType = ReminderType.H24
+) -> bool:
     message_text = (
         f"👋 Напоминание!\\n\\n"
         f"Мероприятие '{activity_title}' (ID: {activity_id}), на которое вы записаны, "
-        f"начнется примерно через 24 часа - {activity_start_time_str}.\\n\\n"
+        f"начнется {REMINDER_LEAD_TEXT[reminder_type]} - {activity_start_time_str}.\\n\\n"
         f"Не пропустите!"
     )
-    try:
-        await bot.send_message(user_id, message_text)
-        logger.info(f"Successfully sent 24h reminder to user {user_id} for activity {activity_id} ('{activity_title}').")
-    except Exception as e:
-        logger.error(f"Failed to send 24h reminder message to user {user_id} for activity {activity_id}: {e}")
-        
+    sent = await send_queue.send_message(user_id, message_text, priority=Priority.BULK)
+    if sent:
+        logger.debug(f"Successfully sent {reminder_type.value} reminder to user {user_id} for activity {activity_id} ('{activity_title}').")
+    else:
+        logger.error(f"Failed to send {reminder_type.value} reminder message to user {user_id} for activity {activity_id}.")
+    return sent is not None
+
 async def schedule_reminder_for_activity(
-    bot: Bot, 
-    user_id: int, 
-    activity: Activity 
+    user_id: int,
+    activity: Activity
 ):
-    reminder_repo = ActivityReminderRepository()
-    
+    # Только запись в activity_reminders: отправку делает периодический обход ведущего экземпляра
     activity_id = activity.id
-    activity_title = activity.title
-    activity_start_time = activity.start_time
-
-    already_handled = await reminder_repo.has_reminder_been_sent(user_id, activity_id, ReminderType.H24)
-    if already_handled:
-        logger.info(f"Reminder for user {user_id}, activity {activity_id} (type {ReminderType.H24.value}) already handled (scheduled/sent). Skipping.")
+    now_in_scheduler_tz = datetime.now(scheduler.timezone)
+    run_at_by_type = {
+        reminder_type: activity.start_time - offset
+        for reminder_type, offset in REMINDER_OFFSETS.items()
+        if activity.start_time - offset > now_in_scheduler_tz
+    }
+    if not run_at_by_type:
+        logger.info(f"No reminders to schedule for activity {activity_id} for user {user_id}: every reminder time is already in the past.")
         return
+    try:
+        added = await ActivityReminderRepository().add_pending_reminders(user_id, activity_id, run_at_by_type)
+    except Exception as e:
+        logger.error(f"Failed to schedule reminders for activity {activity_id} to user {user_id}: {e}", exc_info=True)
+        return
+    if added:
+        logger.info(f"Scheduled {[t.value for t in added]} reminders for user {user_id} on activity {activity_id}.")
+    else:
+        logger.info(f"Reminders for user {user_id}, activity {activity_id} already handled (scheduled/sent). Skipping.")
 
-    run_date = activity_start_time - timedelta(hours=24)
-    now_in_scheduler_tz = datetime.now(scheduler.timezone)
+async def _deliver_group(activity_id: int, reminder_type: ReminderType, run_at: datetime, title: str, start_time: datetime, recipients_by_user: Dict[int, Tuple[int, int]]):
+    # recipients_by_user: user_id -> (id строки, номер попытки)
+    reminder_repo = ActivityReminderRepository()
+    start_time_for_message = _format_start_time(start_time)
+    user_ids = list(recipients_by_user)
 
-    if run_date <= now_in_scheduler_tz:
-        logger.info(f"Cannot schedule 24h reminder for activity {activity_id} for user {user_id}. Calculated run_date {run_date} is in the past or too soon.")
-        return
+    async def recipients():
+        yield user_ids
 
-    job_id = f"activity_reminder_user{user_id}_activity{activity_id}_type{ReminderType.H24.value}"
-    
-    start_time_for_message = activity_start_time.strftime("%d.%m.%Y в %H:%M")
-    if activity_start_time.tzinfo:
-        start_time_for_message += f" {activity_start_time.tzinfo}"
-    else: 
-        start_time_for_message += f" ({scheduler.timezone})" 
+    metrics = scheduler_metrics.for_type(reminder_type)
+    sent_ids: List[int] = []
+    failed_ids: List[int] = []
+
+    async def remind(user_id: int) -> bool:
+        started = time.monotonic()
+        sent = await send_actual_reminder_message(user_id, activity_id, title, start_time_for_message, reminder_type)
+        metrics.send_latency.observe(time.monotonic() - started)
+        reminder_id, attempts = recipients_by_user[user_id]
+        if sent:
+            sent_ids.append(reminder_id)
+            metrics.sent += 1
+            metrics.lateness.observe(max((datetime.now(scheduler.timezone) - run_at).total_seconds(), 0.0))
+        else:
+            failed_ids.append(reminder_id)
+            metrics.failed += 1
+            if attempts >= config.reminders.max_attempts:
+                metrics.abandoned += 1
+        return sent
 
     try:
-        existing_job = scheduler.get_job(job_id)
-        if existing_job:
-            logger.warning(f"Job {job_id} already exists in scheduler. Skipping add. This case should ideally be caught by has_reminder_been_sent.")
-            if not await reminder_repo.has_reminder_been_sent(user_id, activity_id, ReminderType.H24):
-                 await reminder_repo.add_reminder_sent(user_id, activity_id, ReminderType.H24)
-            return
-
-        scheduler.add_job(
-            send_actual_reminder_message, 
-            'date', 
-            run_date=run_date, 
-            args=[bot, user_id, activity_id, activity_title, start_time_for_message],
-            id=job_id,
-            replace_existing=True 
-        )
-        await reminder_repo.add_reminder_sent(user_id, activity_id, ReminderType.H24)
-        logger.info(f"Scheduled 24h reminder job {job_id} for activity {activity_id} to user {user_id} at {run_date}.")
-    except Exception as e:
-        logger.error(f"Failed to schedule 24h reminder job for activity {activity_id} to user {user_id}: {e}", exc_info=True)
+        await fan_out(f"reminder:{activity_id}:{reminder_type.value}", recipients(), remind)
+    finally:
+        # Неотмеченные строки (сбой посреди рассылки) вернутся в работу по истечении аренды
+        await reminder_repo.mark_closed(sent_ids)
+        reminders = config.reminders
+        await reminder_repo.mark_retry(failed_ids, reminders.retry_base_seconds, reminders.retry_max_seconds, reminders.max_attempts)
+    if failed_ids:
+        logger.warning(f"Scheduler: {len(failed_ids)} {reminder_type.value} reminders for activity {activity_id} failed and will be retried.")
+
+def _is_stale(reminder_type: ReminderType, start_time: datetime, now: datetime) -> bool:
+    # Текст «через 24 часа» / «через час» уже не соответствует оставшемуся времени
+    offset = REMINDER_OFFSETS[reminder_type]
+    return start_time - now < offset * (1 - REMINDER_MAX_LATENESS_SHARE)
+
+async def sweep_due_reminders() -> int:
+    """
+    Периодический обход: арендует из activity_reminders пачки наступивших
+    напоминаний и рассылает их через fan_out. Доставка at-least-once:
+    sent_at ставится только после отправки, неудачные возвращаются
+    с экспоненциальной задержкой, аренда упавшего ведущего истекает.
+    Память не зависит от числа напоминаний, после рестарта восстанавливать нечего.
+    """
+    reminder_repo = ActivityReminderRepository()
+    batch_size = config.reminders.batch_size
+    processed = 0
+    started = time.monotonic()
+    scheduler_metrics.sweeps += 1
+    while True:
+        rows = await reminder_repo.claim_due_batch(batch_size, config.reminders.lease_seconds)
+        if not rows:
+            break
+        processed += len(rows)
+        now = datetime.now(scheduler.timezone)
+
+        groups: Dict[Tuple[int, ReminderType], Tuple[datetime, str, datetime, Dict[int, Tuple[int, int]]]] = {}
+        closed: List[int] = []
+        for reminder_id, user_id, activity_id, reminder_type_value, run_at, attempts, title, start_time, is_active in rows:
+            try:
+                reminder_type = ReminderType(reminder_type_value)
+            except ValueError:
+                closed.append(reminder_id)
+                continue
+            if not is_active or start_time <= now or reminder_type not in REMINDER_OFFSETS:
+                # Активность снята или уже началась, смещение убрано из конфигурации: строка просто закрывается
+                scheduler_metrics.for_type(reminder_type).skipped += 1
+                closed.append(reminder_id)
+                continue
+            groups.setdefault((activity_id, reminder_type), (run_at, title, start_time, {}))[3][user_id] = (reminder_id, attempts)
 
-async def cancel_scheduled_reminder(user_id: int, activity_id: int, reminder_type: ReminderType = ReminderType.H24):
-    job_id = f"activity_reminder_user{user_id}_activity{activity_id}_type{reminder_type.value}"
+        for (activity_id, reminder_type), (run_at, title, start_time, recipients_by_user) in groups.items():
+            reminder_ids = [reminder_id for reminder_id, _ in recipients_by_user.values()]
+            due_at = start_time - REMINDER_OFFSETS[reminder_type]
+            if due_at - now > RETIME_TOLERANCE:
+                # Перенос времени прошел мимо слушателя: возвращаем напоминания в ожидание с новым сроком
+                await reminder_repo.requeue_claimed(reminder_ids, due_at)
+                scheduler_metrics.for_type(reminder_type).requeued += len(reminder_ids)
+                logger.info(f"Scheduler: Activity {activity_id} moved, {len(reminder_ids)} {reminder_type.value} reminders requeued for {due_at}.")
+                continue
+            if _is_stale(reminder_type, start_time, now):
+                # Опоздавшее напоминание (ретраи, простой ведущего, перенос ближе) не отправляем с неверным текстом
+                await reminder_repo.mark_closed(reminder_ids)
+                scheduler_metrics.for_type(reminder_type).skipped += len(reminder_ids)
+                logger.info(f"Scheduler: Skipped {len(reminder_ids)} stale {reminder_type.value} reminders for activity {activity_id} starting {start_time}.")
+                continue
+            await _deliver_group(activity_id, reminder_type, run_at, title, start_time, recipients_by_user)
+        if closed:
+            await reminder_repo.mark_closed(closed)
+            logger.info(f"Scheduler: Closed {len(closed)} reminders for inactive or started activities.")
+        if len(rows) < batch_size:
+            break
+    scheduler_metrics.sweep_duration.observe(time.monotonic() - started)
+    return processed
+
+def start_reminder_sweep():
+    # Обход делает только ведущий экземпляр; coalesce + max_instances=1 - обходы не накладываются
+    scheduler.add_job(
+        sweep_due_reminders,
+        'interval',
+        seconds=config.reminders.sweep_interval_seconds,
+        id=REMINDER_SWEEP_JOB_ID,
+        next_run_time=datetime.now(scheduler.timezone),
+        coalesce=True,
+        max_instances=1,
+        replace_existing=True
+    )
+    scheduler.add_job(
+        log_scheduler_metrics,
+        'interval',
+        seconds=config.reminders.metrics_log_interval_seconds,
+        id=REMINDER_METRICS_JOB_ID,
+        coalesce=True,
+        max_instances=1,
+        replace_existing=True
+    )
+    logger.info(f"Scheduler: Reminder sweep started every {config.reminders.sweep_interval_seconds}s for offsets {[t.value for t in REMINDER_OFFSETS]}.")
+
+async def stop_reminder_sweep():
+    for job_id in (REMINDER_SWEEP_JOB_ID, REMINDER_METRICS_JOB_ID):
+        try:
+            scheduler.remove_job(job_id)
+        except JobLookupError:
+            pass
+    logger.info("Scheduler: Reminder sweep stopped.")
+
+async def cancel_scheduled_reminder(user_id: int, activity_id: int):
+    deleted = await ActivityReminderRepository().delete_pending_for_user(user_id, activity_id)
+    if deleted:
+        logger.info(f"Cancelled {deleted} pending reminders for user {user_id}, activity {activity_id}.")
+
+async def sync_activity_reminders(changes: Dict[int, Optional[Activity]]):
+    """
+    Приводит ожидающие напоминания в соответствие с изменениями активностей
+    из каталога: перенос времени пересчитывает run_at (напоминания, срок
+    которых уже прошел, удаляются, а недостающие, чей срок снова в будущем,
+    добавляются), снятие или удаление активности (None в changes) их отменяет.
+    Уведомление каталога получает каждый процесс, а строки правит только
+    ведущий - одной командой на пачку.
+    """
+    if not changes or not leader.is_leader:
+        return
+    cancelled = [activity_id for activity_id, activity in changes.items() if activity is None]
+    retimed = {activity_id: activity.start_time for activity_id, activity in changes.items() if activity is not None}
     reminder_repo = ActivityReminderRepository()
     try:
-        scheduler.remove_job(job_id)
-        logger.info(f"Successfully removed job {job_id} from scheduler.")
-    except JobLookupError:
-        logger.info(f"Job {job_id} not found in scheduler, could not remove (might have already run or never existed).")
+        if cancelled:
+            deleted = await reminder_repo.delete_pending_for_activities(cancelled)
+            if deleted:
+                logger.info(f"Scheduler: Cancelled {deleted} pending reminders for {len(cancelled)} removed activities.")
+        if retimed:
+            now = datetime.now(scheduler.timezone)
+            for reminder_type, offset in REMINDER_OFFSETS.items():
+                run_at_by_activity = {activity_id: start_time - offset for activity_id, start_time in retimed.items()}
+                # Срок уже прошел: такое напоминание с текстом «через 24 часа» было бы неправдой
+                overdue = [activity_id for activity_id, run_at in run_at_by_activity.items() if run_at <= now]
+                if overdue:
+                    dropped = await reminder_repo.delete_pending_of_type(reminder_type, overdue)
+                    if dropped:
+                        logger.info(f"Scheduler: Dropped {dropped} pending {reminder_type.value} reminders moved into the past for activities {overdue}.")
+                upcoming = {activity_id: run_at for activity_id, run_at in run_at_by_activity.items() if run_at > now}
+                if upcoming:
+                    moved = await reminder_repo.retime_pending(reminder_type, upcoming)
+                    if moved:
+                        logger.info(f"Scheduler: Moved {moved} pending {reminder_type.value} reminders after activity time changes.")
+                    # Смещение, срок которого при регистрации уже прошел, после переноса снова в будущем
+                    added = await reminder_repo.add_missing_for_registrants(reminder_type, upcoming)
+                    if added:
+                        logger.info(f"Scheduler: Added {added} {reminder_type.value} reminders that came due again after activity time changes.")
     except Exception as e:
-        logger.error(f"Error removing job {job_id} from scheduler: {e}", exc_info=True)
-    
-    deleted_from_db = await reminder_repo.delete_reminder(user_id, activity_id, reminder_type)
-    if not deleted_from_db:
-        logger.warning(f"Could not delete reminder from DB for user {user_id}, activity {activity_id}, type {reminder_type.value} (it might not have existed).")
+        logger.error(f"Scheduler: Failed to sync reminders for activities {list(changes)}: {e}", exc_info=True)
 
 
-def setup_scheduler_jobs(bot: Bot): 
+def setup_scheduler_jobs(bot: Bot):
     try:
         if not scheduler.running:
             scheduler.start()
@@ -112,6 +402,6 @@ def setup_scheduler_jobs(bot: Bot):
 
 async def shutdown_scheduler():
     if scheduler and scheduler.running:
-        logger.info("Scheduler: Shutting down...")
+        logger.info(f"Scheduler: Shutting down... Metrics: {get_scheduler_metrics()}")
         scheduler.shutdown(wait=False)
-        logger.info("Scheduler: Shutdown complete.") 
+        logger.info("Scheduler: Shutdown complete.")
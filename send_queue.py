@@ -0,0 +1,281 @@
+import asyncio
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import (
+    TelegramRetryAfter,
+    TelegramForbiddenError,
+    TelegramBadRequest,
+    TelegramNotFound,
+    TelegramNetworkError,
+    TelegramServerError,
+)
+from aiogram.methods import TelegramMethod
+from aiogram.types import Message
+
+from config import config, SendConfig
+
+logger = logging.getLogger(__name__)
+
+# Интерактивный ответ ждет flood control не дольше этого, иначе ошибка уходит в хендлер
+INTERACTIVE_MAX_RETRY_WAIT = 5.0
+PER_CHAT_BUCKETS_LIMIT = 10000
+
+# Запрос отправлен воркером очереди: токены уже взяты, middleware их не берет повторно
+_queued_send: ContextVar[bool] = ContextVar("queued_send", default=False)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    NOTIFICATION = 1
+    BULK = 2
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        # Берет токен "в долг" и возвращает, сколько секунд подождать до его появления
+        self._refill(time.monotonic())
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def pause(self, seconds: float):
+        self._refill(time.monotonic())
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    def is_idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self._tokens >= self.capacity
+
+
+class SendLimiter:
+    """
+    Общий лимит бота, отдельный (меньший) лимит для фоновых рассылок и
+    лимит на каждый чат. Фон никогда не выбирает весь глобальный лимит,
+    поэтому ответам пользователю всегда остается запас.
+    """
+
+    def __init__(self, send_config: SendConfig):
+        self._config = send_config
+        self._global = TokenBucket(send_config.global_rate, send_config.global_rate)
+        self._background = TokenBucket(send_config.background_rate, send_config.background_rate)
+        self._chats: Dict[int, TokenBucket] = {}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= PER_CHAT_BUCKETS_LIMIT:
+                self._chats = {cid: b for cid, b in self._chats.items() if not b.is_idle()}
+            bucket = TokenBucket(self._config.per_chat_rate, self._config.per_chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def acquire(self, chat_id: Optional[int], interactive: bool):
+        delays = [self._global.reserve()]
+        if not interactive:
+            delays.append(self._background.reserve())
+        if chat_id is not None:
+            delays.append(self._chat_bucket(chat_id).reserve())
+        delay = max(delays)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        logger.warning(f"Send limiter: Telegram flood control, pausing outgoing messages for {seconds}s.")
+        self._global.pause(seconds)
+        self._background.pause(seconds)
+
+
+class InteractiveRateLimitMiddleware(BaseRequestMiddleware):
+    """Ответы хендлеров (send*/edit*/copy*/forward*) проходят через тот же лимитер, вне очереди."""
+
+    def __init__(self, limiter: SendLimiter):
+        self._limiter = limiter
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        chat_id = getattr(method, "chat_id", None)
+        name = type(method).__name__
+        if _queued_send.get() or not name.startswith(("Send", "Edit", "Copy", "Forward")):
+            return await make_request(bot, method)
+        await self._limiter.acquire(chat_id if isinstance(chat_id, int) else None, interactive=True)
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter as e:
+            self._limiter.pause(e.retry_after)
+            if e.retry_after > INTERACTIVE_MAX_RETRY_WAIT:
+                raise
+            await asyncio.sleep(e.retry_after)
+            return await make_request(bot, method)
+
+
+@dataclass(order=True)
+class _OutgoingMessage:
+    priority: int
+    seq: int
+    chat_id: int = field(compare=False)
+    text: str = field(compare=False)
+    kwargs: Dict[str, Any] = field(compare=False, default_factory=dict)
+    future: Optional[asyncio.Future] = field(compare=False, default=None)
+    attempts: int = field(compare=False, default=0)
+
+
+@dataclass
+class SendStats:
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    flood_waits: int = 0
+
+
+class SendQueue:
+    """
+    Единая точка исходящих уведомлений.
+
+    Сообщения ставятся в очередь с приоритетом (NOTIFICATION раньше BULK),
+    воркеры отправляют их в рамках лимитов, на RetryAfter ставят паузу и
+    повторяют, сетевые ошибки повторяют с backoff не более max_retries раз.
+    send_message возвращает отправленное сообщение или None.
+    """
+
+    def __init__(self, send_config: SendConfig):
+        self._config = send_config
+        self.limiter = SendLimiter(send_config)
+        self.stats = SendStats()
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=send_config.max_queue_size)
+        self._seq = itertools.count()
+        self._workers: List[asyncio.Task] = []
+        self._retries: Dict[asyncio.Task, _OutgoingMessage] = {}
+        self._bot: Optional[Bot] = None
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self, bot: Bot):
+        if self._workers:
+            return
+        self._bot = bot
+        bot.session.middleware(InteractiveRateLimitMiddleware(self.limiter))
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self._config.workers)]
+        logger.info(f"Send queue: Started {self._config.workers} workers.")
+
+    async def stop(self, timeout: float = 10.0):
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Send queue: {self._queue.qsize()} messages still queued after {timeout}s, dropping.")
+        for worker in self._workers:
+            worker.cancel()
+        retries = dict(self._retries)
+        for task in retries:
+            task.cancel()
+        await asyncio.gather(*self._workers, *retries, return_exceptions=True)
+        for item in retries.values():
+            self._resolve(item, None)
+        self._workers = []
+        self._retries = {}
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            self._resolve(item, None)
+            self._queue.task_done()
+        logger.info(f"Send queue: Stopped. Stats: {self.stats}")
+
+    async def send_message(self, chat_id: int, text: str, priority: Priority = Priority.NOTIFICATION, **kwargs) -> Optional[Message]:
+        item = _OutgoingMessage(priority=int(priority), seq=next(self._seq), chat_id=chat_id, text=text, kwargs=kwargs)
+        if not self._workers:
+            logger.warning(f"Send queue: Not running, sending to chat {chat_id} directly.")
+            return await self._deliver_once(item)
+        item.future = asyncio.get_running_loop().create_future()
+        await self._queue.put(item)
+        return await item.future
+
+    async def _worker(self, index: int):
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._process(item)
+            except Exception as e:
+                logger.error(f"Send queue: Worker {index} failed on chat {item.chat_id}: {e}", exc_info=True)
+                self._resolve(item, None)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver_once(self, item: _OutgoingMessage) -> Optional[Message]:
+        try:
+            return await self._send(item)
+        except Exception as e:
+            self.stats.failed += 1
+            logger.error(f"Send queue: Failed to send message to chat {item.chat_id}: {e}")
+            return None
+
+    async def _send(self, item: _OutgoingMessage) -> Message:
+        await self.limiter.acquire(item.chat_id, interactive=item.priority == Priority.INTERACTIVE)
+        token = _queued_send.set(True)
+        try:
+            message = await self._bot.send_message(item.chat_id, item.text, **item.kwargs)
+        finally:
+            _queued_send.reset(token)
+        self.stats.sent += 1
+        return message
+
+    async def _process(self, item: _OutgoingMessage):
+        item.attempts += 1
+        try:
+            self._resolve(item, await self._send(item))
+        except TelegramRetryAfter as e:
+            self.stats.flood_waits += 1
+            self.limiter.pause(e.retry_after)
+            self._retry(item, delay=0.0, reason=f"retry after {e.retry_after}s")
+        except (TelegramForbiddenError, TelegramBadRequest, TelegramNotFound) as e:
+            # Пользователь заблокировал бота, чат не найден и т.п.: повтор не поможет
+            self.stats.failed += 1
+            logger.warning(f"Send queue: Message to chat {item.chat_id} rejected: {e}")
+            self._resolve(item, None)
+        except (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError) as e:
+            self._retry(item, delay=2.0 ** item.attempts, reason=str(e))
+
+    def _retry(self, item: _OutgoingMessage, delay: float, reason: str):
+        if item.attempts > self._config.max_retries:
+            self.stats.failed += 1
+            logger.error(f"Send queue: Giving up on chat {item.chat_id} after {item.attempts} attempts ({reason}).")
+            self._resolve(item, None)
+            return
+        self.stats.retried += 1
+        logger.info(f"Send queue: Retrying message to chat {item.chat_id} in {delay:.0f}s ({reason}).")
+        task = asyncio.create_task(self._requeue(item, delay))
+        self._retries[task] = item
+        task.add_done_callback(lambda t: self._retries.pop(t, None))
+
+    async def _requeue(self, item: _OutgoingMessage, delay: float):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self._queue.put(item)
+
+    @staticmethod
+    def _resolve(item: _OutgoingMessage, result: Optional[Message]):
+        if item.future is not None and not item.future.done():
+            item.future.set_result(result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats.__dict__, "queued": self._queue.qsize()}
+
+
+send_queue = SendQueue(config.send)